@@ -0,0 +1,47 @@
+"""
+Helpers to import the verification modules from the benchmark scripts.
+
+The schema verification code lives in udfs/schema-verification, whose name is not a valid Python
+package name, so it is loaded here under the alias 'schema_verification'.
+"""
+import importlib
+import importlib.util
+import os
+import sys
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_DIR = os.path.join(REPO_ROOT, 'udfs', 'schema-verification')
+PACKAGE_ALIAS = 'schema_verification'
+
+
+def load_module(name):
+    """Imports udfs/schema-verification/<name>.py (with working relative imports) and returns it."""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT) # for the absolute 'utils.' imports
+    if PACKAGE_ALIAS not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE_ALIAS, os.path.join(PACKAGE_DIR, '__init__.py'), submodule_search_locations=[PACKAGE_DIR]
+        )
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE_ALIAS] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module(f"{PACKAGE_ALIAS}.{name}")
+
+
+def use_offline_config():
+    """
+    Makes utils.snowflake_connection importable without the deployment's utils/config_variables.py.
+
+    The offline benchmarks never reach a real account, so placeholder connection settings are enough.
+    An existing config_variables module is left untouched.
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    try:
+        importlib.import_module('utils.config_variables')
+    except ImportError:
+        config = types.ModuleType('utils.config_variables')
+        config.snowflake_config = {key: 'OFFLINE' for key in
+                                   ('user', 'account', 'warehouse', 'database', 'schema', 'role')}
+        sys.modules['utils.config_variables'] = config
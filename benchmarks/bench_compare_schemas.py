@@ -0,0 +1,77 @@
+"""
+Benchmark of compare_schemas_batch against calling compare_schemas once per table.
+
+Usage:
+    python benchmarks/bench_compare_schemas.py [--tables 10000] [--columns 25] [--drift 0.05]
+"""
+import argparse
+import gc
+import logging
+import time
+
+from _loader import load_module
+from synthetic import make_tables
+
+
+def best_of(repeat, function, *args):
+    """Runs function(*args) repeat times with the garbage collector paused and returns (result, best seconds)."""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function(*args)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=25)
+    parser.add_argument('--drift', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    compare_schemas = load_module('compare_schemas').compare_schemas
+    batch_compare = load_module('batch_compare')
+    compare_schemas_batch = batch_compare.compare_schemas_batch
+
+    # Logging is disabled so that both sides are measured without handler I/O
+    logger = logging.getLogger('SchemaComparatorBenchmark')
+    logger.setLevel(logging.CRITICAL)
+
+    tables = make_tables(args.tables, args.columns, args.drift)
+    pairs = [(table_name, expected, actual) for _, table_name, expected, actual in tables]
+
+    def compare_loop(pairs):
+        return [compare_schemas(table_name, expected, actual, logger) for table_name, expected, actual in pairs]
+
+    loop_results, loop_seconds = best_of(args.repeat, compare_loop, pairs)
+    batch_results, batch_seconds = best_of(args.repeat, compare_schemas_batch, pairs, logger)
+
+    # Columnar inputs, as produced by the Arrow fetch path and the compiled expected-schema bundles
+    columnar_pairs = [
+        (table_name, batch_compare.ColumnarSchema.from_rows(expected), batch_compare.ColumnarSchema.from_rows(actual))
+        for table_name, expected, actual in pairs
+    ]
+    columnar_results, columnar_seconds = best_of(args.repeat, compare_schemas_batch, columnar_pairs, logger)
+
+    if batch_results != loop_results or columnar_results != loop_results:
+        raise SystemExit("compare_schemas_batch results differ from compare_schemas")
+
+    failed = sum(result['schema_check_status'] == "FAIL" for result in batch_results)
+    print(f"{len(pairs)} tables, {failed} failed")
+    print(f"compare_schemas (loop): {loop_seconds * 1000:.1f} ms  ({len(pairs) / loop_seconds:,.0f} tables/s)")
+    print(f"compare_schemas_batch (dicts): {batch_seconds * 1000:.1f} ms  ({len(pairs) / batch_seconds:,.0f} tables/s)")
+    print(f"compare_schemas_batch (columnar): "
+          f"{columnar_seconds * 1000:.1f} ms  ({len(pairs) / columnar_seconds:,.0f} tables/s)")
+    print(f"speedup: {loop_seconds / batch_seconds:.2f}x (dicts), {loop_seconds / columnar_seconds:.2f}x (columnar)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Simulation of the verification daemon (daemon.VerificationDaemon) over one day, on a simulated clock.
+
+A few hot tables change structure regularly (each change moves LAST_ALTERED), many tables are loaded
+continuously (LAST_ALTERED moves with every load, the structure does not) and the rest never change. Some hot
+tables also change without LAST_ALTERED moving, to show the drift-rate schedule on its own. The simulation reports
+how many table verifications the daemon ran compared with re-verifying every table every min_interval, and how
+long each structural change took to be detected.
+
+Usage:
+    python benchmarks/bench_daemon.py [--tables 2000] [--hours 24] [--hot 0.02] [--loaded 0.1]
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from _loader import load_module, use_offline_config
+from synthetic import make_tables
+
+DATABASE_NAME = 'BENCH_DB'
+START = 1726000000.0 # simulated epoch time at which the daemon starts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--hot', type=float, default=0.02, help='fraction of tables changing structure')
+    parser.add_argument('--change-every', type=float, default=1800, help='seconds between changes of a hot table')
+    parser.add_argument('--silent', type=float, default=0.25,
+                        help='fraction of the hot tables whose changes do not move LAST_ALTERED')
+    parser.add_argument('--loaded', type=float, default=0.1, help='fraction of tables loaded every tick')
+    parser.add_argument('--min-interval', type=float, default=300)
+    parser.add_argument('--max-interval', type=float, default=86400)
+    parser.add_argument('--tick', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    use_offline_config()
+    import fakes
+    from utils.snowflake_pool import SnowflakeConnectionPool
+
+    daemon_module = load_module('daemon')
+    orchestrator = load_module('orchestrator')
+    schema_bundle = load_module('schema_bundle')
+    logger = logging.getLogger('SchemaComparatorBenchmark')
+    logger.setLevel(logging.CRITICAL)
+    rng = random.Random(args.seed)
+
+    def timestamp(epoch):
+        return datetime.utcfromtimestamp(epoch).isoformat()
+
+    tables = make_tables(args.tables, args.columns, drift_ratio=0, seed=args.seed)
+    information_schema = fakes.FakeInformationSchema(DATABASE_NAME)
+    information_schema.load(tables, last_altered=timestamp(START - 30 * 86400))
+    pool = SnowflakeConnectionPool(lambda: fakes.FakeSnowflakeConnection(information_schema))
+    db = information_schema._keeper
+
+    names = [table_name for _, table_name, _, _ in tables]
+    rng.shuffle(names)
+    hot = names[:int(len(names) * args.hot)]
+    silent = set(hot[:int(len(hot) * args.silent)])
+    loaded = names[len(hot):len(hot) + int(len(names) * args.loaded)]
+    next_change = {table_name: START + rng.uniform(0, args.change_every) for table_name in hot}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        bundle_path = os.path.join(workdir, 'schemas.bundle')
+        schema_bundle.write_schema_bundle({(schema_name, table_name): expected
+                                           for schema_name, table_name, expected, _ in tables}, bundle_path,
+                                          DATABASE_NAME)
+        entries = [orchestrator.ManifestEntry(DATABASE_NAME, schema_name, table_name, None, None)
+                   for schema_name, table_name, _, _ in tables]
+
+        now = START
+        daemon = daemon_module.VerificationDaemon(
+            entries, None, logger, pool=pool, schema_bundle=bundle_path, min_interval=args.min_interval,
+            max_interval=args.max_interval, tick=args.tick, max_tables_per_tick=len(entries), clock=lambda: now)
+
+        pending = {} # table -> time of its undetected structural change
+        latencies = []
+        verifications = 0
+        started = time.perf_counter()
+        end = START + args.hours * 3600
+        while now < end:
+            with db:
+                for table_name in hot:
+                    if next_change[table_name] <= now:
+                        # Flip the nullability of the first column: the table alternates between PASS and FAIL
+                        db.execute("UPDATE INFORMATION_SCHEMA_COLUMNS SET IS_NULLABLE = CASE IS_NULLABLE "
+                                   "WHEN 'YES' THEN 'NO' ELSE 'YES' END WHERE TABLE_NAME = ? AND ORDINAL_POSITION = 1",
+                                   (table_name,))
+                        if table_name not in silent:
+                            db.execute("UPDATE INFORMATION_SCHEMA_TABLES SET LAST_ALTERED = ? WHERE TABLE_NAME = ?",
+                                       (timestamp(now), table_name))
+                        pending.setdefault(table_name, now)
+                        next_change[table_name] = now + args.change_every * rng.uniform(0.5, 1.5)
+                db.executemany("UPDATE INFORMATION_SCHEMA_TABLES SET LAST_ALTERED = ? WHERE TABLE_NAME = ?",
+                               [(timestamp(now), table_name) for table_name in loaded])
+
+            for entry, _ in daemon.tick():
+                verifications += 1
+                if entry.table in pending:
+                    latencies.append(now - pending.pop(entry.table))
+            now += args.tick
+        elapsed = time.perf_counter() - started
+
+    sweep = len(entries) * args.hours * 3600 / args.min_interval
+    latencies.sort()
+    print(f"{len(entries)} tables over {args.hours:g}h: {len(hot)} hot ({len(silent)} without LAST_ALTERED), "
+          f"{len(loaded)} loaded continuously, {len(entries) - len(hot) - len(loaded)} static")
+    print(f"daemon: {verifications} table verifications vs {sweep:.0f} for a full sweep every "
+          f"{args.min_interval:g}s ({verifications / sweep:.1%}), simulated in {elapsed:.1f}s")
+    if latencies:
+        print(f"detection latency of {len(latencies)} structural changes: median {latencies[len(latencies) // 2]:.0f}s, "
+              f"p95 {latencies[int(len(latencies) * 0.95)]:.0f}s, max {latencies[-1]:.0f}s; "
+              f"{len(pending)} still undetected at the end")
+
+
+if __name__ == '__main__':
+    main()
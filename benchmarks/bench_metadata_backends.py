@@ -0,0 +1,103 @@
+"""
+Benchmark of the INFORMATION_SCHEMA and SHOW COLUMNS metadata backends.
+
+For each backend, the per-table query (a sample of tables) and the bulk query for a whole schema are timed,
+and the actual schemas the backends return are checked to be identical.
+
+Offline (default), Snowflake is replaced by the SQLite stand-in of fakes.py. A warehouse-backed query can be
+given a higher latency than a metadata-only SHOW command, to model their round trips (the stand-in emulates
+SHOW COLUMNS in Python, so offline bulk times mostly reflect its own overhead):
+    python benchmarks/bench_metadata_backends.py [--tables 1000] [--query-latency-ms 200] [--show-latency-ms 50]
+
+With --live, both backends run against the configured Snowflake account (credentials from Secrets Manager):
+    python benchmarks/bench_metadata_backends.py --live --database DEV_DB --schema LANDING_SCHEMA [--sample 20]
+"""
+import argparse
+import logging
+import time
+
+from _loader import load_module, use_offline_config
+from synthetic import make_tables
+
+DATABASE_NAME = 'BENCH_DB'
+SCHEMA_NAME = 'LANDING_SCHEMA'
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def offline_pool(args):
+    import fakes
+    from utils.snowflake_pool import SnowflakeConnectionPool
+
+    tables = make_tables(args.tables, args.columns, drift_ratio=0)
+    information_schema = fakes.FakeInformationSchema(DATABASE_NAME)
+    information_schema.load(tables)
+    return SnowflakeConnectionPool(lambda: fakes.FakeSnowflakeConnection(
+        information_schema, query_latency=args.query_latency_ms / 1000, metadata_latency=args.show_latency_ms / 1000
+    ))
+
+
+def live_pool():
+    from utils.snowflake_connection import get_snowflake_pkb, get_snowflake_pool
+
+    return get_snowflake_pool(get_snowflake_pkb("CONNECTOR"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--live', action='store_true', help='run against Snowflake instead of the local stand-in')
+    parser.add_argument('--database', default=DATABASE_NAME)
+    parser.add_argument('--schema', default=SCHEMA_NAME)
+    parser.add_argument('--tables', type=int, default=1000, help='synthetic tables (offline only)')
+    parser.add_argument('--columns', type=int, default=25, help='average columns per synthetic table (offline only)')
+    parser.add_argument('--sample', type=int, default=50, help='tables queried one by one')
+    parser.add_argument('--query-latency-ms', type=float, default=0.0,
+                        help='INFORMATION_SCHEMA query latency (offline)')
+    parser.add_argument('--show-latency-ms', type=float, default=0.0, help='SHOW command latency (offline)')
+    args = parser.parse_args()
+
+    if not args.live:
+        use_offline_config()
+    metadata_backends = load_module('metadata_backends')
+    logger = logging.getLogger('SchemaComparatorBenchmark')
+    logger.setLevel(logging.CRITICAL)
+    pool = live_pool() if args.live else offline_pool(args)
+
+    backends = {
+        'information_schema': metadata_backends.InformationSchemaBackend(),
+        'show_columns': metadata_backends.ShowColumnsBackend(),
+        'show_columns (client-side filter)': metadata_backends.ShowColumnsBackend(use_result_scan=False),
+    }
+    bulk_results = {}
+    for name, backend in backends.items():
+        schemas, bulk_seconds = timed(backend.query_schemas_bulk, None, args.database, logger,
+                                      schema_name=args.schema, pool=pool)
+        bulk_results[name] = schemas
+        sample = sorted(schemas)[:args.sample]
+        start = time.perf_counter()
+        for schema_name, table_name in sample:
+            backend.query_schema(None, table_name, schema_name, args.database, logger, pool=pool)
+        per_table_seconds = (time.perf_counter() - start) / max(1, len(sample))
+        columns = sum(len(schema) for schema in schemas.values())
+        print(f"{name:>33}: bulk {bulk_seconds * 1000:9.1f} ms for {len(schemas)} tables / {columns} columns, "
+              f"per table {per_table_seconds * 1000:7.1f} ms (avg of {len(sample)})")
+
+    # Column order is not guaranteed by SHOW COLUMNS, and comparisons are by column name
+    by_name = {
+        name: {table: sorted(schema, key=lambda column: column['COLUMN_NAME']) for table, schema in schemas.items()}
+        for name, schemas in bulk_results.items()
+    }
+    reference, *others = by_name.values()
+    for name, schemas in zip(list(by_name)[1:], others):
+        differing = [table for table in set(reference) | set(schemas) if reference.get(table) != schemas.get(table)]
+        print(f"{name} differs from {list(by_name)[0]} on {len(differing)} tables"
+              + (f", e.g. {sorted(differing)[:5]}" if differing else ""))
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of the mismatch report modes of compare_schemas on a bad deploy, where most columns of the drifted tables
+changed.
+
+The same comparisons are logged to a file through a synchronous StreamHandler (one line per finding, as before the
+report modes) and through the queued handler of setup_logging in every report mode. For the queued runs, the time
+spent in the comparison loop is reported separately from the time the listener thread needs to write everything
+out (flush_logging).
+
+Usage:
+    python benchmarks/bench_report_modes.py [--tables 2000] [--columns 50] [--drift 0.5]
+"""
+import argparse
+import logging
+import random
+import sys
+import tempfile
+import time
+
+from _loader import load_module
+from synthetic import make_tables
+
+
+def bad_deploy(rng, schema):
+    """Returns a copy of an expected schema with the nullability and precision of most columns changed."""
+    actual = [dict(column) for column in schema]
+    for column in actual:
+        if rng.random() < 0.8:
+            column['IS_NULLABLE'] = 'YES' if column['IS_NULLABLE'] == 'NO' else 'NO'
+            column['NUMERIC_PRECISION'] = (column['NUMERIC_PRECISION'] or 0) + 1
+    return actual[:-2] # and the last two columns dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--columns', type=int, default=50)
+    parser.add_argument('--drift', type=float, default=0.5, help='fraction of the tables hit by the bad deploy')
+    args = parser.parse_args()
+
+    compare_module = load_module('compare_schemas')
+    fetch_module = load_module('fetch_expected_schema_from_s3')
+    rng = random.Random(42)
+    pairs = []
+    for _, table_name, expected, _ in make_tables(args.tables, args.columns, drift_ratio=0):
+        pairs.append((table_name, expected, bad_deploy(rng, expected) if rng.random() < args.drift else expected))
+
+    def compare_all(logger, report_mode):
+        results = [compare_module.compare_schemas(table_name, expected, actual, logger, report_mode=report_mode)
+                   for table_name, expected, actual in pairs]
+        if report_mode == 'run':
+            compare_module.log_run_report(results, logger)
+        return results
+
+    with tempfile.TemporaryFile('w') as log_file:
+        sync_logger = logging.getLogger('SchemaComparatorBenchmark.sync')
+        sync_logger.propagate = False
+        sync_logger.setLevel(logging.INFO)
+        sync_handler = logging.StreamHandler(log_file)
+        sync_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        sync_logger.addHandler(sync_handler)
+        start = time.perf_counter()
+        reference = compare_all(sync_logger, 'detail')
+        sync_seconds = time.perf_counter() - start
+        sync_bytes = log_file.tell()
+
+        # setup_logging writes to sys.stderr; point it at the log file for the queued runs
+        stderr, sys.stderr = sys.stderr, log_file
+        try:
+            queued_logger = fetch_module.setup_logging()
+        finally:
+            sys.stderr = stderr
+        queued_logger.propagate = False
+
+        failed = sum(result['schema_check_status'] == "FAIL" for result in reference)
+        findings = sum(len(result['mismatches']) + len(result['missing_columns']) for result in reference)
+        print(f"{len(pairs)} tables, {failed} failed with {findings} findings")
+        print(f"{'sync, detail':>16}: {sync_seconds * 1000:8.1f} ms, {sync_bytes / 2 ** 20:6.1f} MB of log")
+        for report_mode in compare_module.REPORT_MODES:
+            position = log_file.tell()
+            start = time.perf_counter()
+            results = compare_all(queued_logger, report_mode)
+            caller_seconds = time.perf_counter() - start
+            fetch_module.flush_logging()
+            written_seconds = time.perf_counter() - start
+            log_file.flush()
+            log_bytes = log_file.seek(0, 2) - position
+            print(f"{'queued, ' + report_mode:>16}: {caller_seconds * 1000:8.1f} ms in the comparison loop, "
+                  f"{written_seconds * 1000:8.1f} ms until written, {log_bytes / 2 ** 20:6.1f} MB of log, "
+                  f"same results: {results == reference}")
+
+
+if __name__ == '__main__':
+    main()
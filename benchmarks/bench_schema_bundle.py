@@ -0,0 +1,98 @@
+"""
+Benchmark of the compiled schema bundle against one JSON file per table.
+
+The expected schemas of synthetic tables are written both as one JSON file per table (as they are stored in S3)
+and as one bundle. Loading and parsing every JSON file is timed against opening the bundle and decoding every
+table from it, and the decoded schemas are checked to match the JSON ones.
+
+Usage:
+    python benchmarks/bench_schema_bundle.py [--tables 20000] [--columns 25] [--sample 100]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from _loader import load_module, use_offline_config
+from synthetic import make_tables
+
+
+def measure(function, *args):
+    """Runs function twice: once timed, once under tracemalloc (which slows it down) for its memory."""
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    result = function(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, retained / 2 ** 20, peak / 2 ** 20
+
+
+def load_json_files(paths):
+    schemas = {}
+    for table_key, path in paths.items():
+        with open(path, 'r') as f:
+            schemas[table_key] = json.load(f)
+    return schemas
+
+
+def load_bundle(schema_bundle, path):
+    bundle = schema_bundle.SchemaBundle.open(path)
+    return bundle, bundle.schemas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=20000)
+    parser.add_argument('--columns', type=int, default=25)
+    parser.add_argument('--sample', type=int, default=100, help='tables decoded one by one from a fresh bundle')
+    args = parser.parse_args()
+
+    use_offline_config()
+    schema_bundle = load_module('schema_bundle')
+    tables = make_tables(args.tables, args.columns, drift_ratio=0)
+    expected_schemas = {(schema_name, table_name): expected for schema_name, table_name, expected, _ in tables}
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        json_bytes = 0
+        for (schema_name, table_name), expected in expected_schemas.items():
+            paths[(schema_name, table_name)] = os.path.join(directory, f"{table_name}_schema.json")
+            with open(paths[(schema_name, table_name)], 'w') as f:
+                json.dump(expected, f, indent=4)
+            json_bytes += os.path.getsize(paths[(schema_name, table_name)])
+
+        bundle_path = os.path.join(directory, 'schemas.bundle')
+        start = time.perf_counter()
+        bundle_bytes = schema_bundle.write_schema_bundle(expected_schemas, bundle_path, 'BENCH_DB')
+        compile_seconds = time.perf_counter() - start
+
+        from_json, json_seconds, json_retained, json_peak = measure(load_json_files, paths)
+        (bundle, from_bundle), bundle_seconds, bundle_retained, bundle_peak = measure(
+            load_bundle, schema_bundle, bundle_path)
+
+        sample = list(expected_schemas)[:args.sample]
+        start = time.perf_counter()
+        with schema_bundle.SchemaBundle.open(bundle_path) as fresh:
+            for schema_name, table_name in sample:
+                fresh.get(schema_name, table_name)
+        open_and_sample_seconds = time.perf_counter() - start
+
+        differing = [table for table in expected_schemas
+                     if list(from_bundle[('BENCH_DB', *table)]) != from_json[table]]
+        bundle.close()
+
+    print(f"{'files':>8}: {len(paths)} JSON files, {json_bytes / 2 ** 20:.1f} MB / 1 bundle, "
+          f"{bundle_bytes / 2 ** 20:.1f} MB (compiled in {compile_seconds:.2f}s)")
+    print(f"{'json':>8}: {json_seconds:7.3f}s, retained {json_retained:6.1f} MB, peak {json_peak:6.1f} MB")
+    print(f"{'bundle':>8}: {bundle_seconds:7.3f}s, retained {bundle_retained:6.1f} MB, peak {bundle_peak:6.1f} MB")
+    print(f"open + decode {len(sample)} tables: {open_and_sample_seconds * 1000:.1f} ms")
+    print(f"{len(differing)} tables differ between the JSON files and the bundle"
+          + (f", e.g. {differing[:5]}" if differing else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark of sharded runs (sharded_runner.run_sharded) with the local stand-ins of fakes.py.
+
+The same synthetic run is verified with an increasing number of worker processes. Then a run is interrupted
+after half of its shards and resumed with the same run_id, to check that only the unfinished tables are
+verified again and that the merged report covers every table.
+
+Every worker process loads its own copy of the SQLite stand-in (included in the timings).
+
+Usage:
+    python benchmarks/bench_sharded_runner.py [--tables 5000] [--workers 1 2 4] [--latency-ms 0]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from _loader import load_module, use_offline_config
+from synthetic import make_tables
+
+DATABASE_NAME = 'BENCH_DB'
+BUCKET_NAME = 'bench-bucket'
+
+_pools = {} # process id -> pool over that process's own SQLite stand-in
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=5000)
+    parser.add_argument('--columns', type=int, default=25)
+    parser.add_argument('--drift', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=8, help='pipeline workers per stage in each shard')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency of every Snowflake query and S3 call')
+    args = parser.parse_args()
+
+    use_offline_config()
+    import fakes
+    from utils import aws_clients
+    from utils.snowflake_pool import SnowflakeConnectionPool
+
+    sharded_runner = load_module('sharded_runner')
+    orchestrator = load_module('orchestrator')
+    logger = logging.getLogger('SchemaComparatorBenchmark')
+    logger.setLevel(logging.CRITICAL)
+    latency = args.latency_ms / 1000
+
+    tables = make_tables(args.tables, args.columns, args.drift)
+    s3_client = fakes.FakeS3Client(latency)
+    entries = []
+    for schema_name, table_name, expected, _ in tables:
+        key = f"snowflake-landing-schemas/{table_name}_schema.json"
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=json.dumps(expected))
+        entries.append(orchestrator.ManifestEntry(DATABASE_NAME, schema_name, table_name, key, BUCKET_NAME))
+    aws_clients.register_client('s3', s3_client)
+
+    def fake_pool(pkb, max_size=4):
+        # Forked workers inherit this stand-in of get_snowflake_pool and build their own SQLite database
+        pool = _pools.get(os.getpid())
+        if pool is None:
+            information_schema = fakes.FakeInformationSchema(DATABASE_NAME)
+            information_schema.load(tables)
+            pool = _pools[os.getpid()] = SnowflakeConnectionPool(
+                lambda: fakes.FakeSnowflakeConnection(information_schema, query_latency=latency), max_size=max_size)
+        return pool
+
+    sharded_runner.get_snowflake_pkb = lambda option: None
+    sharded_runner.get_snowflake_pool = fake_pool
+
+    with tempfile.TemporaryDirectory() as workdir:
+        options = {'checkpoint_dir': os.path.join(workdir, 'checkpoints'), 'output_dir': os.path.join(workdir, 'out'),
+                   'concurrency': args.concurrency, 'logger': logger}
+        baseline = None
+        reference = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            results = sharded_runner.run_sharded(entries, workers=workers, run_id=f"workers_{workers}", **options)
+            seconds = time.perf_counter() - start
+            baseline = baseline or seconds
+            statuses = [result['schema_check_status'] for result in results]
+            reference = reference or statuses
+            print(f"{workers:>2} workers: {seconds:7.2f}s, {len(results) / seconds:8.1f} tables/s, "
+                  f"speedup {baseline / seconds:4.2f}x, same statuses as the first run: {statuses == reference}")
+
+        workers = max(args.workers)
+        shard_count = 2 * workers
+        start = time.perf_counter()
+        sharded_runner.run_sharded(entries, workers=workers, run_id='resumed', shard_count=shard_count,
+                                   shards=list(range(shard_count // 2)), **options) # "crash" after half the shards
+        first_seconds = time.perf_counter() - start
+        checkpointed = len(sharded_runner.read_checkpoints(options['checkpoint_dir'], 'resumed'))
+        start = time.perf_counter()
+        results = sharded_runner.run_sharded(entries, workers=workers, run_id='resumed', shard_count=shard_count,
+                                             **options)
+        resume_seconds = time.perf_counter() - start
+        print(f"interrupted run: {checkpointed} tables checkpointed in {first_seconds:.2f}s; resumed run verified "
+              f"{len(entries) - checkpointed} tables in {resume_seconds:.2f}s, merged report of {len(results)} tables")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark of the type-equivalence rules (type_equivalence.py) against raw comparisons.
+
+The expected schemas of part of the synthetic tables are rewritten the way hand-written contracts often differ from
+INFORMATION_SCHEMA without any real drift: VARCHAR(16777216) instead of TEXT, NUMBER(38,0) instead of NUMBER with
+its precision and scale, precisions read back as floats (38.0), Y/N nullability. Raw comparisons report these tables
+as FAIL; with the rules only the tables with real drift should fail (the drift of the tables with an extra column
+is only caught with detect_extra_columns). Both compare_schemas and compare_schemas_batch are timed with and without
+the rules.
+
+Usage:
+    python benchmarks/bench_type_equivalence.py [--tables 10000] [--columns 25] [--drift 0.05] [--cosmetic 0.3]
+"""
+import argparse
+import logging
+import random
+
+from _loader import load_module
+from bench_compare_schemas import best_of
+from synthetic import make_tables
+
+
+def cosmetic(column):
+    """Returns a copy of an expected column spelled differently but equivalent under the default rules."""
+    column = dict(column)
+    if column['DATA_TYPE'] == 'TEXT':
+        column['DATA_TYPE'] = f"VARCHAR({column['CHARACTER_MAXIMUM_LENGTH']})"
+        column['CHARACTER_MAXIMUM_LENGTH'] = None
+    elif column['DATA_TYPE'] == 'NUMBER' and column['NUMERIC_SCALE'] == 0:
+        column['DATA_TYPE'] = f"NUMBER({column['NUMERIC_PRECISION']},0)"
+        column['NUMERIC_PRECISION'] = column['NUMERIC_SCALE'] = None
+    elif column['NUMERIC_PRECISION'] is not None:
+        column['NUMERIC_PRECISION'] = float(column['NUMERIC_PRECISION'])
+    column['IS_NULLABLE'] = column['IS_NULLABLE'][0]
+    return column
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=25)
+    parser.add_argument('--drift', type=float, default=0.05)
+    parser.add_argument('--cosmetic', type=float, default=0.3, help='fraction of contracts spelled differently')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    compare_schemas = load_module('compare_schemas').compare_schemas
+    compare_schemas_batch = load_module('batch_compare').compare_schemas_batch
+    equivalence = load_module('type_equivalence').get_type_equivalence(True)
+    logger = logging.getLogger('SchemaComparatorBenchmark')
+    logger.setLevel(logging.CRITICAL)
+
+    rng = random.Random(7)
+    pairs = []
+    drifted = set()
+    for _, table_name, expected, actual in make_tables(args.tables, args.columns, args.drift):
+        if expected != actual:
+            drifted.add(table_name)
+        # The actual schema is what INFORMATION_SCHEMA reports; only the contract is spelled differently
+        if rng.random() < args.cosmetic:
+            expected = [cosmetic(column) for column in expected]
+        pairs.append((table_name, expected, actual))
+
+    def loop(type_equivalence):
+        return [compare_schemas(table_name, expected, actual, logger, report_mode='run',
+                                type_equivalence=type_equivalence) for table_name, expected, actual in pairs]
+
+    def failed(results):
+        return {result['table'] for result in results if result['schema_check_status'] == "FAIL"}
+
+    print(f"{len(pairs)} tables, {len(drifted)} with real drift")
+    for name, function, options in [
+        ('compare_schemas, raw', loop, (None,)),
+        ('compare_schemas, rules', loop, (equivalence,)),
+        ('compare_schemas_batch, raw', lambda: compare_schemas_batch(pairs, logger), ()),
+        ('compare_schemas_batch, rules', lambda: compare_schemas_batch(pairs, logger, type_equivalence=equivalence), ()),
+        ('compare_schemas_batch, rules + extra', lambda: compare_schemas_batch(
+            pairs, logger, type_equivalence=equivalence, detect_extra_columns=True), ()),
+    ]:
+        results, seconds = best_of(args.repeat, function, *options)
+        failures = failed(results)
+        print(f"{name:>36}: {seconds * 1000:8.1f} ms, {len(failures)} FAIL ({len(failures - drifted)} false, "
+              f"{len(drifted - failures)} drifted tables missed)")
+
+
+if __name__ == '__main__':
+    main()
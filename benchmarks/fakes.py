@@ -0,0 +1,349 @@
+"""
+Local stand-ins for Snowflake, S3 and Secrets Manager used by the offline benchmarks.
+
+Each fake implements the subset of the client interface the verification code uses and can add a fixed
+latency per call to mimic network round trips (login handshake, query, GET/PUT).
+"""
+import hashlib
+import itertools
+import json
+import re
+import sqlite3
+import threading
+import time
+
+_database_ids = itertools.count()
+
+
+def _sleep(latency):
+    if latency:
+        time.sleep(latency)
+
+
+class FakeInformationSchema:
+    """
+    SQLite database holding INFORMATION_SCHEMA.COLUMNS and INFORMATION_SCHEMA.TABLES rows.
+
+    The database lives in shared memory so that every FakeSnowflakeConnection sees the same data.
+    """
+
+    def __init__(self, database_name):
+        self.database_name = database_name.upper()
+        self.uri = f"file:fake_snowflake_{next(_database_ids)}?mode=memory&cache=shared"
+        # Keeps the shared in-memory database alive for the lifetime of this object
+        self._keeper = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        self._keeper.executescript("""
+            CREATE TABLE INFORMATION_SCHEMA_COLUMNS (
+                TABLE_CATALOG TEXT, TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, ORDINAL_POSITION INTEGER,
+                IS_NULLABLE TEXT, DATA_TYPE TEXT, CHARACTER_MAXIMUM_LENGTH INTEGER, NUMERIC_PRECISION INTEGER,
+                NUMERIC_SCALE INTEGER, DATETIME_PRECISION INTEGER
+            );
+            CREATE INDEX idx_columns ON INFORMATION_SCHEMA_COLUMNS (TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME);
+            CREATE TABLE INFORMATION_SCHEMA_TABLES (
+                TABLE_CATALOG TEXT, TABLE_SCHEMA TEXT, TABLE_NAME TEXT, LAST_ALTERED TEXT
+            );
+        """)
+
+    def load(self, tables, last_altered='2024-09-10T00:00:00'):
+        """Loads (schema_name, table_name, expected_schema, actual_schema) tuples; the actual schemas are stored."""
+        column_rows = []
+        table_rows = []
+        for schema_name, table_name, _, actual_schema in tables:
+            table_rows.append((self.database_name, schema_name, table_name, last_altered))
+            for position, column in enumerate(actual_schema, start=1):
+                column_rows.append((
+                    self.database_name, schema_name, table_name, column['COLUMN_NAME'], position,
+                    column['IS_NULLABLE'], column['DATA_TYPE'], column['CHARACTER_MAXIMUM_LENGTH'],
+                    column['NUMERIC_PRECISION'], column['NUMERIC_SCALE'], column['DATETIME_PRECISION']
+                ))
+        with self._keeper:
+            self._keeper.executemany("INSERT INTO INFORMATION_SCHEMA_TABLES VALUES (?, ?, ?, ?)", table_rows)
+            self._keeper.executemany("INSERT INTO INFORMATION_SCHEMA_COLUMNS VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     column_rows)
+
+    def connect(self):
+        return sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+
+
+# <DB>.INFORMATION_SCHEMA.<VIEW> -> INFORMATION_SCHEMA_<VIEW>
+_VIEW_PATTERN = re.compile(r"\b\w+\.INFORMATION_SCHEMA\.(\w+)", re.IGNORECASE)
+
+_SHOW_COLUMNS_PATTERN = re.compile(r"^\s*SHOW\s+COLUMNS\s+IN\s+(TABLE|SCHEMA|DATABASE)\s+([\w$.]+)", re.IGNORECASE)
+
+# TABLE(RESULT_SCAN(LAST_QUERY_ID())) -> the per-connection temporary table holding the last SHOW output
+_RESULT_SCAN_PATTERN = re.compile(r"TABLE\s*\(\s*RESULT_SCAN\s*\(\s*LAST_QUERY_ID\s*\(\s*\)\s*\)\s*\)",
+                                  re.IGNORECASE)
+
+_SHOW_COLUMNS_OUTPUT = ('table_name', 'schema_name', 'column_name', 'data_type', 'null?', 'default', 'kind',
+                        'expression', 'comment', 'database_name', 'autoincrement')
+
+
+def _show_data_type(data_type, length, precision, scale, datetime_precision, is_nullable):
+    """Builds the SHOW COLUMNS data_type JSON of an INFORMATION_SCHEMA.COLUMNS row."""
+    value = {'type': {'NUMBER': 'FIXED', 'FLOAT': 'REAL'}.get(data_type, data_type)}
+    if data_type == 'NUMBER':
+        value.update(precision=precision, scale=scale)
+    elif data_type in ('TEXT', 'BINARY'):
+        value.update(length=length, byteLength=length)
+    elif data_type in ('TIME', 'TIMESTAMP_LTZ', 'TIMESTAMP_NTZ', 'TIMESTAMP_TZ'):
+        value.update(precision=0, scale=datetime_precision)
+    value.update(nullable=is_nullable == 'YES', fixed=False)
+    return json.dumps(value, separators=(',', ':'))
+
+
+class FakeCursor:
+    """
+    Snowflake-like cursor translating the connector's %s parameter style and view names to SQLite.
+
+    SHOW COLUMNS is emulated from INFORMATION_SCHEMA_COLUMNS, and its output can be queried with
+    TABLE(RESULT_SCAN(LAST_QUERY_ID())) on the same connection.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._rows = []
+
+    def _show_columns(self, scope, name):
+        """Runs SHOW COLUMNS against INFORMATION_SCHEMA_COLUMNS and keeps the output for RESULT_SCAN."""
+        _sleep(self._connection.metadata_latency)
+        parts = name.upper().split('.')
+        filters = ['TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME'][:len(parts)]
+        rows = self._connection.sqlite.execute(
+            "SELECT TABLE_NAME, TABLE_SCHEMA, COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, "
+            "NUMERIC_SCALE, DATETIME_PRECISION, IS_NULLABLE, TABLE_CATALOG FROM INFORMATION_SCHEMA_COLUMNS WHERE "
+            + ' AND '.join(f"{column} = ?" for column in filters)
+            + " ORDER BY TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION",
+            parts
+        ).fetchall()
+        output = [
+            (table, schema, column, _show_data_type(*attributes), 'true' if attributes[-1] == 'YES' else 'false', '',
+             'COLUMN', '', '', database, '')
+            for table, schema, column, *attributes, database in rows
+        ]
+        columns = ', '.join(f'"{column}"' for column in _SHOW_COLUMNS_OUTPUT)
+        sqlite = self._connection.sqlite
+        sqlite.execute("DROP TABLE IF EXISTS temp.LAST_RESULT")
+        sqlite.execute(f"CREATE TEMP TABLE LAST_RESULT ({columns})")
+        sqlite.executemany(f"INSERT INTO temp.LAST_RESULT VALUES ({', '.join('?' * len(_SHOW_COLUMNS_OUTPUT))})",
+                           output)
+        self._rows = output
+        return self
+
+    def execute(self, sql_statement, params=None):
+        show_columns = _SHOW_COLUMNS_PATTERN.match(sql_statement)
+        if show_columns:
+            return self._show_columns(*show_columns.groups())
+        _sleep(self._connection.query_latency)
+        sql_statement = _RESULT_SCAN_PATTERN.sub('temp.LAST_RESULT', sql_statement)
+        sql_statement = _VIEW_PATTERN.sub(lambda match: f"INFORMATION_SCHEMA_{match.group(1).upper()}", sql_statement)
+        sql_statement = sql_statement.replace('%s', '?').strip().rstrip(';')
+        self._rows = self._connection.sqlite.execute(sql_statement, tuple(params or ())).fetchall()
+        return self
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetch_arrow_batches(self, batch_size=50000):
+        """Yields the result as pyarrow Tables of batch_size rows, like the result chunks of the connector."""
+        import pyarrow
+
+        rows, self._rows = self._rows, []
+        for start in range(0, len(rows), batch_size):
+            columns = list(zip(*rows[start:start + batch_size]))
+            yield pyarrow.table([pyarrow.array(column) for column in columns],
+                                names=[f"C{index}" for index in range(len(columns))])
+
+    def close(self):
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FakeSnowflakeConnection:
+    """Snowflake-like connection backed by a FakeInformationSchema."""
+
+    def __init__(self, information_schema, login_latency=0.0, query_latency=0.0, metadata_latency=None):
+        _sleep(login_latency) # key-pair authentication handshake
+        self.sqlite = information_schema.connect()
+        self.query_latency = query_latency
+        # Latency of metadata-only commands (SHOW), which do not run on a warehouse
+        self.metadata_latency = query_latency if metadata_latency is None else metadata_latency
+        self._closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.sqlite.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _hash(*values):
+    """Deterministic signed 64-bit hash of a row, standing in for Snowflake's HASH()."""
+    digest = hashlib.blake2b(repr(values).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class _HashAgg:
+    """Order-independent aggregate of the row hashes, standing in for Snowflake's HASH_AGG()."""
+
+    def __init__(self):
+        self.total = 0
+
+    def step(self, *values):
+        self.total = (self.total + _hash(*values)) & 0xFFFFFFFFFFFFFFFF
+
+    def finalize(self):
+        return self.total - (1 << 64) if self.total >= 1 << 63 else self.total
+
+
+# "DB"."SCHEMA"."TABLE" -> "SCHEMA_TABLE" (SQLite has no three-part names)
+_TABLE_PATTERN = re.compile(r'"(?:[^"]|"")+"\."((?:[^"]|"")+)"\."((?:[^"]|"")+)"')
+
+
+class FakeWarehouse:
+    """
+    SQLite database holding data tables, with HASH and HASH_AGG registered so that the aggregate
+    queries of table_diff run unchanged (through run_query) apart from the parameter style and table names.
+    """
+
+    def __init__(self, query_latency=0.0):
+        self.sqlite = sqlite3.connect(':memory:', check_same_thread=False)
+        self.sqlite.create_function('HASH', -1, _hash, deterministic=True)
+        self.sqlite.create_aggregate('HASH_AGG', -1, _HashAgg)
+        self.query_latency = query_latency
+        self.queries = 0
+        self.rows_returned = 0
+
+    def create_table(self, schema_name, table_name, columns, rows):
+        """Creates and fills SCHEMA.TABLE; columns are (name, sqlite type) pairs, the first one being the key."""
+        name = f'"{schema_name.upper()}_{table_name.upper()}"'
+        definitions = ', '.join(f'"{column}" {column_type}' for column, column_type in columns)
+        with self.sqlite:
+            self.sqlite.execute(f"CREATE TABLE {name} ({definitions}, PRIMARY KEY (\"{columns[0][0]}\"))")
+            self.sqlite.executemany(f"INSERT INTO {name} VALUES ({', '.join('?' * len(columns))})", rows)
+
+    def run_query(self, sql_statement, params=None):
+        _sleep(self.query_latency)
+        self.queries += 1
+        sql_statement = _TABLE_PATTERN.sub(lambda match: f'"{match.group(1)}_{match.group(2)}"', sql_statement)
+        sql_statement = sql_statement.replace('%s', '?').strip().rstrip(';')
+        rows = self.sqlite.execute(sql_statement, tuple(params or ())).fetchall()
+        self.rows_returned += len(rows)
+        return rows
+
+
+class _Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class FakeS3Client:
+    """In-process S3 stand-in supporting conditional GETs, PUTs and multipart uploads."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {} # (bucket, key) -> (etag, bytes)
+        self.requests = 0
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def _count(self):
+        _sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._count()
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        etag = f'"{next(self._ids):032x}"'
+        with self._lock:
+            self.objects[(Bucket, Key)] = (etag, data)
+        return {'ETag': etag}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        from botocore.exceptions import ClientError # only the S3 stand-in needs botocore
+
+        self._count()
+        with self._lock:
+            stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': Key},
+                               'ResponseMetadata': {'HTTPStatusCode': 404}}, 'GetObject')
+        etag, data = stored
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'},
+                               'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+        return {'ETag': etag, 'Body': _Body(data), 'ContentLength': len(data)}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._count()
+        upload_id = f"upload-{next(self._ids)}"
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count()
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {'ETag': f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count()
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+        data = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+        return self.put_object(Bucket=Bucket, Key=Key, Body=data)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._count()
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+
+
+class FakeSecretsManagerClient:
+    """In-process Secrets Manager stand-in."""
+
+    def __init__(self, secrets, latency=0.0):
+        self.secrets = dict(secrets)
+        self.latency = latency
+        self.requests = 0
+
+    def get_secret_value(self, SecretId):
+        _sleep(self.latency)
+        self.requests += 1
+        return {'Name': SecretId, 'SecretString': self.secrets[SecretId]}
+
+    def batch_get_secret_value(self, SecretIdList, **kwargs):
+        _sleep(self.latency)
+        self.requests += 1
+        return {
+            'SecretValues': [{'Name': secret_id, 'SecretString': self.secrets[secret_id]}
+                             for secret_id in SecretIdList if secret_id in self.secrets],
+            'Errors': [{'SecretId': secret_id, 'ErrorCode': 'ResourceNotFoundException', 'Message': secret_id}
+                       for secret_id in SecretIdList if secret_id not in self.secrets]
+        }
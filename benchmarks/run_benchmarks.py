@@ -0,0 +1,315 @@
+"""
+Offline benchmark suite for the schema verification pipeline.
+
+Every back-end is replaced by a local stand-in (see fakes.py): Snowflake by a SQLite-backed
+INFORMATION_SCHEMA, S3 and Secrets Manager by in-process stubs with a configurable latency per call.
+For each synthetic database size the suite times the pipeline stages and reports tables/sec,
+per-call latency percentiles and peak traced memory. The run fails (exit code 1) when a stage's
+throughput drops more than --tolerance below the baseline (benchmarks/baseline.json unless --baseline
+is given). Stages missing from the baseline are not checked, so record it (--update-baseline) with the
+same sizes, --large included.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 10 100 1000 10000] [--large] [--latency-ms 0]
+                                        [--baseline benchmarks/baseline.json] [--update-baseline]
+                                        [--no-baseline]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from _loader import load_module, use_offline_config
+from synthetic import make_tables
+
+DATABASE_NAME = 'BENCH_DB'
+BUCKET_NAME = 'bench-bucket'
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Size added by --large (a few minutes and about 1 GB of memory)
+LARGE_SIZE = 100000
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(stage, tables, run, calls=None):
+    """
+    Times run() and measures its peak memory in a second, traced execution.
+
+    Parameters:
+        stage (str): Stage name.
+        tables (int): Number of tables processed by one execution of run().
+        run (callable): Executes the stage once. If it returns a list, it is taken as the per-call latencies (seconds).
+        calls (int, optional): Number of calls, when it differs from the number of tables.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    latencies = run()
+    seconds = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies = sorted(latencies) if isinstance(latencies, list) else [seconds]
+    return {
+        'stage': stage,
+        'tables': tables,
+        'calls': calls or len(latencies),
+        'seconds': round(seconds, 6),
+        'tables_per_sec': round(tables / seconds, 1) if seconds > 0 else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_memory_mb': round(peak / (1024 * 1024), 3)
+    }
+
+
+def per_call(function, items):
+    """Returns a run() callable that calls function(item) for every item and returns the latencies."""
+    def run():
+        latencies = []
+        for item in items:
+            start = time.perf_counter()
+            function(item)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    return run
+
+
+def make_encrypted_key(passphrase):
+    """Generates an RSA key pair and returns the private key as an encrypted PKCS#8 PEM string."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.BestAvailableEncryption(passphrase.encode())
+    ).decode('utf-8')
+
+
+def bench_credentials(latency, warm_calls=1000):
+    """Times get_snowflake_pkb with a cold cache (Secrets Manager + key decoding) and with a warm cache."""
+    import fakes
+    from utils import aws_clients, snowflake_connection
+
+    passphrase = 'benchmark-passphrase'
+    secrets = {
+        'snowflake/emea/privateKey': make_encrypted_key(passphrase),
+        'snowflake/emea/passphrase': passphrase
+    }
+    aws_clients.register_client('secretsmanager', fakes.FakeSecretsManagerClient(secrets, latency),
+                                snowflake_connection.SNOWFLAKE_SECRETS_REGION)
+
+    def cold(_):
+        snowflake_connection.invalidate_snowflake_pkb()
+        snowflake_connection.get_snowflake_pkb("CONNECTOR")
+
+    results = [measure('get_snowflake_pkb (cold)', 1, per_call(cold, range(5)))]
+    snowflake_connection.get_snowflake_pkb("CONNECTOR")
+    results.append(measure('get_snowflake_pkb (warm)', 1,
+                           per_call(lambda _: snowflake_connection.get_snowflake_pkb("CONNECTOR"), range(warm_calls))))
+    return results
+
+
+def bench_size(size, args, logger, workdir):
+    """Runs every pipeline stage against a synthetic database of the given number of tables."""
+    import fakes
+    from utils import aws_clients
+    from utils.snowflake_pool import SnowflakeConnectionPool
+
+    fetch_module = load_module('fetch_expected_schema_from_s3')
+    query_snowflake_schema = load_module('query_snowflake_schema')
+    compare_module = load_module('compare_schemas')
+    batch_compare = load_module('batch_compare')
+    validate_schema = load_module('validate_schema')
+    result_sink = load_module('result_sink')
+
+    latency = args.latency_ms / 1000
+    tables = make_tables(size, args.columns, args.drift)
+    information_schema = fakes.FakeInformationSchema(DATABASE_NAME)
+    information_schema.load(tables)
+
+    pool = SnowflakeConnectionPool(
+        lambda: fakes.FakeSnowflakeConnection(information_schema, login_latency=latency * 10, query_latency=latency),
+        max_size=4
+    )
+    sample = tables[:min(size, args.sample)]
+    results = []
+
+    # S3: the expected schemas are fetched from (and the results saved to) the stand-in through get_client('s3')
+    s3_client = fakes.FakeS3Client(latency)
+    aws_clients.register_client('s3', s3_client)
+    keys = []
+    for schema_name, table_name, expected, _ in tables:
+        keys.append(f"snowflake-landing-schemas/{table_name}_schema.json")
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=keys[-1], Body=json.dumps(expected))
+    cache_dir = os.path.join(workdir, f"schema_cache_{size}")
+
+    def fetch_cold():
+        # Every execution starts without a cache, so every schema is downloaded and parsed
+        fetch_module._memory_cache.clear()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        fetch_module.fetch_expected_schemas_from_s3(BUCKET_NAME, keys, logger, cache_dir=cache_dir)
+    results.append(measure('fetch_expected_schemas (cold)', size, fetch_cold))
+
+    def fetch_warm():
+        # Conditional GETs against the cache filled by the cold stage: every object answers 304
+        fetch_module.fetch_expected_schemas_from_s3(BUCKET_NAME, keys, logger, cache_dir=cache_dir)
+    results.append(measure('fetch_expected_schemas (warm)', size, fetch_warm))
+    fetch_module._memory_cache.clear()
+
+    # Snowflake: one query per table (sampled) and one bulk query for the whole schema
+    results.append(measure('query_snowflake_schema', len(sample), per_call(
+        lambda table: query_snowflake_schema.query_snowflake_schema(None, table[1], table[0], DATABASE_NAME, logger,
+                                                                    pool=pool),
+        sample
+    )))
+    actual_schemas = {}
+
+    def bulk():
+        actual_schemas.update(query_snowflake_schema.query_snowflake_schemas_bulk(
+            None, DATABASE_NAME, logger, schema_name='LANDING_SCHEMA', pool=pool))
+    results.append(measure('query_snowflake_schemas_bulk', size, bulk))
+    columnar_schemas = {}
+
+    def columnar():
+        columnar_schemas.update(query_snowflake_schema.query_snowflake_schemas_columnar(
+            None, DATABASE_NAME, logger, schema_name='LANDING_SCHEMA', pool=pool))
+    results.append(measure('query_snowflake_schemas_columnar', size, columnar))
+
+    # Comparison: once per table and as one batch
+    pairs = [(table_name, expected, actual_schemas[(schema_name, table_name)])
+             for schema_name, table_name, expected, _ in tables]
+    results.append(measure('compare_schemas', size, per_call(
+        lambda pair: compare_module.compare_schemas(pair[0], pair[1], pair[2], logger), pairs
+    )))
+    comparison_results = []
+
+    def batch():
+        comparison_results[:] = batch_compare.compare_schemas_batch(pairs, logger)
+    results.append(measure('compare_schemas_batch', size, batch))
+    columnar_pairs = [(table_name, expected, columnar_schemas[(schema_name, table_name)])
+                      for schema_name, table_name, expected, _ in tables]
+
+    def batch_columnar():
+        batch_compare.compare_schemas_batch(columnar_pairs, logger)
+    results.append(measure('compare_schemas_batch_columnar', size, batch_columnar))
+
+    # Saving: one JSON file per table locally and on S3 (sampled) and one streaming NDJSON sink for the whole run
+    json_dir = os.path.join(workdir, f"json_{size}")
+    os.makedirs(json_dir, exist_ok=True)
+    results.append(measure('save_result_to_json', len(sample), per_call(
+        lambda result: validate_schema.save_result_to_json(result, os.path.join(json_dir, f"{result['table']}.json")),
+        comparison_results[:len(sample)]
+    )))
+    results.append(measure('save_result_to_s3', len(sample), per_call(
+        lambda result: validate_schema.save_result_to_s3(result, BUCKET_NAME,
+                                                         f"schema_comparison_results/{result['table']}.json"),
+        comparison_results[:len(sample)]
+    )))
+
+    def ndjson():
+        sink = result_sink.NDJSONResultSink(output_dir=os.path.join(workdir, f"ndjson_{size}"))
+        for result in comparison_results:
+            sink.write(result)
+        sink.close()
+    results.append(measure('NDJSONResultSink', size, ndjson))
+
+    pool.close()
+    aws_clients.reset_clients()
+    return results
+
+
+def check_baseline(results, baseline, tolerance):
+    """Returns the list of stages whose throughput regressed more than tolerance against the baseline."""
+    regressions = []
+    for result in results:
+        key = f"{result['stage']}@{result['tables']}"
+        expected = baseline.get(key)
+        if expected and result['tables_per_sec'] is not None and result['tables_per_sec'] < expected * (1 - tolerance):
+            regressions.append(f"{key}: {result['tables_per_sec']:,.1f} tables/s "
+                               f"(baseline {expected:,.1f}, -{(1 - result['tables_per_sec'] / expected) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='synthetic database sizes, in tables (up to 100000)')
+    parser.add_argument('--large', action='store_true', help=f'also run the {LARGE_SIZE}-table size')
+    parser.add_argument('--columns', type=int, default=25, help='average number of columns per table')
+    parser.add_argument('--drift', type=float, default=0.05, help='fraction of tables with schema drift')
+    parser.add_argument('--sample', type=int, default=1000, help='tables used for the per-table stages')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='simulated latency per back-end call (a Snowflake login costs 10x)')
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help='JSON file with the baseline throughput per stage@size (default: %(default)s)')
+    parser.add_argument('--no-baseline', action='store_true', help='do not compare against a baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='write this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed throughput drop (0.25 = 25%%)')
+    parser.add_argument('--output', help='write the full results as JSON to this file')
+    args = parser.parse_args()
+    if args.large and LARGE_SIZE not in args.sizes:
+        args.sizes.append(LARGE_SIZE)
+
+    use_offline_config()
+    logger = logging.getLogger('SchemaComparatorBenchmark')
+    logger.setLevel(logging.CRITICAL) # measure the stages, not the log handlers
+
+    workdir = tempfile.mkdtemp(prefix='verification-benchmark-')
+    try:
+        results = bench_credentials(args.latency_ms / 1000)
+        for size in args.sizes:
+            results.extend(bench_size(size, args, logger, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    header = f"{'stage':<32}{'tables':>8}{'tables/s':>14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>10}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f"{result['stage']:<32}{result['tables']:>8}{result['tables_per_sec'] or 0:>14,.1f}"
+              f"{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{result['peak_memory_mb']:>10.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({f"{result['stage']}@{result['tables']}": result['tables_per_sec'] for result in results},
+                      f, indent=4, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+    elif not args.no_baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = check_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
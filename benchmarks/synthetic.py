@@ -0,0 +1,61 @@
+"""
+Synthetic expected/actual schemas for the benchmarks.
+"""
+import random
+
+_COLUMN_TYPES = [
+    {'DATA_TYPE': 'TEXT', 'CHARACTER_MAXIMUM_LENGTH': 16777216},
+    {'DATA_TYPE': 'NUMBER', 'NUMERIC_PRECISION': 38, 'NUMERIC_SCALE': 0},
+    {'DATA_TYPE': 'NUMBER', 'NUMERIC_PRECISION': 18, 'NUMERIC_SCALE': 2},
+    {'DATA_TYPE': 'FLOAT'},
+    {'DATA_TYPE': 'DATE'},
+    {'DATA_TYPE': 'TIMESTAMP_NTZ', 'DATETIME_PRECISION': 9},
+    {'DATA_TYPE': 'BOOLEAN'},
+]
+
+
+def make_column(rng, name):
+    column = {
+        'COLUMN_NAME': name,
+        'IS_NULLABLE': rng.choice(['YES', 'NO']),
+        'DATA_TYPE': None,
+        'CHARACTER_MAXIMUM_LENGTH': None,
+        'NUMERIC_PRECISION': None,
+        'NUMERIC_SCALE': None,
+        'DATETIME_PRECISION': None,
+    }
+    column.update(rng.choice(_COLUMN_TYPES))
+    return column
+
+
+def drift(rng, schema):
+    """Returns a copy of an expected schema with a random attribute change, dropped column or extra column."""
+    actual = [dict(column) for column in schema]
+    change = rng.randrange(3)
+    if change == 0 and actual:
+        column = rng.choice(actual)
+        column['IS_NULLABLE'] = 'YES' if column['IS_NULLABLE'] == 'NO' else 'NO'
+    elif change == 1 and actual:
+        actual.pop(rng.randrange(len(actual)))
+    else:
+        actual.append(make_column(rng, f"EXTRA_{len(actual)}"))
+    return actual
+
+
+def make_tables(num_tables, columns_per_table=25, drift_ratio=0.05, seed=42):
+    """
+    Generates (schema_name, table_name, expected_schema, actual_schema) tuples.
+
+    :param num_tables: int, number of tables to generate
+    :param columns_per_table: int, average number of columns per table
+    :param drift_ratio: float, fraction of tables whose actual schema differs from the expected one
+    :param seed: int, random seed so that runs are reproducible
+    """
+    rng = random.Random(seed)
+    tables = []
+    for table_index in range(num_tables):
+        num_columns = max(1, int(rng.gauss(columns_per_table, columns_per_table / 4)))
+        expected = [make_column(rng, f"COL_{column_index}") for column_index in range(num_columns)]
+        actual = drift(rng, expected) if rng.random() < drift_ratio else [dict(column) for column in expected]
+        tables.append(('LANDING_SCHEMA', f"TABLE_{table_index:06d}", expected, actual))
+    return tables
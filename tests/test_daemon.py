@@ -0,0 +1,100 @@
+"""
+Tests of the scheduling of the verification daemon (udfs/schema-verification/daemon.py) when parts of a round
+fail: every table taken off the schedule must be scheduled again.
+
+Usage:
+    python -m pytest tests
+"""
+import logging
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+
+use_offline_config()
+daemon_module = load_module('daemon')
+ManifestEntry = load_module('orchestrator').ManifestEntry
+
+START = 1726000000.0
+SCHEMA = [{'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'IS_NULLABLE': 'NO', 'CHARACTER_MAXIMUM_LENGTH': None,
+           'NUMERIC_PRECISION': 38, 'NUMERIC_SCALE': 0, 'DATETIME_PRECISION': None}]
+
+
+class StaticBackend:
+    """Metadata backend answering every bulk query with the same schema for every table."""
+
+    def query_schemas_bulk(self, pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+        return {(schema_name, table_name.upper()): SCHEMA for table_name in table_names}
+
+
+class StaticBundle:
+
+    def get(self, schema_name, table_name, database_name=None):
+        return SCHEMA
+
+
+class DaemonSchedulingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = START
+        self.entries = [ManifestEntry('DB', 'LANDING', f"TABLE_{index}", None, None) for index in range(3)]
+        patcher = mock.patch.object(daemon_module, 'query_tables_last_altered', return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def daemon(self, **options):
+        return daemon_module.VerificationDaemon(
+            self.entries, None, logging.getLogger('SchemaComparatorTest'), metadata_backend=StaticBackend(),
+            schema_bundle='s3://bucket/schemas.bundle', tick=60, min_interval=300, max_interval=3600,
+            clock=lambda: self.now, **options)
+
+    def scheduled(self, daemon):
+        return {key for due, key in daemon._heap if daemon._next_due[key] == due}
+
+    def test_failed_bundle_load_backs_off_every_table(self):
+        daemon = self.daemon()
+        with mock.patch.object(daemon_module, 'load_schema_bundle', side_effect=OSError("S3 unavailable")):
+            verified = daemon.tick()
+        self.assertEqual([result['schema_check_status'] for _, result in verified], ["ERROR"] * 3)
+        self.assertEqual(self.scheduled(daemon), set(daemon.entries))
+        self.assertEqual(set(daemon._next_due.values()), {START + 60})
+
+        # The bundle is back: the tables are verified on the next tick after their backoff
+        self.now = START + 60
+        with mock.patch.object(daemon_module, 'load_schema_bundle', return_value=StaticBundle()):
+            verified = daemon.tick()
+        self.assertEqual([result['schema_check_status'] for _, result in verified], ["PASS"] * 3)
+        self.assertEqual(daemon._failures, {})
+
+    def test_failed_save_keeps_every_table_scheduled(self):
+        saved = []
+
+        def save_result(result, entry):
+            if entry.table == 'TABLE_0':
+                raise OSError("disk full")
+            saved.append(entry.table)
+
+        daemon = self.daemon(save_result=save_result)
+        with mock.patch.object(daemon_module, 'load_schema_bundle', return_value=StaticBundle()):
+            verified = daemon.tick()
+        self.assertEqual(len(verified), 3)
+        self.assertEqual(saved, ['TABLE_1', 'TABLE_2'])
+        self.assertEqual(self.scheduled(daemon), set(daemon.entries))
+        self.assertTrue(all(due > START for due in daemon._next_due.values()))
+
+    def test_unexpected_error_reschedules_the_popped_tables(self):
+        daemon = self.daemon()
+        with mock.patch.object(daemon, '_verify', side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                daemon.tick()
+        self.assertEqual(self.scheduled(daemon), set(daemon.entries))
+        self.now = START + 60
+        self.assertEqual(sorted(daemon._pop_due(self.now)), sorted(daemon.entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
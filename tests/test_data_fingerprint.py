@@ -0,0 +1,97 @@
+"""
+Tests of the content fingerprints (udfs/schema-verification/data_fingerprint.py): building a fingerprint from the
+row of a fingerprint query, its JSON round trip and the comparison of fingerprints.
+
+Usage:
+    python -m pytest tests
+"""
+import json
+import logging
+import os
+import sys
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+
+use_offline_config()
+data_fingerprint = load_module('data_fingerprint')
+
+COLUMNS = [
+    {'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER'},
+    {'COLUMN_NAME': 'AMOUNT', 'DATA_TYPE': 'NUMBER'},
+    {'COLUMN_NAME': 'BOOKED_ON', 'DATA_TYPE': 'DATE'},
+    {'COLUMN_NAME': 'UPDATED_AT', 'DATA_TYPE': 'TIMESTAMP_NTZ'},
+    {'COLUMN_NAME': 'PAYLOAD', 'DATA_TYPE': 'VARIANT'},
+]
+
+# Values as the Snowflake connector returns them: NUMBER as int or Decimal, DATE as date, TIMESTAMP as datetime
+ROW = (
+    1000, -4242424242,
+    0, 1, 1000, 17,
+    0, Decimal('0.50'), Decimal('9999.99'), 18,
+    3, date(2024, 1, 1), date(2024, 9, 10), 19,
+    0, datetime(2024, 1, 1, 8, 30), datetime(2024, 9, 10, 11, 51, 2), 20,
+    10, 21,
+)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('SchemaComparatorTest')
+        _, self.layout = data_fingerprint.build_fingerprint_query('DB', 'SCHEMA', 'TABLE', COLUMNS)
+
+    def test_query_layout(self):
+        self.assertEqual(len(self.layout), len(ROW))
+        self.assertNotIn(('PAYLOAD', 'MIN'), self.layout) # no MIN/MAX for VARIANT
+
+    def test_values_are_json_native(self):
+        fingerprint = data_fingerprint.fingerprint_from_row(self.layout, ROW)
+        self.assertEqual(fingerprint['ROW_COUNT'], 1000)
+        self.assertEqual(fingerprint['columns']['AMOUNT']['MIN'], 0.5)
+        self.assertEqual(fingerprint['columns']['BOOKED_ON']['MAX'], '2024-09-10')
+        self.assertEqual(fingerprint['columns']['UPDATED_AT']['MAX'], '2024-09-10T11:51:02')
+
+    def test_json_round_trip_passes(self):
+        stored = json.loads(json.dumps(data_fingerprint.fingerprint_from_row(self.layout, ROW)))
+        result = data_fingerprint.compare_fingerprints(
+            'TABLE', stored, data_fingerprint.fingerprint_from_row(self.layout, ROW), self.logger)
+        self.assertEqual(result['content_check_status'], "PASS", result['mismatches'])
+
+    def test_stored_expectations_match_raw_connector_values(self):
+        expected = {'ROW_COUNT': 1000, 'columns': {
+            'AMOUNT': {'MIN': 0.5, 'MAX': 9999.99},
+            'BOOKED_ON': {'NULL_COUNT': 3, 'MIN': '2024-01-01', 'MAX': '2024-09-10'},
+            'UPDATED_AT': {'MAX': '2024-09-10T11:51:02'},
+        }}
+        raw = {'ROW_COUNT': 1000, 'columns': {}}
+        for (column_name, metric), value in zip(self.layout[2:], ROW[2:]):
+            raw['columns'].setdefault(column_name, {})[metric] = value
+        result = data_fingerprint.compare_fingerprints('TABLE', expected, raw, self.logger)
+        self.assertEqual(result['content_check_status'], "PASS", result['mismatches'])
+
+    def test_changed_values_fail(self):
+        stored = json.loads(json.dumps(data_fingerprint.fingerprint_from_row(self.layout, ROW)))
+        changed = list(ROW)
+        changed[12] = date(2024, 9, 11) # BOOKED_ON MAX
+        changed[0] = 999
+        result = data_fingerprint.compare_fingerprints(
+            'TABLE', stored, data_fingerprint.fingerprint_from_row(self.layout, changed), self.logger)
+        self.assertEqual(result['content_check_status'], "FAIL")
+        self.assertEqual([(mismatch['COLUMN_NAME'], mismatch['ATTRIBUTE']) for mismatch in result['mismatches']],
+                         [('*', 'ROW_COUNT'), ('BOOKED_ON', 'MAX')])
+
+    def test_missing_column_fails(self):
+        expected = {'columns': {'GONE': {'NULL_COUNT': 0}}}
+        result = data_fingerprint.compare_fingerprints(
+            'TABLE', expected, data_fingerprint.fingerprint_from_row(self.layout, ROW), self.logger)
+        self.assertEqual(result['missing_columns'], ['GONE'])
+        self.assertEqual(result['content_check_status'], "FAIL")
+
+
+if __name__ == '__main__':
+    unittest.main()
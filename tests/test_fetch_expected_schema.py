@@ -0,0 +1,111 @@
+"""
+Tests of the cached expected-schema fetch (udfs/schema-verification/fetch_expected_schema_from_s3.py) against the
+S3 stand-in of the benchmarks (FakeS3Client), registered with utils.aws_clients.register_client.
+
+Usage:
+    python -m pytest tests
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError: # the S3 stand-in raises botocore errors, like the real client
+    raise unittest.SkipTest("botocore is not installed")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+from fakes import FakeS3Client # noqa: E402
+
+use_offline_config()
+fetch_module = load_module('fetch_expected_schema_from_s3')
+
+from utils import aws_clients, metrics # noqa: E402
+
+BUCKET_NAME = 'test-bucket'
+KEY = 'snowflake-landing-schemas/CT_COUNTRY_schema.json'
+SCHEMA = [{'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'IS_NULLABLE': 'NO'}]
+
+
+class FetchExpectedSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('SchemaComparatorTest')
+        self.cache_dir = tempfile.mkdtemp()
+        self.s3 = FakeS3Client()
+        self.s3.put_object(Bucket=BUCKET_NAME, Key=KEY, Body=json.dumps(SCHEMA))
+        aws_clients.register_client('s3', self.s3)
+        fetch_module._memory_cache.clear()
+        metrics.get_tracer().reset()
+
+    def tearDown(self):
+        aws_clients.reset_clients()
+        fetch_module._memory_cache.clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def fetch(self, key=KEY):
+        return fetch_module.fetch_expected_schema_cached(self.s3, BUCKET_NAME, key, self.cache_dir)
+
+    def cache_file(self, key=KEY):
+        return fetch_module._cache_path(self.cache_dir, BUCKET_NAME, key)
+
+    def test_miss_then_not_modified(self):
+        self.assertEqual(self.fetch(), (SCHEMA, True))
+        self.assertTrue(os.path.exists(self.cache_file()))
+        self.assertEqual(self.fetch(), (SCHEMA, False))
+        self.assertEqual(metrics.get_tracer().counters[('s3_not_modified', None)], 1)
+        self.assertEqual(self.s3.requests, 3) # the put and two GETs, the second answered 304
+
+    def test_disk_cache_survives_the_process(self):
+        self.fetch()
+        fetch_module._memory_cache.clear()
+        self.assertEqual(self.fetch(), (SCHEMA, False))
+
+    def test_changed_object_is_downloaded_again(self):
+        self.fetch()
+        changed = SCHEMA + [{'COLUMN_NAME': 'NAME', 'DATA_TYPE': 'TEXT', 'IS_NULLABLE': 'YES'}]
+        self.s3.put_object(Bucket=BUCKET_NAME, Key=KEY, Body=json.dumps(changed))
+        self.assertEqual(self.fetch(), (changed, True))
+        fetch_module._memory_cache.clear()
+        self.assertEqual(self.fetch(), (changed, False))
+
+    def test_corrupted_cache_file_is_downloaded_again(self):
+        self.fetch()
+        for content in ('{"etag": "', '[]', '{"etag": "\\"0\\""}'): # cut, not an entry, no schema
+            fetch_module._memory_cache.clear()
+            with open(self.cache_file(), 'w') as f:
+                f.write(content)
+            self.assertEqual(self.fetch(), (SCHEMA, True))
+            with open(self.cache_file(), 'r') as f:
+                self.assertEqual(json.load(f)['schema'], SCHEMA)
+
+    def test_missing_object_raises(self):
+        with self.assertRaises(ClientError) as raised:
+            self.fetch('missing.json')
+        self.assertEqual(raised.exception.response['Error']['Code'], 'NoSuchKey')
+        self.assertFalse(os.path.exists(self.cache_file('missing.json')))
+
+    def test_many_schemas_record_their_errors(self):
+        self.s3.put_object(Bucket=BUCKET_NAME, Key='broken.json', Body='{"COLUMN_NAME": ')
+        keys = [KEY, 'missing.json', 'broken.json', KEY]
+        errors = {}
+        schemas = fetch_module.fetch_expected_schemas_from_s3(BUCKET_NAME, keys, self.logger,
+                                                              cache_dir=self.cache_dir, errors=errors)
+        self.assertEqual(schemas, {KEY: SCHEMA})
+        self.assertIsInstance(errors['missing.json'], ClientError)
+        self.assertIsInstance(errors['broken.json'], json.JSONDecodeError)
+
+    def test_many_schemas_raise_without_errors(self):
+        with self.assertRaises(ClientError):
+            fetch_module.fetch_expected_schemas_from_s3(BUCKET_NAME, [KEY, 'missing.json'], self.logger,
+                                                        cache_dir=self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
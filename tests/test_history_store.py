@@ -0,0 +1,121 @@
+"""
+Tests of the indexed result history (udfs/schema-verification/history_store.py): recording runs, table histories,
+failure streaks and the delta report between two runs.
+
+Usage:
+    python -m pytest tests
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+
+use_offline_config()
+HistoryStore = load_module('history_store').HistoryStore
+
+
+def passed(table, schema='LANDING'):
+    return {'table': table, 'database': 'DB', 'schema': schema, 'schema_check_status': "PASS",
+            'mismatches': [], 'missing_columns': []}
+
+
+def failed(table, schema='LANDING', expected=10, missing=('GONE',)):
+    return {'table': table, 'database': 'DB', 'schema': schema, 'schema_check_status': "FAIL",
+            'mismatches': [{'COLUMN_NAME': 'NAME', 'ATTRIBUTE': 'CHARACTER_MAXIMUM_LENGTH',
+                            'EXPECTED': expected, 'ACTUAL': 20}],
+            'missing_columns': list(missing)}
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.workdir, 'history.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def record_runs(self):
+        self.store.record_results('20240101_000000', [passed('A'), passed('B'), passed('C')])
+        self.store.record_results('20240102_000000', [failed('A'), passed('B'), passed('C')])
+        self.store.record_results('20240103_000000', [failed('A', expected=12), failed('B'), passed('D')])
+
+    def test_runs_and_previous_run(self):
+        self.record_runs()
+        self.assertEqual(self.store.runs(), ['20240103_000000', '20240102_000000', '20240101_000000'])
+        self.assertEqual(self.store.runs(limit=1), ['20240103_000000'])
+        self.assertEqual(self.store.previous_run('20240102_000000'), '20240101_000000')
+        self.assertIsNone(self.store.previous_run('20240101_000000'))
+
+    def test_table_history_and_failing_since(self):
+        self.record_runs()
+        self.assertEqual(self.store.table_history('DB', 'LANDING', 'a'),
+                         [('20240103_000000', "FAIL"), ('20240102_000000', "FAIL"), ('20240101_000000', "PASS")])
+        self.assertEqual(self.store.failing_since('DB', 'LANDING', 'A'), '20240102_000000')
+        self.assertEqual(self.store.failing_since('DB', 'LANDING', 'B'), '20240103_000000')
+        self.assertIsNone(self.store.failing_since('DB', 'LANDING', 'C'))
+        # Same table name in another schema is a different table
+        self.assertEqual(self.store.table_history('DB', 'OTHER', 'A'), [])
+
+    def test_rerecording_replaces_findings(self):
+        self.store.record_results('20240101_000000', [failed('A')])
+        self.store.record_results('20240101_000000', [failed('A', missing=())])
+        self.assertEqual([finding['kind'] for finding in self.store.findings('20240101_000000', 'DB', 'LANDING', 'a')],
+                         ['mismatch'])
+
+    def test_findings_of_same_named_tables_are_kept_apart(self):
+        self.store.record_results('20240101_000000', [failed('A'), failed('A', schema='OTHER', missing=())])
+        self.assertEqual(len(self.store.findings('20240101_000000')), 3)
+        self.assertEqual([(finding['schema'], finding['kind'])
+                          for finding in self.store.findings('20240101_000000', 'db', 'other', 'A')],
+                         [('OTHER', 'mismatch')])
+        self.assertEqual(len(self.store.findings('20240101_000000', 'DB', 'LANDING', 'A')), 2)
+        self.assertEqual(self.store.findings('20240101_000000', None, None, 'A'), [])
+
+    def test_delta_report(self):
+        self.record_runs()
+        report = self.store.delta_report()
+        self.assertEqual((report['run_id'], report['previous_run_id']), ('20240103_000000', '20240102_000000'))
+        self.assertEqual([table['table'] for table in report['new_failures']], ['B'])
+        self.assertEqual([table['table'] for table in report['new_tables']], ['D'])
+        self.assertEqual([table['table'] for table in report['removed_tables']], ['C'])
+        self.assertEqual(report['resolved'], [])
+        # A's mismatch changed its expected value; its missing column is unchanged
+        self.assertEqual(sorted((finding['table'], finding['kind'], finding.get('EXPECTED'))
+                                for finding in report['new_findings']),
+                         [('A', 'mismatch', 12), ('B', 'mismatch', 10), ('B', 'missing_column', None)])
+        self.assertEqual([(finding['table'], finding.get('EXPECTED')) for finding in report['resolved_findings']],
+                         [('A', 10)])
+
+    def test_delta_report_of_an_empty_store(self):
+        with self.assertRaises(ValueError):
+            self.store.delta_report()
+
+    def test_import_json_and_ndjson_results(self):
+        results_dir = os.path.join(self.workdir, 'results')
+        os.makedirs(results_dir)
+        for table, result in (('A', passed('A')), ('B', failed('B'))):
+            with open(os.path.join(results_dir, f"schema_comparison_{table}_20240101_000000.json"), 'w') as f:
+                json.dump({key: value for key, value in result.items() if key not in ('table', 'database', 'schema')},
+                          f)
+        self.assertEqual(self.store.import_json_results(results_dir), 2)
+        self.assertEqual(self.store.table_history(None, None, 'B'), [('20240101_000000', "FAIL")])
+
+        part = os.path.join(self.workdir, 'part-00000.ndjson.gz')
+        with gzip.open(part, 'wt', encoding='utf-8') as f:
+            for result in (failed('A'), passed('B')):
+                f.write(json.dumps(dict(result, run_id='20240102_000000')) + '\n')
+        self.assertEqual(self.store.import_ndjson_results(part), 2)
+        self.assertEqual(self.store.failing_since('DB', 'LANDING', 'A'), '20240102_000000')
+
+
+if __name__ == '__main__':
+    unittest.main()
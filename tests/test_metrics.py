@@ -0,0 +1,51 @@
+"""
+Tests of the process-wide tracer (utils/metrics.py): its span buffers stay bounded while the stage totals and the
+counters keep aggregating every span.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import Tracer # noqa: E402
+
+
+class TracerTest(unittest.TestCase):
+
+    def trace(self, tracer, tables, spans_per_table):
+        for table in tables:
+            for _ in range(spans_per_table):
+                with tracer.span('compare', table=table):
+                    pass
+
+    def test_spans_are_bounded(self):
+        tracer = Tracer(max_spans=5, max_tables=100, max_spans_per_table=3)
+        self.trace(tracer, ['A', 'B', 'C'], 4)
+        self.assertEqual(len(tracer.spans), 5)
+        self.assertEqual(tracer.dropped_spans, 7)
+        self.assertEqual([len(spans) for spans in tracer._spans_by_table.values()], [3, 3, 3])
+        self.assertEqual(tracer.summary()['compare']['count'], 12)
+
+    def test_least_recently_traced_tables_are_evicted(self):
+        tracer = Tracer(max_tables=2)
+        self.trace(tracer, ['A', 'B', 'A', 'C'], 1)
+        self.assertEqual(list(tracer._spans_by_table), ['A', 'C'])
+        self.assertIn('compare', tracer.table_timings('A', since=0))
+        self.assertEqual(tracer.table_timings('B', since=0), {})
+
+    def test_reset_keeps_the_bounds(self):
+        tracer = Tracer(max_spans=2)
+        self.trace(tracer, ['A'], 3)
+        tracer.increment('tables_verified', table='A')
+        tracer.reset()
+        self.assertEqual((len(tracer.spans), tracer.dropped_spans, tracer.counters), (0, 0, {}))
+        self.trace(tracer, ['A'], 3)
+        self.assertEqual(len(tracer.spans), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
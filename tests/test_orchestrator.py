@@ -0,0 +1,153 @@
+"""
+Tests of the verification pipeline (udfs/schema-verification/orchestrator.py) with in-process stand-ins of the
+schema bundle and the metadata backend.
+
+Usage:
+    python -m pytest tests
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+
+use_offline_config()
+orchestrator = load_module('orchestrator')
+VerificationStateStore = load_module('state_store').VerificationStateStore
+
+from utils import metrics # noqa: E402
+
+SCHEMA = [{'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'IS_NULLABLE': 'NO', 'CHARACTER_MAXIMUM_LENGTH': None,
+           'NUMERIC_PRECISION': 38, 'NUMERIC_SCALE': 0, 'DATETIME_PRECISION': None}]
+
+
+class StaticBundle:
+
+    def get(self, schema_name, table_name, database_name=None):
+        return SCHEMA
+
+
+class Backend:
+    """Metadata backend returning SCHEMA for every table; queries of the schemas in hung block until released."""
+
+    def __init__(self, hung=(), schemas=None):
+        self.hung = set(hung)
+        self.schemas = schemas or {} # table name -> actual schema, instead of SCHEMA
+        self.release = threading.Event()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def query_schemas_bulk(self, pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+        with self._lock:
+            self.calls.append((schema_name, len(table_names)))
+        if schema_name in self.hung:
+            self.release.wait(30)
+        with metrics.span('query_execution'):
+            pass
+        return {(schema_name, table_name.upper()): self.schemas.get(table_name, SCHEMA) for table_name in table_names}
+
+
+class OrchestratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('SchemaComparatorTest')
+        self.saved = []
+
+    def run_pipeline(self, entries, backend, **options):
+        self.addCleanup(backend.release.set)
+        pipeline = orchestrator.VerificationOrchestrator(
+            None, self.logger, lambda result, entry: self.saved.append(entry), metadata_backend=backend,
+            schema_bundle=StaticBundle(), **options)
+        return pipeline.run(entries)
+
+    @staticmethod
+    def entries(schema_name, count):
+        return [orchestrator.ManifestEntry('DB', schema_name, f"TABLE_{index}", 'key', 'bucket')
+                for index in range(count)]
+
+    def test_one_bulk_query_per_batch(self):
+        backend = Backend()
+        entries = self.entries('A', 120) + self.entries('B', 30)
+        results = self.run_pipeline(entries, backend, concurrency=4, bulk_query_size=50)
+        self.assertEqual({result['schema_check_status'] for result in results}, {"PASS"})
+        self.assertEqual(sorted(backend.calls), [('A', 20), ('A', 50), ('A', 50), ('B', 30)])
+        self.assertEqual(len(self.saved), 150)
+
+    def test_hung_bulk_query_fails_its_batch_with_one_leaked_thread(self):
+        backend = Backend(hung={'A'})
+        entries = self.entries('A', 40) + self.entries('B', 40)
+        with self.assertLogs(self.logger, level='WARNING') as logs:
+            results = self.run_pipeline(entries, backend, concurrency=4, table_timeout=0.5, bulk_query_size=100)
+        statuses = [result['schema_check_status'] for result in results]
+        self.assertEqual(statuses, ["TIMEOUT"] * 40 + ["PASS"] * 40)
+        self.assertEqual(len(self.saved), 80)
+        leaks = [record.getMessage() for record in logs.records if 'left behind' in record.getMessage()]
+        # One thread stuck in the bulk query, none per table waiting for it
+        self.assertEqual(len(leaks), 2, leaks)
+        self.assertIn('1 threads stuck', leaks[-1])
+
+    def test_spans_are_keyed_by_database_schema_and_table(self):
+        metrics.get_tracer().reset()
+        entries = [orchestrator.ManifestEntry('DB', schema_name, 'CUSTOMERS', 'key', 'bucket')
+                   for schema_name in ('A', 'B')]
+        self.run_pipeline(entries, Backend())
+        tracer = metrics.get_tracer()
+        spans = list(tracer.spans)
+        self.assertEqual({span['table'] for span in spans if span['stage'] == 'comparison'},
+                         {'DB.A.CUSTOMERS', 'DB.B.CUSTOMERS'})
+        # The bulk queries serve whole batches and are not charged to a table
+        self.assertEqual([span['table'] for span in spans if span['stage'] == 'query_execution'], [None, None])
+        self.assertEqual(set(tracer.table_timings('DB.A.CUSTOMERS')), {'comparison', 'result_save'})
+
+
+class IncrementalRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('SchemaComparatorTest')
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        self.state_path = os.path.join(workdir, 'state.json')
+        self.entries = [orchestrator.ManifestEntry('DB', 'A', f"TABLE_{index}", 'key', 'bucket') for index in range(4)]
+        self.last_altered = {('A', entry.table): '2024-01-01T00:00:00' for entry in self.entries}
+
+    def run_pipeline(self, backend):
+        pipeline = orchestrator.VerificationOrchestrator(
+            None, self.logger, lambda result, entry: None, metadata_backend=backend, schema_bundle=StaticBundle(),
+            state_store=VerificationStateStore(self.state_path))
+        with mock.patch.object(orchestrator, 'query_tables_last_altered', return_value=dict(self.last_altered)):
+            with mock.patch.object(orchestrator, 'compare_schemas', wraps=orchestrator.compare_schemas) as compare:
+                results = pipeline.run(self.entries)
+        return results, compare.call_count
+
+    def test_loaded_tables_with_unchanged_structure_are_carried_forward(self):
+        backend = Backend()
+        results, compared = self.run_pipeline(backend)
+        self.assertEqual((compared, backend.calls), (4, [('A', 4)]))
+
+        # Nothing altered: no metadata query, no comparison
+        results, compared = self.run_pipeline(backend)
+        self.assertEqual((compared, backend.calls), (0, [('A', 4)]))
+
+        # Every table loaded (DML moves LAST_ALTERED), one of them also changed structure
+        self.last_altered = {key: '2024-01-02T00:00:00' for key in self.last_altered}
+        backend = Backend(schemas={'TABLE_3': [dict(SCHEMA[0], IS_NULLABLE='YES')]})
+        results, compared = self.run_pipeline(backend)
+        self.assertEqual((compared, backend.calls), (1, [('A', 4)]))
+        self.assertEqual([result['schema_check_status'] for result in results], ["PASS"] * 3 + ["FAIL"])
+        # The carried-forward tables were touched: the next run skips them without a metadata query
+        state = VerificationStateStore(self.state_path)
+        self.assertEqual(state.get('DB.A.TABLE_0')['last_altered'], '2024-01-02T00:00:00')
+        backend = Backend()
+        results, compared = self.run_pipeline(backend)
+        self.assertEqual(backend.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Tests of the cached secret retrieval (utils/secrets_manager.py) against an in-process Secrets Manager stand-in
+registered with utils.aws_clients.register_client.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError: # the batched path needs botocore, like the real client
+    raise unittest.SkipTest("botocore is not installed")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import aws_clients, secrets_manager # noqa: E402
+
+REGION = 'eu-west-1'
+ARN_PREFIX = 'arn:aws:secretsmanager:eu-west-1:123456789012:secret:'
+
+
+class FakeSecretsManager:
+    """Secrets Manager stand-in answering with full ARNs (name + '-' + six characters), like the service."""
+
+    def __init__(self, secrets, batch_errors=(), deny_batch=False):
+        self.secrets = dict(secrets) # name -> value
+        self.batch_errors = set(batch_errors) # names reported in Errors by BatchGetSecretValue
+        self.deny_batch = deny_batch
+        self.calls = []
+
+    def _lookup(self, secret_id):
+        for name, value in self.secrets.items():
+            arn = f"{ARN_PREFIX}{name}-AbCdEf"
+            if secret_id in (name, arn, f"{ARN_PREFIX}{name}"):
+                return {'Name': name, 'ARN': arn, 'SecretString': value}
+        raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': f"{secret_id} not found"}},
+                          'GetSecretValue')
+
+    def get_secret_value(self, SecretId):
+        self.calls.append(('get', SecretId))
+        return self._lookup(SecretId)
+
+    def batch_get_secret_value(self, SecretIdList, **kwargs):
+        self.calls.append(('batch', tuple(SecretIdList)))
+        if self.deny_batch:
+            raise ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}},
+                              'BatchGetSecretValue')
+        values, errors = [], []
+        for secret_id in SecretIdList:
+            try:
+                value = self._lookup(secret_id)
+            except ClientError:
+                value = None
+            if value is None or value['Name'] in self.batch_errors:
+                errors.append({'SecretId': secret_id, 'ErrorCode': 'DecryptionFailure', 'Message': secret_id})
+            else:
+                values.append(value)
+        return {'SecretValues': values, 'Errors': errors}
+
+
+class GetSecretsTest(unittest.TestCase):
+
+    def use(self, client):
+        aws_clients.register_client('secretsmanager', client, REGION)
+        secrets_manager.invalidate_secrets()
+        return client
+
+    def tearDown(self):
+        aws_clients.reset_clients()
+        secrets_manager.invalidate_secrets()
+
+    def test_batched_and_cached(self):
+        client = self.use(FakeSecretsManager({'a': '1', 'b': '2'}))
+        self.assertEqual(secrets_manager.get_secrets(['a', 'b'], REGION), {'a': '1', 'b': '2'})
+        self.assertEqual(secrets_manager.get_secrets(['a', 'b'], REGION), {'a': '1', 'b': '2'})
+        self.assertEqual(client.calls, [('batch', ('a', 'b'))])
+
+    def test_full_and_partial_arns_are_mapped_back(self):
+        client = self.use(FakeSecretsManager({'snowflake/key': 'k', 'snowflake/passphrase': 'p'}))
+        full_arn = f"{ARN_PREFIX}snowflake/key-AbCdEf"
+        partial_arn = f"{ARN_PREFIX}snowflake/passphrase"
+        self.assertEqual(secrets_manager.get_secrets([full_arn, partial_arn], REGION),
+                         {full_arn: 'k', partial_arn: 'p'})
+        self.assertEqual(len(client.calls), 1)
+
+    def test_errored_ids_fall_back_to_get_secret_value(self):
+        client = self.use(FakeSecretsManager({'a': '1', 'b': '2'}, batch_errors={'b'}))
+        self.assertEqual(secrets_manager.get_secrets(['a', 'b'], REGION), {'a': '1', 'b': '2'})
+        self.assertEqual(client.calls, [('batch', ('a', 'b')), ('get', 'b')])
+
+    def test_missing_secret_raises_its_own_error(self):
+        self.use(FakeSecretsManager({'a': '1'}))
+        with self.assertRaises(ClientError) as raised:
+            secrets_manager.get_secrets(['a', 'missing'], REGION)
+        self.assertIn('missing', str(raised.exception))
+
+    def test_denied_batch_falls_back(self):
+        client = self.use(FakeSecretsManager({'a': '1', 'b': '2'}, deny_batch=True))
+        self.assertEqual(secrets_manager.get_secrets(['a', 'b'], REGION), {'a': '1', 'b': '2'})
+        self.assertEqual(client.calls, [('batch', ('a', 'b')), ('get', 'a'), ('get', 'b')])
+
+
+if __name__ == '__main__':
+    unittest.main()
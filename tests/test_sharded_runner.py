@@ -0,0 +1,172 @@
+"""
+Tests of the shard assignment and the per-table checkpoints of sharded runs
+(udfs/schema-verification/sharded_runner.py).
+
+Usage:
+    python -m pytest tests
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+
+use_offline_config()
+sharded_runner = load_module('sharded_runner')
+ManifestEntry = load_module('orchestrator').ManifestEntry
+fetch_expected_schema_from_s3 = load_module('fetch_expected_schema_from_s3')
+write_schema_bundle = load_module('schema_bundle').write_schema_bundle
+
+from utils import metrics # noqa: E402
+
+RUN_ID = '20240101_000000'
+SCHEMA = [{'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'IS_NULLABLE': 'NO', 'CHARACTER_MAXIMUM_LENGTH': None,
+           'NUMERIC_PRECISION': 38, 'NUMERIC_SCALE': 0, 'DATETIME_PRECISION': None}]
+
+
+def make_entries(count):
+    return [ManifestEntry('DB', 'LANDING', f"TABLE_{index}", f"TABLE_{index}_schema.json", 'bucket')
+            for index in range(count)]
+
+
+def status(value):
+    return {'schema_check_status': value}
+
+
+class ShardingTest(unittest.TestCase):
+
+    def test_shard_of_is_stable_and_case_insensitive(self):
+        lower = ManifestEntry('db', 'landing', 'ct_country', 'key', 'bucket')
+        upper = ManifestEntry('DB', 'LANDING', 'CT_COUNTRY', 'other_key', 'other_bucket')
+        self.assertEqual(sharded_runner.table_key(lower), 'DB.LANDING.CT_COUNTRY')
+        # A SHA-1 of the table key, so the shard does not depend on the process (hash seed) or the host
+        self.assertEqual(sharded_runner.shard_of(lower, 7), sharded_runner.shard_of(upper, 7))
+        digest = hashlib.sha1(b'DB.LANDING.CT_COUNTRY').hexdigest()
+        self.assertEqual(sharded_runner.shard_of(lower, 7), int(digest[:16], 16) % 7)
+
+    def test_partition_keeps_every_entry_in_order(self):
+        entries = make_entries(500)
+        shards = sharded_runner.partition_entries(entries, 4)
+        self.assertEqual(len(shards), 4)
+        self.assertEqual(sorted(entry.table for shard in shards for entry in shard),
+                         sorted(entry.table for entry in entries))
+        for index, shard in enumerate(shards):
+            self.assertTrue(shard) # 500 tables hash into every shard
+            self.assertEqual(shard, [entry for entry in entries if sharded_runner.shard_of(entry, 4) == index])
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.run_dir = os.path.join(self.checkpoint_dir, f"run_{RUN_ID}")
+        self.entries = make_entries(3)
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def checkpoint(self, shard_index):
+        return sharded_runner.ShardCheckpoint(os.path.join(self.run_dir, f"shard-{shard_index:05d}-of-00002.ndjson"))
+
+    def test_records_are_read_back(self):
+        with self.checkpoint(0) as checkpoint:
+            checkpoint(status("PASS"), self.entries[0])
+        with self.checkpoint(1) as checkpoint:
+            checkpoint(status("FAIL"), self.entries[1])
+        self.assertEqual(sharded_runner.read_checkpoints(self.checkpoint_dir, RUN_ID),
+                         {'DB.LANDING.TABLE_0': status("PASS"), 'DB.LANDING.TABLE_1': status("FAIL")})
+
+    def test_unknown_run_has_no_checkpoints(self):
+        self.assertEqual(sharded_runner.read_checkpoints(self.checkpoint_dir, 'other'), {})
+
+    def test_finished_result_wins_over_retried_one(self):
+        with self.checkpoint(0) as checkpoint:
+            checkpoint(status("ERROR"), self.entries[0])
+            checkpoint(status("PASS"), self.entries[0])
+            checkpoint(status("FAIL"), self.entries[1])
+            checkpoint(status("TIMEOUT"), self.entries[1]) # a later retry does not replace a finished result
+            checkpoint(status("TIMEOUT"), self.entries[2])
+        results = sharded_runner.read_checkpoints(self.checkpoint_dir, RUN_ID)
+        self.assertEqual(results['DB.LANDING.TABLE_0'], status("PASS"))
+        self.assertEqual(results['DB.LANDING.TABLE_1'], status("FAIL"))
+        self.assertEqual(results['DB.LANDING.TABLE_2'], status("TIMEOUT"))
+
+    def test_line_cut_by_a_crash_is_ignored(self):
+        with self.checkpoint(0) as checkpoint:
+            checkpoint(status("PASS"), self.entries[0])
+            path = checkpoint.path
+        with open(path, 'ab') as f:
+            f.write(json.dumps({'key': 'DB.LANDING.TABLE_1', 'result': status("PASS")}).encode('utf-8')[:20])
+        # Reopening starts the next record on a fresh line
+        with self.checkpoint(0) as checkpoint:
+            checkpoint(status("FAIL"), self.entries[2])
+        self.assertEqual(sharded_runner.read_checkpoints(self.checkpoint_dir, RUN_ID),
+                         {'DB.LANDING.TABLE_0': status("PASS"), 'DB.LANDING.TABLE_2': status("FAIL")})
+
+
+class StaticBackend:
+    """Metadata backend answering every bulk query with SCHEMA for every table."""
+
+    def query_schemas_bulk(self, pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+        return {(schema_name, table_name.upper()): SCHEMA for table_name in table_names}
+
+
+class ShardedRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.entries = make_entries(20)
+        self.bundle = os.path.join(self.workdir, 'schemas.bundle')
+        write_schema_bundle({(entry.database, entry.schema, entry.table): SCHEMA for entry in self.entries},
+                            self.bundle)
+        for name, value in (('get_snowflake_pkb', lambda option: None),
+                            ('get_snowflake_pool', lambda pkb, max_size=4: None)):
+            patcher = mock.patch.object(sharded_runner, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_sharded(self, workers, logger):
+        return sharded_runner.run_sharded(
+            self.entries, workers=workers, run_id=RUN_ID, checkpoint_dir=os.path.join(self.workdir, 'checkpoints'),
+            output_dir=os.path.join(self.workdir, 'out'), metadata_backend=StaticBackend(), schema_bundle=self.bundle,
+            logger=logger)
+
+    def test_workers_are_forked_with_the_log_listener_paused(self):
+        logger = sharded_runner.setup_logging(logging.WARNING) # queued: the listener thread is running
+        pauses = []
+        pause_logging = sharded_runner.pause_logging
+
+        def record_pause():
+            pauses.append(fetch_expected_schema_from_s3._log_listener._thread)
+            pause_logging()
+            pauses.append(fetch_expected_schema_from_s3._log_listener._thread)
+
+        with mock.patch.object(sharded_runner, 'pause_logging', record_pause):
+            results = self.run_sharded(2, logger)
+        self.assertEqual([result['schema_check_status'] for result in results], ["PASS"] * 20)
+        self.assertIsNotNone(pauses[0])
+        self.assertIsNone(pauses[1])
+        # Resumed once the workers are started
+        self.assertIsNotNone(fetch_expected_schema_from_s3._log_listener._thread)
+
+    def test_in_process_shard_starts_with_a_fresh_tracer(self):
+        with metrics.span('stale'):
+            pass
+        results = self.run_sharded(1, logging.getLogger('SchemaComparatorTest'))
+        self.assertEqual(len(results), 20)
+        stages = {span['stage'] for span in metrics.get_tracer().spans}
+        self.assertNotIn('stale', stages)
+        self.assertIn('comparison', stages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+Tests of the Snowflake connection pool (utils/snowflake_pool.py) and of the process-wide pool returned by
+utils.snowflake_connection.get_snowflake_pool, with a fake connector factory instead of Snowflake.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'utils.config_variables' not in sys.modules:
+    try:
+        import utils.config_variables # noqa: F401 (deployment settings, when present)
+    except ImportError:
+        config = types.ModuleType('utils.config_variables')
+        config.snowflake_config = {key: 'TEST' for key in ('user', 'account', 'warehouse', 'database', 'schema',
+                                                           'role')}
+        sys.modules['utils.config_variables'] = config
+
+from utils import snowflake_connection
+from utils.snowflake_pool import PoolTimeoutError, SnowflakeConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.queries += 1
+        if self.conn.expired:
+            error = Exception("Session no longer exists")
+            error.errno = 390111
+            raise error
+
+    def fetchall(self):
+        return [(1,)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.expired = False
+        self.queries = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFactory:
+    """Connection factory recording every connection it opened."""
+
+    def __init__(self):
+        self.connections = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        conn = FakeConnection()
+        with self._lock:
+            self.connections.append(conn)
+        return conn
+
+
+class SnowflakeConnectionPoolTest(unittest.TestCase):
+
+    def test_reuses_idle_connections(self):
+        factory = FakeFactory()
+        pool = SnowflakeConnectionPool(factory, max_size=2)
+        for _ in range(5):
+            with pool.connection() as conn:
+                self.assertIs(conn, factory.connections[0])
+        self.assertEqual(pool.connects, 1)
+        self.assertEqual(pool.size, 1)
+
+    def test_bounded_by_max_size(self):
+        pool = SnowflakeConnectionPool(FakeFactory(), max_size=1, acquire_timeout=0.05)
+        with pool.connection():
+            with self.assertRaises(PoolTimeoutError):
+                with pool.connection():
+                    pass
+
+    def test_unhealthy_connection_is_replaced(self):
+        factory = FakeFactory()
+        pool = SnowflakeConnectionPool(factory, max_size=1, health_check_interval=0)
+        with pool.connection():
+            pass
+        factory.connections[0].closed = True
+        with pool.connection() as conn:
+            self.assertIs(conn, factory.connections[1])
+        self.assertEqual((pool.connects, pool.discards), (2, 1))
+
+    def test_expired_session_is_retried_on_a_new_connection(self):
+        factory = FakeFactory()
+        pool = SnowflakeConnectionPool(factory, max_size=1)
+        with pool.connection():
+            pass
+        factory.connections[0].expired = True
+
+        def query(conn):
+            with conn.cursor() as cs:
+                cs.execute("SELECT 1")
+            return conn
+
+        self.assertIs(pool.run(query), factory.connections[1])
+        self.assertTrue(factory.connections[0].closed)
+        self.assertEqual(pool.discards, 1)
+
+    def test_counters_under_concurrency(self):
+        factory = FakeFactory()
+        pool = SnowflakeConnectionPool(factory, max_size=4, health_check_interval=0,
+                                       health_check=lambda conn: False) # every reuse is discarded
+
+        def borrow():
+            for _ in range(200):
+                with pool.connection():
+                    pass
+
+        threads = [threading.Thread(target=borrow) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(pool.connects, len(factory.connections))
+        self.assertEqual(pool.discards, pool.connects - pool.size)
+
+    def test_close(self):
+        factory = FakeFactory()
+        pool = SnowflakeConnectionPool(factory, max_size=2)
+        with pool.connection():
+            pass
+        pool.close()
+        self.assertTrue(factory.connections[0].closed)
+        with self.assertRaises(RuntimeError):
+            with pool.connection():
+                pass
+
+
+class SharedPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = FakeFactory()
+        self.create = snowflake_connection.create_snowflake_connection
+        snowflake_connection.create_snowflake_connection = lambda pkb: self.factory()
+        snowflake_connection.close_snowflake_pool()
+
+    def tearDown(self):
+        snowflake_connection.close_snowflake_pool()
+        snowflake_connection.create_snowflake_connection = self.create
+
+    def test_shared_pool(self):
+        pool = snowflake_connection.get_snowflake_pool(b'key', max_size=2)
+        self.assertIs(snowflake_connection.get_snowflake_pool(b'key', max_size=2), pool)
+        with pool.connection() as conn:
+            self.assertIs(conn, self.factory.connections[0])
+
+    def test_other_max_size_keeps_the_pool_and_warns(self):
+        pool = snowflake_connection.get_snowflake_pool(b'key', max_size=2)
+        with self.assertLogs('SchemaComparator', level='WARNING'):
+            self.assertIs(snowflake_connection.get_snowflake_pool(b'key', max_size=8), pool)
+
+    def test_new_key_replaces_the_pool(self):
+        pool = snowflake_connection.get_snowflake_pool(b'key', max_size=2)
+        with pool.connection():
+            pass
+        replacement = snowflake_connection.get_snowflake_pool(b'rotated key', max_size=2)
+        self.assertIsNot(replacement, pool)
+        self.assertTrue(self.factory.connections[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Tests of the bisecting table diff (udfs/schema-verification/table_diff.py) on the SQLite stand-in of the
+benchmarks (FakeWarehouse), which registers HASH and HASH_AGG so that the diff queries run unchanged.
+
+Usage:
+    python -m pytest tests
+"""
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+from fakes import FakeWarehouse # noqa: E402
+
+use_offline_config()
+TableDiff = load_module('table_diff').TableDiff
+
+COLUMNS = [('ID', 'INTEGER'), ('NAME', 'TEXT'), ('AMOUNT', 'REAL')]
+SOURCE = ('TEST_DB', 'TEST', 'SOURCE')
+TARGET = ('TEST_DB', 'TEST', 'TARGET')
+
+
+def make_rows(num_rows):
+    return {key: (key, f"name-{key}", key * 1.5) for key in range(1, num_rows + 1)}
+
+
+class TableDiffTest(unittest.TestCase):
+
+    def diff(self, source_rows, target_rows, **options):
+        warehouse = FakeWarehouse()
+        warehouse.create_table('TEST', 'SOURCE', COLUMNS, list(source_rows.values()))
+        warehouse.create_table('TEST', 'TARGET', COLUMNS, list(target_rows.values()))
+        options.setdefault('bisection_threshold', 50)
+        return TableDiff(warehouse.run_query, SOURCE, TARGET, 'ID', ['NAME', 'AMOUNT'],
+                         logging.getLogger('SchemaComparatorTest'), **options).run()
+
+    def test_identical_tables_pass(self):
+        rows = make_rows(5000)
+        result = self.diff(rows, dict(rows))
+        self.assertEqual(result['content_check_status'], "PASS")
+        self.assertEqual((result['source_row_count'], result['target_row_count']), (5000, 5000))
+        # Only the bounds and one level of segment checksums are queried
+        self.assertEqual(result['queries'], 4)
+
+    def test_values_swapped_between_keys(self):
+        source_rows = make_rows(5000)
+        target_rows = dict(source_rows)
+        # Every compared value moves to the other key, so the segment holds the same set of values
+        target_rows[10] = (10, *source_rows[11][1:])
+        target_rows[11] = (11, *source_rows[10][1:])
+        result = self.diff(source_rows, target_rows)
+        self.assertEqual(result['content_check_status'], "FAIL")
+        self.assertEqual(result['changed_keys'], [10, 11])
+        self.assertEqual((result['missing_in_target'], result['missing_in_source']), ([], []))
+
+    def test_deleted_and_added_keys(self):
+        source_rows = make_rows(5000)
+        target_rows = dict(source_rows)
+        for key in (7, 2500, 4999):
+            del target_rows[key]
+        for key in (5001, 5002):
+            target_rows[key] = (key, f"name-{key}", 0.0)
+        result = self.diff(source_rows, target_rows)
+        self.assertEqual(result['content_check_status'], "FAIL")
+        self.assertEqual(result['missing_in_target'], [7, 2500, 4999])
+        self.assertEqual(result['missing_in_source'], [5001, 5002])
+        self.assertEqual(result['changed_keys'], [])
+        self.assertEqual((result['missing_in_target_count'], result['missing_in_source_count']), (3, 2))
+
+    def test_changed_values_are_found_by_bisection(self):
+        source_rows = make_rows(20000)
+        target_rows = dict(source_rows)
+        for key in (3, 12345, 19999):
+            target_rows[key] = (key, source_rows[key][1], -1.0)
+        result = self.diff(source_rows, target_rows, segments=8)
+        self.assertEqual(result['changed_keys'], [3, 12345, 19999])
+        self.assertLess(result['queries'], 40)
+
+    def test_keys_at_and_below_segment_boundaries_on_a_wide_range(self):
+        low, high, segments = 0, 10 ** 7, 16
+        width = high - low + 1
+        # With exact arithmetic, segment s starts at ceil(s * width / segments)
+        boundaries = [low + -(-segment * width // segments) for segment in range(1, segments)]
+        keys = sorted({low, high, *boundaries, *(boundary - 1 for boundary in boundaries)})
+        source_rows = {key: (key, f"name-{key}", 1.0) for key in keys}
+        target_rows = dict(source_rows)
+        for boundary in boundaries:
+            target_rows[boundary - 1] = (boundary - 1, f"name-{boundary - 1}", 2.0)
+        queries = []
+        warehouse = FakeWarehouse()
+        warehouse.create_table('TEST', 'SOURCE', COLUMNS, list(source_rows.values()))
+        warehouse.create_table('TEST', 'TARGET', COLUMNS, list(target_rows.values()))
+
+        def run_query(sql_statement, params):
+            queries.append(sql_statement)
+            return warehouse.run_query(sql_statement, params)
+        result = TableDiff(run_query, SOURCE, TARGET, 'ID', ['NAME', 'AMOUNT'],
+                           logging.getLogger('SchemaComparatorTest'), segments=segments, bisection_threshold=1).run()
+        self.assertEqual(result['changed_keys'], [boundary - 1 for boundary in boundaries])
+        # Segments are matched on integer bounds, not computed with a (rounded) NUMBER division
+        self.assertTrue(all('/' not in sql_statement for sql_statement in queries))
+
+    def test_reported_keys_are_truncated(self):
+        source_rows = make_rows(100)
+        target_rows = {key: row for key, row in source_rows.items() if key > 30}
+        result = self.diff(source_rows, target_rows, max_reported_keys=10)
+        self.assertEqual(result['missing_in_target'], list(range(1, 11)))
+        self.assertEqual(result['missing_in_target_count'], 30)
+
+    def test_empty_tables(self):
+        result = self.diff({}, {})
+        self.assertEqual(result['content_check_status'], "PASS")
+        self.assertEqual(result['queries'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests of the type-equivalence rules (udfs/schema-verification/type_equivalence.py), alone and applied by
+compare_schemas and compare_schemas_batch.
+
+Usage:
+    python -m pytest tests
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from _loader import load_module, use_offline_config # noqa: E402
+
+use_offline_config()
+type_equivalence = load_module('type_equivalence')
+compare_schemas = load_module('compare_schemas')
+batch_compare = load_module('batch_compare')
+
+
+def column(name, data_type, nullable='YES', length=None, precision=None, scale=None, datetime_precision=None):
+    return {'COLUMN_NAME': name, 'DATA_TYPE': data_type, 'IS_NULLABLE': nullable, 'CHARACTER_MAXIMUM_LENGTH': length,
+            'NUMERIC_PRECISION': precision, 'NUMERIC_SCALE': scale, 'DATETIME_PRECISION': datetime_precision}
+
+
+def record(*values):
+    # Attribute values in SCHEMA_ATTRIBUTES order
+    return tuple(values) + (None,) * (len(compare_schemas.SCHEMA_ATTRIBUTES) - len(values))
+
+
+# Contract as written by hand and the same columns as INFORMATION_SCHEMA reports them
+EXPECTED = [
+    column('ID', 'INTEGER', nullable='N'),
+    column('NAME', 'VARCHAR(100)'),
+    column('AMOUNT', 'NUMBER(10,2)'),
+    column('RATE', 'DOUBLE', precision=53),
+    column('CREATED_AT', 'DATETIME'),
+    column('NOTES', 'STRING'),
+]
+ACTUAL = [
+    column('ID', 'NUMBER', nullable='NO', precision=38, scale=0),
+    column('NAME', 'TEXT', length=100),
+    column('AMOUNT', 'NUMBER', precision=Decimal('10'), scale=2.0),
+    column('RATE', 'FLOAT'),
+    column('CREATED_AT', 'TIMESTAMP_NTZ', datetime_precision=9),
+    column('NOTES', 'TEXT', length=16777216),
+]
+
+
+class TypeEquivalenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = type_equivalence.TypeEquivalence()
+
+    def assertEquivalent(self, first, second):
+        self.assertEqual(self.rules.normalize(first), self.rules.normalize(second))
+
+    def test_aliases_parameters_and_defaults(self):
+        self.assertEquivalent(record('VARCHAR(100)', 'YES'), record('TEXT', 'Y', 100.0))
+        self.assertEquivalent(record('integer', 'Y'), record('NUMBER', 'YES', None, 38, 0))
+        self.assertEquivalent(record('DECIMAL(10, 2)'), record('NUMBER', None, None, '10', Decimal('2')))
+        self.assertEquivalent(record('STRING'), record('TEXT', None, 16777216))
+        self.assertEqual(self.rules.normalize(record('FLOAT', None, None, 53)), record('FLOAT'))
+
+    def test_differences_remain(self):
+        normalize = self.rules.normalize
+        self.assertNotEqual(normalize(record('VARCHAR(100)')), normalize(record('TEXT', None, 200)))
+        self.assertNotEqual(normalize(record('NUMBER(10,2)')), normalize(record('NUMBER')))
+        self.assertNotEqual(normalize(record('DATE')), normalize(record('TIMESTAMP_NTZ')))
+
+    def test_custom_rules_replace_a_section(self):
+        rules = type_equivalence.TypeEquivalence({'type_aliases': {'STRING': 'TEXT'}})
+        self.assertEqual(rules.normalize(record('STRING'))[0], 'TEXT')
+        self.assertEqual(rules.normalize(record('VARCHAR'))[0], 'VARCHAR') # the default aliases are replaced
+        self.assertEqual(rules.normalize(record('VARCHAR', 'N'))[1], 'NO') # the other sections keep their defaults
+        self.assertNotEqual(rules.fingerprint, self.rules.fingerprint)
+
+    def test_unknown_section_is_rejected(self):
+        with self.assertRaises(ValueError):
+            type_equivalence.TypeEquivalence({'aliases': {}})
+
+    def test_get_type_equivalence(self):
+        self.assertIsNone(type_equivalence.get_type_equivalence(None))
+        self.assertIsNone(type_equivalence.get_type_equivalence(False))
+        self.assertIs(type_equivalence.get_type_equivalence(True), type_equivalence.get_type_equivalence('default'))
+        self.assertIs(type_equivalence.get_type_equivalence(self.rules), self.rules)
+        workdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(workdir, 'rules.json')
+            with open(path, 'w') as f:
+                json.dump({'value_aliases': {}}, f)
+            rules = type_equivalence.get_type_equivalence(path)
+            self.assertEqual(rules.normalize(record('TEXT', 'Y'))[1], 'Y')
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def test_compare_schemas_with_equivalence(self):
+        logger = logging.getLogger('SchemaComparatorTest')
+        raw = compare_schemas.compare_schemas('T', EXPECTED, ACTUAL, logger)
+        self.assertEqual(raw['schema_check_status'], "FAIL")
+        result = compare_schemas.compare_schemas('T', EXPECTED, ACTUAL, logger, type_equivalence=self.rules)
+        self.assertEqual(result['schema_check_status'], "PASS", result['mismatches'])
+
+        drifted = ACTUAL[:1] + [column('NAME', 'TEXT', length=50)] + ACTUAL[2:]
+        result = compare_schemas.compare_schemas('T', EXPECTED, drifted, logger, type_equivalence=self.rules)
+        # Only the length differs once normalized; the mismatch reports the raw values
+        self.assertEqual([(mismatch['COLUMN_NAME'], mismatch['ATTRIBUTE'], mismatch['EXPECTED'], mismatch['ACTUAL'])
+                          for mismatch in result['mismatches']],
+                         [('NAME', 'CHARACTER_MAXIMUM_LENGTH', None, 50)])
+
+    def test_batch_matches_per_table_comparison(self):
+        logger = logging.getLogger('SchemaComparatorTest')
+        drifted = ACTUAL[:1] + [column('NAME', 'TEXT', length=50)] + ACTUAL[2:]
+        pairs = [('PASSING', EXPECTED, ACTUAL), ('DRIFTED', EXPECTED, drifted)]
+        batch = batch_compare.compare_schemas_batch(pairs, logger, type_equivalence=self.rules)
+        for (table_name, expected, actual), result in zip(pairs, batch):
+            single = compare_schemas.compare_schemas(table_name, expected, actual, logger, type_equivalence=self.rules)
+            self.assertEqual(result['schema_check_status'], single['schema_check_status'])
+            self.assertEqual(result['mismatches'], single['mismatches'])
+
+
+if __name__ == '__main__':
+    unittest.main()
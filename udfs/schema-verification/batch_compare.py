@@ -0,0 +1,170 @@
+import time
+from operator import itemgetter
+
+from .compare_schemas import SCHEMA_ATTRIBUTES
+from utils import metrics
+
+
+class ColumnarSchema:
+    """
+    Column-major representation of one table schema.
+
+    Instead of one dictionary per column, the schema is stored as a list of column names plus one
+    list per attribute (DATA_TYPE, IS_NULLABLE, ...). Iterating over it still yields one dictionary
+    per column, built lazily, so it can be passed anywhere a list of column dictionaries is expected.
+    """
+    __slots__ = ('names', 'columns')
+
+    def __init__(self, names, columns):
+        self.names = names # upper-case column names
+        self.columns = columns # attribute name -> list of values, aligned with names
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a ColumnarSchema from a list of column dictionaries (expected or actual schema)."""
+        if isinstance(rows, cls):
+            return rows
+        rows = list(rows)
+        names = [row['COLUMN_NAME'].upper() for row in rows]
+        columns = {attribute: [row.get(attribute) for row in rows] for attribute in SCHEMA_ATTRIBUTES}
+        return cls(names, columns)
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, index):
+        """Returns the column at the given position as a dictionary."""
+        column = {'COLUMN_NAME': self.names[index]}
+        for attribute in SCHEMA_ATTRIBUTES:
+            column[attribute] = self.columns[attribute][index]
+        return column
+
+    def __iter__(self):
+        for index in range(len(self.names)):
+            yield self.row(index)
+
+    def records(self):
+        """Returns one tuple of attribute values per column, in SCHEMA_ATTRIBUTES order."""
+        return list(zip(*(self.columns[attribute] for attribute in SCHEMA_ATTRIBUTES)))
+
+
+# Pulls COLUMN_NAME followed by the compared attributes out of a column dictionary in one C-level call
+_get_record = itemgetter('COLUMN_NAME', *SCHEMA_ATTRIBUTES)
+
+
+def _records(schema):
+    """
+    Returns a dictionary COLUMN_NAME -> attribute tuple (in SCHEMA_ATTRIBUTES order) for one schema.
+
+    Later duplicates of a column name overwrite earlier ones, like the dictionaries built by compare_schemas.
+    """
+    if isinstance(schema, ColumnarSchema):
+        return dict(zip(schema.names, schema.records()))
+    try:
+        rows = list(map(_get_record, schema))
+    except KeyError:
+        # Some attributes are absent from this schema; treat them as None like compare_schemas does
+        rows = [(row['COLUMN_NAME'],) + tuple(row.get(attribute) for attribute in SCHEMA_ATTRIBUTES) for row in schema]
+    return {row[0].upper(): row[1:] for row in rows}
+
+
+def _identical(expected_schema, actual_schema):
+    """
+    Cheap check for the common case of an unchanged table.
+
+    Columnar schemas are compared list by list and lists of dictionaries as a whole, both of which run
+    as single C-level comparisons. When only one side is columnar, the other side is converted first.
+    A False answer only means the detailed comparison has to run.
+    """
+    expected_columnar = isinstance(expected_schema, ColumnarSchema)
+    if expected_columnar != isinstance(actual_schema, ColumnarSchema):
+        if len(expected_schema) != len(actual_schema):
+            return False
+        expected_schema = ColumnarSchema.from_rows(expected_schema)
+        actual_schema = ColumnarSchema.from_rows(actual_schema)
+    if isinstance(expected_schema, ColumnarSchema):
+        return (expected_schema.names == actual_schema.names
+                and all(expected_schema.columns[attribute] == actual_schema.columns[attribute]
+                        for attribute in SCHEMA_ATTRIBUTES))
+    return expected_schema == actual_schema
+
+
+def _compare_table(table_name, expected_schema, actual_schema, type_equivalence=None, detect_extra_columns=False):
+    """Compares one table and returns its result in the compare_schemas shape."""
+    result = {'schema_check_status': "PASS", 'table': table_name, 'mismatches': [], 'missing_columns': []}
+    if detect_extra_columns:
+        result['extra_columns'] = []
+    if _identical(expected_schema, actual_schema):
+        return result
+
+    expected = _records(expected_schema)
+    actual = _records(actual_schema)
+    if expected == actual:
+        return result # same columns in a different order
+    if type_equivalence is None:
+        expected_compared, actual_compared = expected, actual
+    else:
+        # One memoized lookup per column (see type_equivalence.TypeEquivalence.normalize)
+        normalize = type_equivalence.normalize
+        expected_compared = dict(zip(expected, map(normalize, expected.values())))
+        actual_compared = dict(zip(actual, map(normalize, actual.values())))
+        if expected_compared == actual_compared:
+            return result # only equivalent differences
+
+    # Missing columns: expected names that have no actual counterpart (kept in expected order)
+    missing_columns = result['missing_columns']
+    mismatches = result['mismatches']
+    for column_name, expected_record in expected_compared.items():
+        actual_record = actual_compared.get(column_name)
+        if actual_record is None:
+            missing_columns.append(column_name)
+        elif actual_record != expected_record:
+            # Attribute by attribute comparison only for the columns whose tuples differ; the raw values are reported
+            for attribute, expected_value, actual_value, expected_normalized, actual_normalized in zip(
+                    SCHEMA_ATTRIBUTES, expected[column_name], actual[column_name], expected_record, actual_record):
+                if expected_normalized != actual_normalized:
+                    mismatches.append({
+                        'COLUMN_NAME': column_name,
+                        'ATTRIBUTE': attribute,
+                        'EXPECTED': expected_value,
+                        'ACTUAL': actual_value
+                    })
+    if detect_extra_columns:
+        result['extra_columns'] = [column_name for column_name in actual if column_name not in expected]
+
+    if mismatches or missing_columns or result.get('extra_columns'):
+        result['schema_check_status'] = "FAIL"
+    return result
+
+
+def compare_schemas_batch(pairs, logger, type_equivalence=None, detect_extra_columns=False):
+    """
+    Compares the expected and actual schemas of many tables at once.
+
+    Unchanged tables, which are the vast majority on a normal run, are detected with whole-list comparisons
+    (per attribute array for ColumnarSchema inputs). Only the remaining tables are indexed by column name,
+    and their columns are compared attribute by attribute only when their attribute tuples differ.
+    Nothing is logged per column; one summary line is logged for the whole batch.
+
+    Parameters:
+        pairs (list): List of (table_name, expected_schema, actual_schema) tuples. Schemas can be lists of
+                      dictionaries or ColumnarSchema objects.
+        logger (logging.Logger): Logger for logging messages.
+        type_equivalence, detect_extra_columns: See compare_schemas. Tables whose raw schemas are identical
+            never reach the type-equivalence rules.
+
+    Returns:
+        list: One comparison result per table, in input order, with the same shape as compare_schemas.
+    """
+    pairs = list(pairs)
+    logger.info(f"Starting batch schema comparison for {len(pairs)} tables.")
+    start = time.perf_counter()
+
+    with metrics.span('comparison', tables=len(pairs)):
+        results = [_compare_table(table_name, expected_schema, actual_schema, type_equivalence, detect_extra_columns)
+                   for table_name, expected_schema, actual_schema in pairs]
+
+    failed = sum(result['schema_check_status'] == "FAIL" for result in results)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Batch schema comparison completed: {len(results)} tables, {failed} failed in {elapsed_ms:.1f} ms.")
+    return results
@@ -1,4 +1,106 @@
-def compare_schemas(table_name, expected_schema, actual_schema, logger):
+import json
+import logging
+from operator import itemgetter
+
+# Attributes compared for each column present in both the expected and the actual schema
+SCHEMA_ATTRIBUTES = ['DATA_TYPE', 'IS_NULLABLE', 'CHARACTER_MAXIMUM_LENGTH',
+                     'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION']
+
+# Pulls the compared attributes out of a column dictionary in one C-level call
+_get_attributes = itemgetter(*SCHEMA_ATTRIBUTES)
+
+# Keys holding the PASS/FAIL status of a result, per kind of check (schema, content)
+STATUS_KEYS = ('schema_check_status', 'content_check_status')
+
+# Statuses of tables whose verification could not complete (as opposed to PASS/FAIL)
+ERROR_STATUSES = frozenset({"ERROR", "TIMEOUT"})
+
+# How compare_schemas reports what it finds:
+#   'detail': one log line per mismatching attribute and per missing column
+#   'table':  one structured summary per failed table (see log_table_report)
+#   'run':    nothing per table; the caller logs one summary for the whole run (see log_run_report)
+REPORT_MODES = ('detail', 'table', 'run')
+
+
+def result_status(result):
+    """Returns the status (PASS, FAIL, ...) of a schema or content check result."""
+    for key in STATUS_KEYS:
+        if key in result:
+            return result[key]
+    return None
+
+
+class _JSONPayload:
+    """Log argument rendered as JSON only when the record is formatted (i.e. when a handler emits it)."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, default=str)
+
+
+def log_table_report(result, logger):
+    """
+    Logs one structured summary line for a failed table: the counts of findings followed by the findings
+    as JSON. The result is also attached to the record as `schema_report` for structured handlers.
+    Nothing is formatted unless WARNING is enabled on the logger.
+    """
+    if result_status(result) == "PASS" or not logger.isEnabledFor(logging.WARNING):
+        return
+    findings = {key: result.get(key, []) for key in ('mismatches', 'missing_columns', 'extra_columns')}
+    logger.warning("Schema check failed for table %s: %d mismatched attributes, %d missing columns, "
+                   "%d extra columns: %s", result.get('table'), len(findings['mismatches']),
+                   len(findings['missing_columns']), len(findings['extra_columns']), _JSONPayload(findings),
+                   extra={'schema_report': result})
+
+
+def _finding_count(result):
+    return (len(result.get('mismatches', [])) + len(result.get('missing_columns', []))
+            + len(result.get('extra_columns', [])))
+
+
+def log_run_report(results, logger, max_tables=20):
+    """
+    Logs one structured summary line for a whole run: the count per status, the mismatches per attribute,
+    the numbers of missing and extra columns and the max_tables tables with the most findings (as JSON).
+    Logged as a warning when some tables did not pass, else as info, and only formatted if that level is enabled.
+    """
+    failed = [result for result in results if result_status(result) != "PASS"]
+    level = logging.WARNING if failed else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+    statuses = {}
+    for result in results:
+        statuses[result_status(result)] = statuses.get(result_status(result), 0) + 1
+    by_attribute = {}
+    missing_columns = 0
+    extra_columns = 0
+    for result in failed:
+        for mismatch in result.get('mismatches', []):
+            by_attribute[mismatch['ATTRIBUTE']] = by_attribute.get(mismatch['ATTRIBUTE'], 0) + 1
+        missing_columns += len(result.get('missing_columns', []))
+        extra_columns += len(result.get('extra_columns', []))
+    worst = sorted(failed, key=_finding_count, reverse=True)[:max_tables]
+    report = {
+        'statuses': statuses,
+        'mismatches_by_attribute': by_attribute,
+        'missing_columns': missing_columns,
+        'extra_columns': extra_columns,
+        'tables': {result.get('table'): {'status': result_status(result),
+                                         'mismatches': len(result.get('mismatches', [])),
+                                         'missing_columns': len(result.get('missing_columns', [])),
+                                         'extra_columns': len(result.get('extra_columns', [])),
+                                         **({'error': result['error']} if 'error' in result else {})}
+                   for result in worst}
+    }
+    logger.log(level, "Schema check of %d tables: %d did not pass: %s", len(results), len(failed),
+               _JSONPayload(report), extra={'schema_report': report})
+
+
+def compare_schemas(table_name, expected_schema, actual_schema, logger, report_mode='detail', type_equivalence=None,
+                    detect_extra_columns=False):
     """
     Compares the expected and actual schemas and identifies mismatches.
     
@@ -6,11 +108,23 @@ def compare_schemas(table_name, expected_schema, actual_schema, logger):
         expected_schema (list): List of dictionaries representing the expected schema.
         actual_schema (list): List of dictionaries representing the actual schema.
         logger (logging.Logger): Logger for logging messages.
+        report_mode (str, optional): 'detail' (one line per finding), 'table' (one summary per failed table)
+            or 'run' (nothing logged; see log_run_report). See REPORT_MODES.
+        type_equivalence (TypeEquivalence, optional): Rules applied to both schemas before comparing them (see
+            type_equivalence). Mismatches still report the raw values. Defaults to raw comparisons.
+        detect_extra_columns (bool, optional): Also report the columns of the actual schema that were not expected
+            (extra_columns); they fail the check.
     
     Returns:
         dict: Dictionary containing lists of mismatches, missing columns, and extra columns.
     """
-    logger.info("Starting schema comparison.")
+    if report_mode not in REPORT_MODES:
+        raise ValueError(f"Unsupported report_mode: {report_mode!r}. Expected one of {', '.join(REPORT_MODES)}.")
+    # Findings are always collected; they are only logged one by one in detail mode, if the level is enabled
+    log_missing = report_mode == 'detail' and logger.isEnabledFor(logging.WARNING)
+    log_mismatches = report_mode == 'detail' and logger.isEnabledFor(logging.ERROR)
+    if report_mode == 'detail':
+        logger.info("Starting schema comparison.")
     
     # Convert lists to dictionaries keyed by COLUMN_NAME for easier comparison
     expected_dict = {col['COLUMN_NAME'].upper(): col for col in expected_schema}
@@ -26,34 +140,35 @@ def compare_schemas(table_name, expected_schema, actual_schema, logger):
                                                   # If the column is not found, this means the column is missing from the actual schema. 
         if not actual_col:
             missing_columns.append(column_name) # if the column is not found, it is added to the missing columns list. 
-            logger.warning(f"Missing column in actual schema: {column_name}")
+            if log_missing:
+                logger.warning("Missing column in actual schema: %s", column_name)
             continue # the function continues to the next column without performing further comparisons on this missing column. 
         
         # Compare each attribute
         # Once a column exists in both the actual and expected schema, we begin comparing each attribute. 
-        for key in ['DATA_TYPE', 'IS_NULLABLE', 'CHARACTER_MAXIMUM_LENGTH', 
-                    'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION']: # attributes to be compared for each column. 
-            expected_value = expected_col.get(key) # retrieves the expected value of the current attribute from the expected schema.
-            actual_value = actual_col.get(key) # retrieves the actual value for the same attribute from the actual schema. 
-            
-            # # Normalize None and zero values if necessary
-            # if expected_value is None:
-            #     expected_value_normalized = None
-            # elif isinstance(expected_value, float) and expected_value.is_integer():
-            #     expected_value_normalized = int(expected_value)
-            # else:
-            #     expected_value_normalized = expected_value
-            
-            # if actual_value is None:
-            #     actual_value_normalized = None
-            # elif isinstance(actual_value, float) and actual_value.is_integer():
-            #     actual_value_normalized = int(actual_value)
-            # else:
-            #     actual_value_normalized = actual_value
-
-            # Identifying mismatches
-            # If the expected value and the actual value are different, it is considered a mismatch. 
-            if expected_value != actual_value:
+        # The attribute values of both columns are gathered as tuples (in SCHEMA_ATTRIBUTES order): equal tuples mean
+        # the column matches. Differing tuples are normalized by the type-equivalence rules, if any, and compared again.
+        try:
+            expected_record = _get_attributes(expected_col)
+            actual_record = _get_attributes(actual_col)
+        except KeyError: # some attributes are absent from a column; they count as None
+            expected_record = tuple(map(expected_col.get, SCHEMA_ATTRIBUTES))
+            actual_record = tuple(map(actual_col.get, SCHEMA_ATTRIBUTES))
+        if expected_record == actual_record:
+            continue
+        if type_equivalence is None:
+            expected_compared, actual_compared = expected_record, actual_record
+        else:
+            expected_compared = type_equivalence.normalize(expected_record)
+            actual_compared = type_equivalence.normalize(actual_record)
+            if expected_compared == actual_compared:
+                continue
+
+        # Identifying mismatches
+        # If the expected value and the actual value are different (once normalized), it is considered a mismatch. 
+        for key, expected_value, actual_value, expected_normalized, actual_normalized in zip(
+                SCHEMA_ATTRIBUTES, expected_record, actual_record, expected_compared, actual_compared):
+            if expected_normalized != actual_normalized:
                 mismatch_detail = {
                     'COLUMN_NAME': column_name,
                     'ATTRIBUTE': key,
@@ -61,24 +176,30 @@ def compare_schemas(table_name, expected_schema, actual_schema, logger):
                     'ACTUAL': actual_value
                 }
                 mismatches.append(mismatch_detail)
-                logger.error(f"Mismatch in column '{column_name}' for attribute '{key}': Expected '{expected_value}', Got '{actual_value}'")
+                if log_mismatches:
+                    logger.error("Mismatch in column '%s' for attribute '%s': Expected '%s', Got '%s'",
+                                 column_name, key, expected_value, actual_value)
     
     # Check for extra columns in the actual schema
     # If a column exists in the actual schema but not in the expected schema, it is considered an extra column. 
-    # for column_name in actual_dict:
-    #     if column_name not in expected_dict:
-    #         extra_columns.append(column_name)
-    #         logger.warning(f"Extra column found in actual schema: {column_name}")
+    if detect_extra_columns:
+        for column_name in actual_dict:
+            if column_name not in expected_dict:
+                extra_columns.append(column_name)
+                if log_missing:
+                    logger.warning("Extra column found in actual schema: %s", column_name)
     
-    logger.info("Schema comparison completed.")
+    if report_mode == 'detail':
+        logger.info("Schema comparison completed.")
     
     comparison_result = {
-        'schema_check_status': "FAIL" if mismatches or missing_columns else "PASS", # or extra_columns 
+        'schema_check_status': "FAIL" if mismatches or missing_columns or extra_columns else "PASS",
         'table': table_name,
         'mismatches': mismatches,
         'missing_columns': missing_columns
-        # ,'extra_columns': extra_columns
     }
+    if detect_extra_columns:
+        comparison_result['extra_columns'] = extra_columns
 
     
     # if comparison_result['mismatches'] or comparison_result['missing_columns'] or comparison_result['extra_columns']:
@@ -87,6 +208,8 @@ def compare_schemas(table_name, expected_schema, actual_schema, logger):
     #     # Send alert via email or Slack
     # else:
     #     logger.info(f"Schema check passed for table {table_name}.")
+    if report_mode == 'table':
+        log_table_report(comparison_result, logger)
     
     return comparison_result
 
@@ -0,0 +1,341 @@
+"""
+Long-running verification daemon with a change-frequency-aware schedule.
+
+Instead of re-verifying every table on every run, each table is re-verified on its own interval, between
+min_interval (hot tables) and max_interval (stable tables). The interval shrinks geometrically with the
+table's drift rate: how often its status changed across its recent results (from the history store and the
+daemon's own results). Tables without history start hot and cool down as stable results accumulate; a table
+whose status changes in half of its results or more is verified every min_interval.
+
+Every tick also costs one INFORMATION_SCHEMA.TABLES query per schema. A table whose LAST_ALTERED moved since
+the previous tick is verified as soon as min_interval has passed since its last verification, so drift caused
+by DDL is detected within minutes. (LAST_ALTERED also moves with DML, so a table that is loaded continuously
+is verified every min_interval.) The tables that are due are verified together: their expected schemas are
+fetched (ETag-cached GETs or a schema bundle), their actual schemas are read with one bulk metadata query per
+schema and compared as one batch. The Snowflake connection pool and the AWS clients stay open between ticks.
+A table whose verification fails (e.g. its expected schema is missing, or the metadata query of its schema
+failed, or the schema bundle could not be loaded) is recorded with status ERROR and retried with an exponential
+backoff, from tick to max_interval; the other tables of the round are verified as usual. Tables are rescheduled
+before their results are saved, so neither a failed save nor an unexpected error drops them from the schedule.
+"""
+import heapq
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from .batch_compare import compare_schemas_batch
+from .compare_schemas import ERROR_STATUSES, result_status
+from .fetch_expected_schema_from_s3 import fetch_expected_schemas_from_s3
+from .metadata_backends import InformationSchemaBackend, get_metadata_backend
+from .orchestrator import error_result
+from .query_snowflake_schema import query_tables_last_altered
+from .schema_bundle import load_schema_bundle
+from .type_equivalence import get_type_equivalence
+from utils import metrics
+
+
+def table_key(entry):
+    return f"{entry.database}.{entry.schema}.{entry.table}".upper()
+
+
+def drift_rate(statuses):
+    """
+    Fraction of status changes between consecutive results (oldest first), smoothed so that a table with
+    no history starts at 0.5 and moves towards its observed rate as results accumulate.
+    """
+    statuses = list(statuses)
+    changes = sum(before != after for before, after in zip(statuses, statuses[1:]))
+    return (changes + 1) / (max(0, len(statuses) - 1) + 2)
+
+
+class VerificationDaemon:
+    """
+    Continuously re-verifies the schemas of the given tables on a per-table priority schedule.
+
+    Parameters:
+        entries (list): ManifestEntry tuples of the tables to watch.
+        pkb (bytes): Private key bytes for Snowflake connections (ignored when pool is given).
+        logger (logging.Logger): Logger for logging messages.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow Snowflake connections from; kept open.
+        history_store (HistoryStore, optional): Seeds the drift rates from past results and records every
+            result of the daemon (one run per tick).
+        save_result (callable, optional): Called as save_result(result, entry) for every verified table.
+        metadata_backend (str, optional): 'information_schema' or 'show_columns' (see metadata_backends).
+            Defaults to INFORMATION_SCHEMA read as columnar Arrow batches.
+        schema_bundle (str, optional): Local path or s3:// URI of a compiled bundle of expected schemas
+            (see schema_bundle); an S3 bundle is revalidated with a conditional GET on every tick.
+        min_interval (float, optional): Seconds between two verifications of the hottest tables.
+        max_interval (float, optional): Seconds between two verifications of the most stable tables.
+        tick (float, optional): Seconds between two scheduling rounds (and LAST_ALTERED checks).
+        history_window (int, optional): Number of recent results a drift rate is computed from.
+        max_tables_per_tick (int, optional): Maximum number of tables verified in one tick; the others wait
+            for the next one, most overdue first.
+        type_equivalence (bool, str or dict, optional): Type-equivalence rules applied before comparing (see
+            type_equivalence.get_type_equivalence). Defaults to raw comparisons.
+        detect_extra_columns (bool, optional): Also fail tables with columns that were not expected.
+        clock (callable, optional): Returns the current epoch time (time.time).
+    """
+
+    def __init__(self, entries, pkb, logger, pool=None, history_store=None, save_result=None,
+                 metadata_backend=None, schema_bundle=None, min_interval=300, max_interval=86400, tick=60,
+                 history_window=20, max_tables_per_tick=1000, type_equivalence=None, detect_extra_columns=False,
+                 clock=time.time):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Expected 0 < min_interval <= max_interval.")
+        self.entries = {table_key(entry): entry for entry in entries}
+        self.pkb = pkb
+        self.logger = logger
+        self.pool = pool
+        self.history_store = history_store
+        self.save_result = save_result
+        self.metadata_backend = get_metadata_backend(metadata_backend or InformationSchemaBackend(columnar=True))
+        self.schema_bundle = schema_bundle
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tick_interval = tick
+        self.max_tables_per_tick = max_tables_per_tick
+        self.type_equivalence = get_type_equivalence(type_equivalence)
+        self.detect_extra_columns = detect_extra_columns
+        self.clock = clock
+        self._stop = threading.Event()
+        self._bundle = None
+
+        self._statuses = {}
+        for key, entry in self.entries.items():
+            history = history_store.table_history(entry.database, entry.schema, entry.table,
+                                                  limit=history_window) if history_store else []
+            # Errors say nothing about drift, so they are left out of the drift rates
+            self._statuses[key] = deque(reversed([status for _, status in history if status not in ERROR_STATUSES]),
+                                        maxlen=history_window)
+        self._failures = {} # table key -> number of consecutive failed verifications
+        self._last_altered = {}
+        self._last_verified = {}
+        self._next_due = {}
+        # (due time, table key); entries whose due time no longer matches _next_due are stale and skipped
+        self._heap = []
+        now = clock()
+        for key in self.entries:
+            self._schedule(key, now) # everything is verified once at startup
+
+    def _schedule(self, key, due):
+        self._next_due[key] = due
+        heapq.heappush(self._heap, (due, key))
+
+    def hotness(self, key):
+        """Returns the hotness of a table, from 0 (never drifts) to 1 (status changes in half of its results)."""
+        return min(1.0, 2 * drift_rate(self._statuses[key]))
+
+    def interval(self, key):
+        """Returns the number of seconds between two verifications of a table."""
+        return self.max_interval * (self.min_interval / self.max_interval) ** self.hotness(key)
+
+    def _check_last_altered(self, now):
+        """
+        Reads LAST_ALTERED for every watched schema. Tables altered since the previous check are brought forward
+        to min_interval after their last verification (or now, if that has passed).
+        """
+        by_schema = {}
+        for key, entry in self.entries.items():
+            by_schema.setdefault((entry.database.upper(), entry.schema.upper()), []).append(key)
+        altered = 0
+        for (database_name, schema_name), keys in by_schema.items():
+            last_altered = query_tables_last_altered(self.pkb, database_name, self.logger, schema_name=schema_name,
+                                                     pool=self.pool)
+            for key in keys:
+                timestamp = last_altered.get((schema_name, self.entries[key].table.upper()))
+                previous = self._last_altered.get(key)
+                self._last_altered[key] = timestamp
+                if previous is None or timestamp == previous:
+                    continue
+                altered += 1
+                due = max(now, self._last_verified.get(key, now) + self.min_interval)
+                if due < self._next_due[key]:
+                    self._schedule(key, due)
+        return altered
+
+    def _pop_due(self, now):
+        due = {}
+        while self._heap and self._heap[0][0] <= now and len(due) < self.max_tables_per_tick:
+            due_time, key = heapq.heappop(self._heap)
+            if self._next_due.get(key) == due_time: # otherwise a stale entry of a rescheduled table
+                due[key] = None
+        return list(due)
+
+    def _backoff(self, key):
+        """Returns the delay before retrying a table whose last verifications failed (doubling, up to max_interval)."""
+        return min(self.max_interval, self.tick_interval * 2 ** (self._failures[key] - 1))
+
+    def _expected_schemas(self, entries, errors):
+        """
+        Returns {table key: expected schema}, from the schema bundle when it has the table, else from S3.
+        The tables whose expected schema could not be fetched are recorded in errors (table key -> message).
+        """
+        if self.schema_bundle is not None and (self._bundle is None or self.schema_bundle.startswith('s3://')):
+            try:
+                self._bundle = load_schema_bundle(self.schema_bundle, self.logger) # 304 unless the bundle changed
+            except Exception as e:
+                # Without the bundle, none of the tables of the round can be verified; they are retried with a backoff
+                self.logger.error(f"Loading the schema bundle '{self.schema_bundle}' failed: {e}")
+                errors.update((table_key(entry), f"bundle: {e}") for entry in entries)
+                return {}
+        expected = {}
+        keys_by_bucket = {}
+        for entry in entries:
+            schema = self._bundle.get(entry.schema, entry.table, entry.database) if self._bundle is not None else None
+            if schema is not None:
+                expected[table_key(entry)] = schema
+            else:
+                keys_by_bucket.setdefault(entry.bucket, []).append(entry)
+        for bucket_name, bucket_entries in keys_by_bucket.items():
+            keys = [entry.expected_schema_key for entry in bucket_entries]
+            fetch_errors = {}
+            try:
+                fetched = fetch_expected_schemas_from_s3(bucket_name, keys, self.logger, errors=fetch_errors)
+            except Exception as e:
+                fetched = {}
+                fetch_errors = dict.fromkeys(keys, e)
+            for entry in bucket_entries:
+                if entry.expected_schema_key in fetched:
+                    expected[table_key(entry)] = fetched[entry.expected_schema_key]
+                else:
+                    errors[table_key(entry)] = f"fetch: {fetch_errors.get(entry.expected_schema_key)}"
+        return expected
+
+    def _compare(self, pairs):
+        """Compares (entry, expected, actual) tuples as one batch; if the batch fails, compares them one by one."""
+        options = {'type_equivalence': self.type_equivalence, 'detect_extra_columns': self.detect_extra_columns}
+        try:
+            return list(zip([entry for entry, _, _ in pairs], compare_schemas_batch(
+                [(entry.table, expected, actual) for entry, expected, actual in pairs], self.logger, **options)))
+        except Exception:
+            pass
+        verified = []
+        for entry, expected, actual in pairs:
+            try:
+                result = compare_schemas_batch([(entry.table, expected, actual)], self.logger, **options)[0]
+            except Exception as e: # e.g. an expected schema that is not a list of columns
+                self.logger.error(f"Comparison of table '{table_key(entry)}' failed: {e}")
+                result = error_result(entry, "ERROR", f"compare: {e}")
+            verified.append((entry, result))
+        return verified
+
+    def _verify(self, keys):
+        """
+        Verifies the given tables and returns (ManifestEntry, result) tuples, in the order of keys. A table that
+        cannot be verified gets an ERROR result; a failing metadata query fails the tables of its schema only.
+        """
+        entries = [self.entries[key] for key in keys]
+        errors = {}
+        expected = self._expected_schemas(entries, errors)
+        by_schema = {}
+        for entry in entries:
+            if table_key(entry) not in errors:
+                by_schema.setdefault((entry.database, entry.schema.upper()), []).append(entry)
+        pairs = []
+        for (database_name, schema_name), schema_entries in by_schema.items():
+            try:
+                actual_schemas = self.metadata_backend.query_schemas_bulk(
+                    self.pkb, database_name, self.logger, schema_name=schema_name,
+                    table_names=[entry.table for entry in schema_entries], pool=self.pool)
+            except Exception as e:
+                self.logger.error(f"Metadata query of schema '{database_name}.{schema_name}' failed: {e}")
+                errors.update((table_key(entry), f"query: {e}") for entry in schema_entries)
+                continue
+            for entry in schema_entries:
+                pairs.append((entry, expected[table_key(entry)],
+                              actual_schemas.get((schema_name, entry.table.upper()), [])))
+        results = {table_key(entry): (entry, result) for entry, result in self._compare(pairs)}
+        results.update((key, (self.entries[key], error_result(self.entries[key], "ERROR", message)))
+                       for key, message in errors.items())
+        return [results[key] for key in keys]
+
+    def _reschedule(self, verified, now, rescheduled):
+        """
+        Schedules the next verification of every verified table (after a backoff for the failed ones), adding their
+        keys to rescheduled. Returns the status changes and the number of failed tables.
+        """
+        drifted = []
+        failed = 0
+        for entry, result in verified:
+            key = table_key(entry)
+            statuses = self._statuses[key]
+            status = result_status(result)
+            if status in ERROR_STATUSES:
+                failed += 1
+                self._failures[key] = self._failures.get(key, 0) + 1
+                self._schedule(key, now + self._backoff(key))
+            else:
+                if statuses and statuses[-1] != status:
+                    drifted.append(f"{key} ({statuses[-1]} -> {status})")
+                statuses.append(status)
+                self._failures.pop(key, None)
+                self._last_verified[key] = now
+                self._schedule(key, now + self.interval(key))
+            rescheduled.add(key)
+        return drifted, failed
+
+    def tick(self):
+        """
+        Runs one scheduling round: checks LAST_ALTERED, verifies the tables that are due and reschedules them.
+
+        Returns:
+            list: (ManifestEntry, result) tuples of the tables verified in this round.
+        """
+        now = self.clock()
+        # The daemon runs for days; keep the process-wide tracer to the spans of the current round
+        metrics.get_tracer().reset()
+        with metrics.span('daemon_tick'):
+            altered = self._check_last_altered(now)
+            due = self._pop_due(now)
+            if not due:
+                return []
+            # The due tables are off the heap: whatever fails from here on, every one of them is scheduled again
+            rescheduled = set()
+            try:
+                verified = self._verify(due)
+                drifted, failed = self._reschedule(verified, now, rescheduled)
+            finally:
+                for key in due:
+                    if key not in rescheduled:
+                        self._failures[key] = self._failures.get(key, 0) + 1
+                        self._schedule(key, now + self._backoff(key))
+
+        run_id = datetime.fromtimestamp(now).strftime("%Y%m%d_%H%M%S")
+        if self.save_result is not None:
+            for entry, result in verified:
+                try:
+                    self.save_result(result, entry)
+                except Exception as e:
+                    self.logger.error(f"Saving the result of table '{table_key(entry)}' failed: {e}")
+        if self.history_store is not None:
+            self.history_store.record_results(run_id, [dict(result, database=entry.database, schema=entry.schema)
+                                                       for entry, result in verified])
+
+        metrics.increment('daemon_tables_verified', len(verified) - failed)
+        if failed:
+            metrics.increment('daemon_tables_failed', failed)
+        self.logger.info(f"Daemon tick {run_id}: {len(verified) - failed} tables verified ({altered} altered since "
+                         f"the previous tick), {len(drifted)} changed status, {failed} failed.")
+        for change in drifted:
+            self.logger.warning(f"Schema status changed: {change}")
+        return verified
+
+    def run(self, max_ticks=None):
+        """Runs ticks every tick seconds until stop() is called (or max_ticks ticks have run)."""
+        self.logger.info(f"Verification daemon watching {len(self.entries)} tables "
+                         f"(every {self.min_interval}s to {self.max_interval}s, tick {self.tick_interval}s).")
+        ticks = 0
+        while not self._stop.is_set() and (max_ticks is None or ticks < max_ticks):
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                # A failed round (e.g. Snowflake unavailable) is retried on the next tick
+                self.logger.error(f"Daemon tick failed: {e}")
+            ticks += 1
+            self._stop.wait(max(0.0, self.tick_interval - (time.monotonic() - started)))
+        self.logger.info("Verification daemon stopped.")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,241 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from utils import metrics
+from utils.snowflake_connection import run_snowflake_query
+
+from .query_snowflake_schema import query_snowflake_schema
+
+# MIN/MAX are not defined (or not meaningful) for these types, so only null counts and hashes are computed
+NO_MIN_MAX_TYPES = frozenset({'VARIANT', 'OBJECT', 'ARRAY', 'GEOGRAPHY', 'GEOMETRY', 'VECTOR', 'BINARY'})
+
+# Per-column metrics, in the order they are selected
+COLUMN_METRICS = ['NULL_COUNT', 'MIN', 'MAX', 'HASH']
+
+# Pseudo column name used for the table-level metrics in the mismatch list
+TABLE_LEVEL = '*'
+
+
+def _json_value(value):
+    """
+    Returns the JSON-native form of a metric value, as stored alongside the expected schema: DATE, TIME and
+    TIMESTAMP values (date, time, datetime) become ISO 8601 strings and NUMBER values (Decimal) become int,
+    or float when they have a fractional part. Other values are returned unchanged.
+    """
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal) and value.is_finite():
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def quote_identifier(name):
+    """Quotes a Snowflake identifier (the name is used exactly as stored in INFORMATION_SCHEMA)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def qualified_table_name(database_name, schema_name, table_name):
+    return '.'.join(quote_identifier(name.upper()) for name in (database_name, schema_name, table_name))
+
+
+def build_fingerprint_query(database_name, schema_name, table_name, columns, include_min_max=True):
+    """
+    Builds one aggregate query computing the fingerprint of a table inside Snowflake.
+
+    The query returns a single row: the row count, HASH_AGG over all the given columns (order-independent
+    over rows) and, per column, the null count, MIN, MAX and HASH_AGG.
+
+    Parameters:
+        database_name (str): Name of the database containing the table.
+        schema_name (str): Name of the schema containing the table.
+        table_name (str): Name of the table.
+        columns (list): Column dictionaries (COLUMN_NAME and DATA_TYPE, e.g. the actual schema).
+        include_min_max (bool, optional): Whether to compute MIN/MAX per column.
+
+    Returns:
+        tuple: (sql_statement, layout) where layout lists the (COLUMN_NAME, metric) of every selected value.
+    """
+    column_names = [quote_identifier(column['COLUMN_NAME']) for column in columns]
+    expressions = ["COUNT(*)", f"HASH_AGG({', '.join(column_names)})" if column_names else "HASH_AGG(*)"]
+    layout = [(TABLE_LEVEL, 'ROW_COUNT'), (TABLE_LEVEL, 'TABLE_HASH')]
+
+    for column, quoted in zip(columns, column_names):
+        column_name = column['COLUMN_NAME']
+        expressions.append(f"COUNT_IF({quoted} IS NULL)")
+        layout.append((column_name, 'NULL_COUNT'))
+        if include_min_max and (column.get('DATA_TYPE') or '').upper() not in NO_MIN_MAX_TYPES:
+            expressions.append(f"MIN({quoted})")
+            layout.append((column_name, 'MIN'))
+            expressions.append(f"MAX({quoted})")
+            layout.append((column_name, 'MAX'))
+        expressions.append(f"HASH_AGG({quoted})")
+        layout.append((column_name, 'HASH'))
+
+    sql_statement = (
+        "SELECT\n    " + ",\n    ".join(expressions)
+        + f"\nFROM {qualified_table_name(database_name, schema_name, table_name)};"
+    )
+    return sql_statement, layout
+
+
+def compute_table_fingerprint(pkb, database_name, schema_name, table_name, logger, columns=None,
+                              include_min_max=True, pool=None):
+    """
+    Computes the content fingerprint of a table with a single aggregate query; no table rows leave Snowflake.
+
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connection.
+        database_name (str): Name of the database containing the table.
+        schema_name (str): Name of the schema containing the table.
+        table_name (str): Name of the table.
+        logger (logging.Logger): Logger for logging messages.
+        columns (list, optional): Column dictionaries to fingerprint. Defaults to all the columns of the table.
+        include_min_max (bool, optional): Whether to compute MIN/MAX per column.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the connection from.
+
+    Returns:
+        dict: {'ROW_COUNT': ..., 'TABLE_HASH': ..., 'columns': {COLUMN_NAME: {'NULL_COUNT', 'MIN', 'MAX', 'HASH'}}}
+    """
+    import snowflake.connector
+
+    if columns is None:
+        columns = query_snowflake_schema(pkb, table_name, schema_name, database_name, logger, pool=pool)
+
+    sql_statement, layout = build_fingerprint_query(database_name, schema_name, table_name, columns, include_min_max)
+    logger.info(f"Computing content fingerprint of '{database_name}.{schema_name}.{table_name}' "
+                f"({len(columns)} columns).")
+
+    try:
+        with metrics.span('content_fingerprint', table=table_name):
+            row = run_snowflake_query(pkb, sql_statement, pool=pool)[0]
+    except snowflake.connector.Error as e:
+        logger.error(f"Snowflake fingerprint query failed: {e}")
+        raise
+
+    return fingerprint_from_row(layout, row)
+
+
+def fingerprint_from_row(layout, row):
+    """
+    Builds a fingerprint from the row returned by a fingerprint query (see build_fingerprint_query). Values are
+    stored in their JSON-native form, so a fingerprint saved as JSON compares equal to a freshly computed one.
+    """
+    fingerprint = {'columns': {}}
+    for (column_name, metric), value in zip(layout, row):
+        if column_name == TABLE_LEVEL:
+            fingerprint[metric] = _json_value(value)
+        else:
+            fingerprint['columns'].setdefault(column_name, {})[metric] = _json_value(value)
+    return fingerprint
+
+
+def compare_fingerprints(table_name, expected_fingerprint, actual_fingerprint, logger):
+    """
+    Compares two table fingerprints and identifies mismatches.
+
+    Only the metrics present in the expected fingerprint are checked, so expectations can be partial
+    (e.g. only ROW_COUNT, or only the null counts of a few columns). Values are compared in their JSON-native
+    form: dates and timestamps as ISO 8601 strings (e.g. "2024-09-10" or "2024-09-10T11:51:02") and numbers
+    as int or float.
+
+    Parameters:
+        table_name (str): Name of the verified table.
+        expected_fingerprint (dict): Expected values, in the compute_table_fingerprint shape.
+        actual_fingerprint (dict): Actual values, in the compute_table_fingerprint shape.
+        logger (logging.Logger): Logger for logging messages.
+
+    Returns:
+        dict: Result with the compare_schemas shape: content_check_status (PASS/FAIL), table, mismatches
+              (COLUMN_NAME is '*' for table-level metrics) and missing_columns.
+    """
+    mismatches = []
+    missing_columns = []
+
+    for metric in ('ROW_COUNT', 'TABLE_HASH'):
+        if metric in expected_fingerprint \
+                and _json_value(expected_fingerprint[metric]) != _json_value(actual_fingerprint.get(metric)):
+            mismatches.append({'COLUMN_NAME': TABLE_LEVEL, 'ATTRIBUTE': metric,
+                               'EXPECTED': expected_fingerprint[metric], 'ACTUAL': actual_fingerprint.get(metric)})
+
+    actual_columns = actual_fingerprint.get('columns', {})
+    for column_name, expected_metrics in expected_fingerprint.get('columns', {}).items():
+        actual_metrics = actual_columns.get(column_name)
+        if actual_metrics is None:
+            missing_columns.append(column_name)
+            continue
+        for metric in COLUMN_METRICS:
+            if metric in expected_metrics and metric in actual_metrics \
+                    and _json_value(expected_metrics[metric]) != _json_value(actual_metrics[metric]):
+                mismatches.append({'COLUMN_NAME': column_name, 'ATTRIBUTE': metric,
+                                   'EXPECTED': expected_metrics[metric], 'ACTUAL': actual_metrics[metric]})
+
+    status = "FAIL" if mismatches or missing_columns else "PASS"
+    logger.info(f"Content check for table {table_name}: {status} "
+                f"({len(mismatches)} mismatches, {len(missing_columns)} missing columns).")
+    return {
+        'content_check_status': status,
+        'table': table_name,
+        'mismatches': mismatches,
+        'missing_columns': missing_columns
+    }
+
+
+def verify_table_content(pkb, database_name, schema_name, table_name, expected_fingerprint, logger, pool=None):
+    """
+    Verifies the content of a table against expected fingerprint values (e.g. stored alongside the expected schema).
+
+    Only the columns named in the expected fingerprint are aggregated.
+
+    Returns:
+        dict: Result in the compare_fingerprints shape.
+    """
+    expected_columns = expected_fingerprint.get('columns', {})
+    actual_schema = query_snowflake_schema(pkb, table_name, schema_name, database_name, logger, pool=pool)
+    columns = [column for column in actual_schema if column['COLUMN_NAME'] in expected_columns]
+    include_min_max = any('MIN' in values or 'MAX' in values for values in expected_columns.values())
+
+    actual_fingerprint = compute_table_fingerprint(pkb, database_name, schema_name, table_name, logger,
+                                                   columns=columns, include_min_max=include_min_max, pool=pool)
+    if 'TABLE_HASH' in expected_fingerprint and set(expected_columns) != {column['COLUMN_NAME'] for column in columns}:
+        # The table hash only covers the fingerprinted columns, so it is only comparable when they all exist
+        logger.warning(f"TABLE_HASH of {table_name} computed over a different set of columns than expected.")
+    return compare_fingerprints(table_name, expected_fingerprint, actual_fingerprint, logger)
+
+
+def verify_table_content_against(pkb, source, target, logger, include_min_max=True, pool=None):
+    """
+    Verifies that two tables hold the same content by comparing their fingerprints.
+
+    Both fingerprints are computed over the columns the two tables have in common (in the source column order),
+    so that TABLE_HASH is comparable. Columns of the source that are missing from the target are reported as
+    missing columns.
+
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connection.
+        source (tuple): (database_name, schema_name, table_name) of the reference table.
+        target (tuple): (database_name, schema_name, table_name) of the verified table.
+        logger (logging.Logger): Logger for logging messages.
+        include_min_max (bool, optional): Whether to compare MIN/MAX per column.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the connections from.
+
+    Returns:
+        dict: Result in the compare_fingerprints shape, for the table '<source>_vs_<target>'.
+    """
+    source_database, source_schema, source_table = source
+    target_database, target_schema, target_table = target
+    source_schema_columns = query_snowflake_schema(pkb, source_table, source_schema, source_database, logger, pool=pool)
+    target_names = {column['COLUMN_NAME'] for column in
+                    query_snowflake_schema(pkb, target_table, target_schema, target_database, logger, pool=pool)}
+    common = [column for column in source_schema_columns if column['COLUMN_NAME'] in target_names]
+
+    source_fingerprint = compute_table_fingerprint(pkb, source_database, source_schema, source_table, logger,
+                                                   columns=common, include_min_max=include_min_max, pool=pool)
+    target_fingerprint = compute_table_fingerprint(pkb, target_database, target_schema, target_table, logger,
+                                                   columns=common, include_min_max=include_min_max, pool=pool)
+
+    result = compare_fingerprints(f"{source_table}_vs_{target_table}", source_fingerprint, target_fingerprint, logger)
+    result['missing_columns'].extend(column['COLUMN_NAME'] for column in source_schema_columns
+                                     if column['COLUMN_NAME'] not in target_names)
+    if result['missing_columns']:
+        result['content_check_status'] = "FAIL"
+    return result
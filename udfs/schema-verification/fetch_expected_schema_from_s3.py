@@ -1,12 +1,91 @@
+import atexit
+import hashlib
 import json
 import logging
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
 
-import boto3
-from botocore.exceptions import ClientError
+from utils import metrics
+from utils.aws_clients import get_client
 
+# Local cache of expected schemas, keyed by bucket/key and validated against the S3 ETag
+DEFAULT_SCHEMA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'data-verification-schema-cache')
 
-def setup_logging(log_level=logging.INFO):
-    """Sets up the logging configuration."""
+# Parsed schemas already loaded by this process: (bucket_name, key) -> {'etag': ..., 'schema': ...}
+_memory_cache = {}
+_memory_cache_lock = threading.Lock()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves the formatting of the records to the listener thread: records are queued as they are
+    (the queue never leaves the process), so a log call on the comparison path costs one queue put.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+# Process-wide queue drained by the listener thread that writes the log records (see setup_logging)
+_log_queue = None
+_log_listener = None
+
+
+def _start_log_listener(handler):
+    global _log_queue, _log_listener
+    _log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(_log_queue, handler, respect_handler_level=True)
+    _log_listener.start()
+    return _log_queue
+
+
+def _restart_log_listener_after_fork():
+    # The listener thread does not survive a fork; a child gets a fresh queue and its own listener
+    if _log_listener is not None:
+        log_queue = _start_log_listener(*_log_listener.handlers)
+        for handler in logging.getLogger('SchemaComparator').handlers:
+            if isinstance(handler, _DeferredQueueHandler):
+                handler.queue = log_queue
+
+
+os.register_at_fork(after_in_child=_restart_log_listener_after_fork)
+
+
+def flush_logging():
+    """Writes out every queued log record (e.g. before a Lambda invocation returns and the container is frozen)."""
+    if _log_listener is not None:
+        _log_listener.stop() # drains the queue
+        _log_listener.start()
+
+
+def pause_logging():
+    """
+    Writes out every queued log record and stops the listener thread until resume_logging, e.g. while worker
+    processes are forked: a child forked while the thread holds a handler lock would deadlock on its first log.
+    Records logged meanwhile stay queued.
+    """
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
+def resume_logging():
+    """Restarts the listener thread stopped by pause_logging."""
+    if _log_listener is not None:
+        _log_listener.start()
+
+
+def setup_logging(log_level=logging.INFO, queued=True):
+    """
+    Sets up the logging configuration.
+
+    With queued (the default), log calls only put the record on an in-process queue and a listener thread
+    formats and writes it, so logging never blocks the verification on the console. Queued records are written
+    out by flush_logging and at exit.
+    """
     logger = logging.getLogger('SchemaComparator')
     logger.setLevel(log_level)
     
@@ -20,11 +99,20 @@ def setup_logging(log_level=logging.INFO):
     
     # Add the handlers to the logger
     if not logger.handlers:
-        logger.addHandler(ch)
+        if queued:
+            logger.addHandler(_DeferredQueueHandler(_start_log_listener(ch)))
+            atexit.register(_stop_log_listener)
+        else:
+            logger.addHandler(ch)
     
     return logger
 
 
+def _stop_log_listener():
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
 def fetch_expected_schema_from_s3(bucket_name, key, logger):
     """
     Fetches the expected schema JSON from S3 and returns it as a list of dictionaries.
@@ -37,12 +125,15 @@ def fetch_expected_schema_from_s3(bucket_name, key, logger):
     Returns:
         list: List of dictionaries representing the expected schema.
     """
-    s3_client = boto3.client('s3')
+    s3_client = get_client('s3')
+    from botocore.exceptions import ClientError # loaded with the client
     
     try:
         logger.info(f"Fetching expected schema from S3 bucket '{bucket_name}' with key '{key}'.")
-        response = s3_client.get_object(Bucket=bucket_name, Key=key)
-        content = response['Body'].read().decode('utf-8')
+        with metrics.span('s3_fetch'):
+            response = s3_client.get_object(Bucket=bucket_name, Key=key)
+            content = response['Body'].read().decode('utf-8')
+        metrics.increment('s3_bytes_downloaded', len(content))
         expected_schema = json.loads(content)
         logger.info("Successfully fetched and parsed the expected schema.")
         return expected_schema
@@ -53,6 +144,144 @@ def fetch_expected_schema_from_s3(bucket_name, key, logger):
         logger.error(f"Failed to parse expected schema JSON: {e}")
         raise
 
+def _cache_path(cache_dir, bucket_name, key):
+    """Returns the local cache file used for the given S3 object."""
+    digest = hashlib.sha256(f"{bucket_name}/{key}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def _read_cache_entry(cache_dir, bucket_name, key):
+    """Returns the cached {'etag', 'schema'} entry of an S3 object, or None if it is not cached."""
+    with _memory_cache_lock:
+        entry = _memory_cache.get((bucket_name, key))
+    if entry is not None or cache_dir is None:
+        return entry
+    try:
+        with open(_cache_path(cache_dir, bucket_name, key), 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or 'etag' not in entry or 'schema' not in entry:
+        return None # a damaged entry is ignored; the object is downloaded again and the entry rewritten
+    with _memory_cache_lock:
+        _memory_cache[(bucket_name, key)] = entry
+    return entry
+
+
+def _write_cache_entry(cache_dir, bucket_name, key, etag, schema):
+    """Stores the parsed schema of an S3 object together with its ETag (in memory and on disk)."""
+    entry = {'bucket': bucket_name, 'key': key, 'etag': etag, 'schema': schema}
+    with _memory_cache_lock:
+        _memory_cache[(bucket_name, key)] = entry
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(cache_dir, bucket_name, key)
+    # Write to a temporary file first so that concurrent readers never see a partial entry
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+def _is_not_modified(error):
+    """Returns True if a ClientError is the 304 answer to a conditional GET."""
+    code = str(error.response.get('Error', {}).get('Code'))
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in ('304', 'NotModified') or status == 304
+
+
+def fetch_expected_schema_cached(s3_client, bucket_name, key, cache_dir=DEFAULT_SCHEMA_CACHE_DIR):
+    """
+    Fetches an expected schema with a conditional GET, reusing the cached copy if the object has not changed.
+    
+    Parameters:
+        s3_client: boto3 S3 client (shared between calls).
+        bucket_name (str): Name of the S3 bucket.
+        key (str): S3 key (path) to the JSON file.
+        cache_dir (str, optional): Directory of the on-disk cache, or None to only cache in memory.
+    
+    Returns:
+        tuple: (expected_schema, downloaded) where downloaded is False if the cached copy was still current.
+    """
+    from botocore.exceptions import ClientError
+
+    entry = _read_cache_entry(cache_dir, bucket_name, key)
+    request = {'Bucket': bucket_name, 'Key': key}
+    if entry is not None:
+        request['IfNoneMatch'] = entry['etag'] # S3 answers 304 Not Modified if the ETag still matches
+    
+    try:
+        with metrics.span('s3_fetch'):
+            response = s3_client.get_object(**request)
+            content = response['Body'].read().decode('utf-8')
+    except ClientError as e:
+        if entry is not None and _is_not_modified(e):
+            metrics.increment('s3_not_modified')
+            return entry['schema'], False
+        raise
+    
+    metrics.increment('s3_bytes_downloaded', len(content))
+    expected_schema = json.loads(content)
+    _write_cache_entry(cache_dir, bucket_name, key, response['ETag'], expected_schema)
+    return expected_schema, True
+
+
+def fetch_expected_schemas_from_s3(bucket_name, keys, logger, cache_dir=DEFAULT_SCHEMA_CACHE_DIR, max_workers=16,
+                                   errors=None):
+    """
+    Fetches many expected schema JSON files from S3 concurrently over one shared client.
+    
+    Each object is fetched with a conditional GET against a local cache keyed by bucket/key/ETag,
+    so schemas that have not changed since the previous run are neither downloaded nor parsed again.
+    
+    Parameters:
+        bucket_name (str): Name of the S3 bucket.
+        keys (list): S3 keys (paths) to the JSON files.
+        logger (logging.Logger): Logger for logging messages.
+        cache_dir (str, optional): Directory of the on-disk cache, or None to only cache in memory.
+        max_workers (int, optional): Maximum number of concurrent requests.
+        errors (dict, optional): If given, the keys that could not be fetched or parsed are recorded in it
+            (S3 key -> exception) and left out of the result instead of failing the whole call.
+    
+    Returns:
+        dict: Dictionary keyed by S3 key whose values are lists of dictionaries representing the expected schemas.
+    """
+    keys = list(dict.fromkeys(keys)) # drop duplicates, keep order
+    s3_client = get_client('s3')
+    from botocore.exceptions import ClientError # loaded with the client
+    
+    logger.info(f"Fetching {len(keys)} expected schemas from S3 bucket '{bucket_name}'.")
+    
+    expected_schemas = {}
+    downloaded = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys)))) as executor:
+        futures = {
+            key: executor.submit(fetch_expected_schema_cached, s3_client, bucket_name, key, cache_dir)
+            for key in keys
+        }
+        for key, future in futures.items():
+            try:
+                expected_schemas[key], was_downloaded = future.result()
+            except ClientError as e:
+                logger.error(f"Failed to fetch expected schema '{key}' from S3: {e}")
+                if errors is None:
+                    raise
+                errors[key] = e
+                continue
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to parse expected schema JSON '{key}': {e}")
+                if errors is None:
+                    raise
+                errors[key] = e
+                continue
+            downloaded += was_downloaded
+    
+    logger.info(f"Successfully fetched {len(expected_schemas)} expected schemas "
+                f"({downloaded} downloaded, {len(expected_schemas) - downloaded} unchanged"
+                + (f", {len(keys) - len(expected_schemas)} failed)." if errors else ")."))
+    return expected_schemas
+
 # # Example usage: 
 # bucket_name = 'athena-dwh-queries'
 # key = 'snowflake-landing-schemas/CT_COUNTRY_schema.json'
@@ -0,0 +1,389 @@
+"""
+AWS Lambda handler and command line entry point for the schema verification.
+
+Only the standard library is imported at module level: the verification modules (and, through them,
+boto3, snowflake.connector and cryptography) are imported on the first invocation that needs them.
+Everything expensive to set up - the AWS clients, the decoded Snowflake key and the connection pool - is
+kept in module scope by the modules that create it, so warm invocations of the same container reuse it.
+
+Event payload (all keys optional except the tables to verify):
+    {
+        "manifest": [...] | {"bucket": ..., "tables": [...]},      # inline manifest, or
+        "manifest_path": "s3://bucket/key.json" | "manifest.csv",   # manifest file (JSON or CSV), or
+        "database": ..., "schema": ..., "table": ...,               # a single table
+        "expected_schema_key": ..., "bucket": ...,
+        "save_to_s3": true, "results_bucket": ..., "output_format": "ndjson", "compression": "gzip",
+        "concurrency": 8, "table_timeout": 300, "run_id": ..., "return_results": false,
+        "metadata_backend": "information_schema" | "show_columns",
+        "schema_bundle": "s3://bucket/schemas.bundle",               # compiled expected schemas
+        "report_mode": "detail" | "table" | "run",                    # how mismatches are logged
+        "type_equivalence": true | "rules.json" | {...},              # equivalence rules (see type_equivalence)
+        "extra_columns": false,                                       # also fail on unexpected columns
+        "incremental_state": "verification-state.json",               # skip tables unchanged since the last run
+        "workers": 4, "shard_count": ..., "shards": [...], "checkpoint_dir": ..., "merge": false
+    }
+With workers, shards or merge, the run is sharded with checkpoints (see sharded_runner): an interrupted run
+resumes when started again with the same run_id. Worker processes are not available in Lambda, where a
+sharded invocation runs its shards (e.g. "shards": [3], "shard_count": 16) in process; the results are
+merged by a final {"merge": true} invocation. Incremental runs (incremental_state) are not sharded; in Lambda,
+their state file lives in /tmp and only carries over between invocations of the same warm container.
+A {"warmup": true} event only prepares the key and a pooled connection (e.g. for scheduled pings).
+Bundles of expected schemas (see schema_bundle) are built by events naming where to write them:
+    {"snapshot_bundle": "s3://bucket/schemas.bundle", "database": ..., "schema": ...}  # current Snowflake schemas
+    {"compile_bundle": "s3://bucket/schemas.bundle", "manifest_path": ...}            # per-table JSON files
+
+Usage:
+    python udfs/schema-verification/handler.py --manifest manifest.json [--save-to-s3] [--results-bucket BUCKET]
+                                               [--event event.json]
+    python udfs/schema-verification/handler.py --manifest manifest.json --workers 8 [--run-id RUN_ID]
+    python udfs/schema-verification/handler.py --manifest manifest.json --daemon [--min-interval 300]
+                                               [--max-interval 86400] [--tick 60] [--history-db history.sqlite]
+    python udfs/schema-verification/handler.py --snapshot-bundle schemas.bundle --database DEV_DB [--schema SCHEMA]
+    python udfs/schema-verification/handler.py --compile-bundle schemas.bundle --manifest manifest.json
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+# Set on import, i.e. once per container; cleared by the first invocation
+_cold_start = True
+
+# Seconds kept free at the end of a Lambda invocation for saving the results and closing the run
+LAMBDA_TIME_MARGIN = 10
+
+# Lambda containers can only write below /tmp
+_DEFAULT_OUTPUT_DIR = '/tmp/verification-results' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') \
+    else 'verification-results'
+_DEFAULT_CHECKPOINT_DIR = '/tmp/verification-checkpoints' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') \
+    else 'verification-checkpoints'
+
+
+def _split_s3_uri(uri):
+    bucket_name, _, key = uri[len('s3://'):].partition('/')
+    if not bucket_name or not key:
+        raise ValueError(f"Invalid S3 URI: {uri!r}. Expected s3://bucket/key.")
+    return bucket_name, key
+
+
+def load_event_entries(event):
+    """
+    Returns the ManifestEntry tuples requested by an event: an inline manifest, a manifest file
+    (local path or s3:// URI) or a single table.
+    """
+    from .orchestrator import load_manifest, parse_manifest, parse_manifest_json
+
+    default_bucket = event.get('bucket')
+    if event.get('manifest') is not None:
+        return parse_manifest_json(event['manifest'], default_bucket)
+
+    manifest_path = event.get('manifest_path')
+    if manifest_path is None:
+        if not event.get('table'):
+            raise ValueError("The event names no tables: expected 'manifest', 'manifest_path' or 'table'.")
+        return parse_manifest([event], default_bucket)
+    if not manifest_path.startswith('s3://'):
+        return load_manifest(manifest_path, default_bucket)
+
+    import csv
+    import io
+    from utils.aws_clients import get_client
+
+    bucket_name, key = _split_s3_uri(manifest_path)
+    content = get_client('s3').get_object(Bucket=bucket_name, Key=key)['Body'].read().decode('utf-8')
+    if key.lower().endswith('.csv'):
+        return parse_manifest(list(csv.DictReader(io.StringIO(content))), default_bucket)
+    return parse_manifest_json(json.loads(content), default_bucket)
+
+
+def _warm_up(logger):
+    """Decodes the Snowflake key and opens a pooled connection so that the next invocation finds them ready."""
+    from utils.snowflake_connection import get_snowflake_pkb, get_snowflake_pool
+
+    pkb = get_snowflake_pkb("CONNECTOR")
+    with get_snowflake_pool(pkb).connection():
+        pass
+    logger.info("Warm-up invocation: Snowflake key and connection ready.")
+
+
+def _build_bundle(event, logger):
+    """Writes the schema bundle requested by a snapshot_bundle or compile_bundle event; returns its table count."""
+    from . import schema_bundle
+
+    if event.get('compile_bundle'):
+        return schema_bundle.compile_schema_bundle_from_s3(load_event_entries(event), event['compile_bundle'], logger)
+    if not event.get('database'):
+        raise ValueError("A snapshot_bundle event needs a 'database'.")
+    from utils.snowflake_connection import get_snowflake_pkb
+
+    return schema_bundle.snapshot_schema_bundle(get_snowflake_pkb("CONNECTOR"), event['database'],
+                                                event['snapshot_bundle'], logger, schema_name=event.get('schema'),
+                                                metadata_backend=event.get('metadata_backend'))
+
+
+def lambda_handler(event, context=None):
+    """
+    Verifies the tables named in the event and returns a summary of the run.
+
+    Parameters:
+        event (dict): Event payload (see the module docstring).
+        context (LambdaContext, optional): Lambda context; the table timeout is capped to the remaining time.
+
+    Returns:
+        dict: cold_start, duration_seconds, tables, statuses (count per status), failed_tables and,
+              if return_results is set, the comparison results.
+    """
+    global _cold_start
+    cold_start, _cold_start = _cold_start, False
+    started = time.perf_counter()
+
+    from .fetch_expected_schema_from_s3 import flush_logging, setup_logging
+
+    logger = setup_logging()
+    try:
+        return _handle_event(event, context, logger, cold_start, started)
+    finally:
+        flush_logging() # the log records still queued would otherwise wait for the next invocation
+
+
+def _handle_event(event, context, logger, cold_start, started):
+    """Runs the invocation requested by an event (see lambda_handler)."""
+    from utils import metrics
+    from .compare_schemas import result_status
+
+    # The tracer is process-wide; start every invocation with an empty one so that warm containers do not
+    # accumulate the spans of earlier runs
+    metrics.get_tracer().reset()
+
+    if event.get('warmup'):
+        _warm_up(logger)
+        return {'cold_start': cold_start, 'warmup': True,
+                'duration_seconds': round(time.perf_counter() - started, 3)}
+    if event.get('snapshot_bundle') or event.get('compile_bundle'):
+        tables = _build_bundle(event, logger)
+        return {'cold_start': cold_start, 'bundle': event.get('snapshot_bundle') or event['compile_bundle'],
+                'tables': tables, 'duration_seconds': round(time.perf_counter() - started, 3)}
+
+    entries = load_event_entries(event)
+
+    table_timeout = event.get('table_timeout', 300)
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        remaining = context.get_remaining_time_in_millis() / 1000 - LAMBDA_TIME_MARGIN
+        table_timeout = max(1, min(table_timeout, remaining))
+
+    # Warm invocations can start within the same second, so the timestamp alone is not unique
+    run_id = event.get('run_id') or getattr(context, 'aws_request_id', None)
+    if event.get('workers') or event.get('shards') is not None or event.get('merge'):
+        if event.get('incremental_state'):
+            raise ValueError("incremental_state is not supported by sharded runs (workers, shards or merge).")
+        from .sharded_runner import merge_checkpoints, run_sharded
+
+        output_options = {
+            'save_to_s3': event.get('save_to_s3', True),
+            'output_dir': event.get('output_dir', _DEFAULT_OUTPUT_DIR),
+            'results_bucket': event.get('results_bucket'),
+            'compression': event.get('compression', 'gzip'),
+            'logger': logger
+        }
+        checkpoint_dir = event.get('checkpoint_dir', _DEFAULT_CHECKPOINT_DIR)
+        if event.get('merge'):
+            results = merge_checkpoints(entries, checkpoint_dir, run_id, **output_options)
+        else:
+            results = run_sharded(
+                entries,
+                workers=event.get('workers', 1),
+                checkpoint_dir=checkpoint_dir,
+                run_id=run_id,
+                shard_count=event.get('shard_count'),
+                shards=event.get('shards'),
+                concurrency=event.get('concurrency', 8),
+                table_timeout=table_timeout,
+                metadata_backend=event.get('metadata_backend'),
+                schema_bundle=event.get('schema_bundle'),
+                report_mode=event.get('report_mode', 'detail'),
+                type_equivalence=event.get('type_equivalence'),
+                detect_extra_columns=event.get('extra_columns', False),
+                **output_options
+            )
+        if isinstance(results, dict): # only some shards of the run were verified
+            return dict(results, cold_start=cold_start, duration_seconds=round(time.perf_counter() - started, 3))
+    else:
+        from .validate_schema import run_schema_comparison
+
+        results = run_schema_comparison(
+            entries,
+            save_to_s3=event.get('save_to_s3', True),
+            output_dir=event.get('output_dir', _DEFAULT_OUTPUT_DIR),
+            results_bucket=event.get('results_bucket'),
+            concurrency=event.get('concurrency', 8),
+            table_timeout=table_timeout,
+            output_format=event.get('output_format', 'ndjson'),
+            compression=event.get('compression', 'gzip'),
+            logger=logger,
+            metadata_backend=event.get('metadata_backend'),
+            schema_bundle=event.get('schema_bundle'),
+            report_mode=event.get('report_mode', 'detail'),
+            type_equivalence=event.get('type_equivalence'),
+            detect_extra_columns=event.get('extra_columns', False),
+            incremental_state=event.get('incremental_state'),
+            run_id=run_id
+        )
+
+    statuses = {}
+    failed_tables = []
+    for result in results:
+        status = result_status(result)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status != "PASS":
+            failed_tables.append(result.get('table'))
+
+    response = {
+        'cold_start': cold_start,
+        'duration_seconds': round(time.perf_counter() - started, 3),
+        'tables': len(results),
+        'statuses': statuses,
+        'failed_tables': failed_tables
+    }
+    if event.get('return_results'):
+        response['results'] = results
+    return response
+
+
+def run_daemon(event):
+    """Runs the verification daemon (see daemon.py) for the tables of an event until SIGTERM or Ctrl+C."""
+    import signal
+    from utils.snowflake_connection import get_snowflake_pkb, get_snowflake_pool
+    from .daemon import VerificationDaemon
+    from .fetch_expected_schema_from_s3 import setup_logging
+    from .history_store import HistoryStore
+
+    logger = setup_logging()
+    entries = load_event_entries(event)
+    pkb = get_snowflake_pkb("CONNECTOR")
+    with HistoryStore(event.get('history_db', 'verification-history.sqlite')) as history_store:
+        daemon = VerificationDaemon(
+            entries,
+            pkb,
+            logger,
+            pool=get_snowflake_pool(pkb, max_size=event.get('concurrency', 8)),
+            history_store=history_store,
+            metadata_backend=event.get('metadata_backend'),
+            schema_bundle=event.get('schema_bundle'),
+            min_interval=event.get('min_interval', 300),
+            max_interval=event.get('max_interval', 86400),
+            tick=event.get('tick', 60),
+            type_equivalence=event.get('type_equivalence'),
+            detect_extra_columns=event.get('extra_columns', False)
+        )
+        signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.stop()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify Snowflake table schemas against their expected schemas.")
+    parser.add_argument('--manifest', help='manifest file (JSON or CSV), local path or s3:// URI')
+    parser.add_argument('--event', help='JSON file with a Lambda event payload (overridden by the other options)')
+    parser.add_argument('--save-to-s3', action='store_true', default=None,
+                        help='save the results to S3 instead of --output-dir')
+    parser.add_argument('--results-bucket')
+    parser.add_argument('--output-dir')
+    parser.add_argument('--output-format', choices=['ndjson', 'json'])
+    parser.add_argument('--compression', choices=['gzip', 'zstd', 'none'])
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--table-timeout', type=float)
+    parser.add_argument('--metadata-backend', choices=['information_schema', 'show_columns'])
+    parser.add_argument('--report-mode', choices=['detail', 'table', 'run'],
+                        help='log one line per mismatch, one summary per failed table or one summary per run')
+    parser.add_argument('--type-equivalence', nargs='?', const=True, metavar='RULES_JSON',
+                        help='compare through the default type-equivalence rules, or the rules of this JSON file')
+    parser.add_argument('--extra-columns', action='store_true', default=None,
+                        help='also fail tables with columns that are not in their expected schema')
+    parser.add_argument('--incremental-state', metavar='STATE_JSON',
+                        help='only re-verify the tables that changed since the run that wrote this state file')
+    parser.add_argument('--schema-bundle', help='compiled expected schema bundle, local path or s3:// URI')
+    parser.add_argument('--snapshot-bundle', help='write a bundle of the current schemas of --database/--schema '
+                                                  'to this local path or s3:// URI instead of verifying')
+    parser.add_argument('--compile-bundle', help='write a bundle of the expected schemas of --manifest '
+                                                 'to this local path or s3:// URI instead of verifying')
+    parser.add_argument('--database')
+    parser.add_argument('--schema')
+    parser.add_argument('--workers', type=int, help='verify in this many worker processes, with checkpoints')
+    parser.add_argument('--shard-count', type=int)
+    parser.add_argument('--shards', type=int, nargs='+', help='run only these shards (multi-host runs)')
+    parser.add_argument('--checkpoint-dir')
+    parser.add_argument('--merge', action='store_true', default=None,
+                        help='merge the checkpoints of every shard of --run-id into one run report')
+    parser.add_argument('--run-id', help='identifier of the run; pass the one of an interrupted run to resume it')
+    parser.add_argument('--daemon', action='store_true', default=None,
+                        help='keep running and re-verify every table on its own schedule')
+    parser.add_argument('--min-interval', type=float, help='daemon: seconds between checks of the hottest tables')
+    parser.add_argument('--max-interval', type=float, help='daemon: seconds between checks of the stablest tables')
+    parser.add_argument('--tick', type=float, help='daemon: seconds between two scheduling rounds')
+    parser.add_argument('--history-db', help='daemon: SQLite history store of the results')
+    args = parser.parse_args(argv)
+
+    event = {'save_to_s3': False}
+    if args.event:
+        with open(args.event, 'r') as f:
+            event.update(json.load(f))
+    options = {
+        'manifest_path': args.manifest,
+        'save_to_s3': args.save_to_s3,
+        'results_bucket': args.results_bucket,
+        'output_dir': args.output_dir,
+        'output_format': args.output_format,
+        'compression': args.compression,
+        'concurrency': args.concurrency,
+        'table_timeout': args.table_timeout,
+        'metadata_backend': args.metadata_backend,
+        'schema_bundle': args.schema_bundle,
+        'report_mode': args.report_mode,
+        'type_equivalence': args.type_equivalence,
+        'extra_columns': args.extra_columns,
+        'incremental_state': args.incremental_state,
+        'snapshot_bundle': args.snapshot_bundle,
+        'compile_bundle': args.compile_bundle,
+        'database': args.database,
+        'schema': args.schema,
+        'workers': args.workers,
+        'shard_count': args.shard_count,
+        'shards': args.shards,
+        'checkpoint_dir': args.checkpoint_dir,
+        'merge': args.merge,
+        'run_id': args.run_id,
+        'daemon': args.daemon,
+        'min_interval': args.min_interval,
+        'max_interval': args.max_interval,
+        'tick': args.tick,
+        'history_db': args.history_db
+    }
+    event.update((key, value) for key, value in options.items() if value is not None)
+    if event.get('compression') == 'none':
+        event['compression'] = None
+    if event.get('daemon'):
+        return run_daemon(event)
+
+    response = lambda_handler(event)
+    print(json.dumps(response, indent=4, default=str))
+    return 0 if not response.get('failed_tables') else 1
+
+
+if __name__ == '__main__':
+    # This directory is not an importable package name, so when run as a script it is loaded under an
+    # alias (as the benchmarks do) for the relative imports to work
+    import importlib.util
+    import sys
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(package_dir))) # for the absolute 'utils.' imports
+    spec = importlib.util.spec_from_file_location('schema_verification', os.path.join(package_dir, '__init__.py'),
+                                                  submodule_search_locations=[package_dir])
+    sys.modules['schema_verification'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['schema_verification'])
+    logging.basicConfig(level=logging.WARNING)
+    raise SystemExit(importlib.import_module('schema_verification.handler').main())
@@ -0,0 +1,315 @@
+import glob
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from .compare_schemas import result_status
+
+# schema_comparison_<TABLE>_<YYYYMMDD>_<HHMMSS>.json, as written by save_result_to_json
+_RESULT_FILE_PATTERN = re.compile(r"^schema_comparison_(?P<table>.+)_(?P<timestamp>\d{8}_\d{6})\.json$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    database_name TEXT NOT NULL DEFAULT '',
+    schema_name TEXT NOT NULL DEFAULT '',
+    table_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (run_id, database_name, schema_name, table_name)
+);
+CREATE TABLE IF NOT EXISTS findings (
+    run_id TEXT NOT NULL,
+    database_name TEXT NOT NULL DEFAULT '',
+    schema_name TEXT NOT NULL DEFAULT '',
+    table_name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    attribute TEXT NOT NULL DEFAULT '',
+    expected TEXT,
+    actual TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started_at ON runs (started_at);
+CREATE INDEX IF NOT EXISTS idx_results_table ON results (table_name, run_id);
+CREATE INDEX IF NOT EXISTS idx_results_status ON results (status, run_id);
+CREATE INDEX IF NOT EXISTS idx_findings_run ON findings (run_id, table_name);
+CREATE INDEX IF NOT EXISTS idx_findings_column ON findings (table_name, column_name, attribute);
+"""
+
+_FINDING_COLUMNS = "database_name, schema_name, table_name, kind, column_name, attribute, expected, actual"
+
+
+def _run_started_at(run_id):
+    """Derives an ISO timestamp from a YYYYMMDD_HHMMSS run id, falling back to the current time."""
+    try:
+        return datetime.strptime(run_id[:15], "%Y%m%d_%H%M%S").isoformat()
+    except ValueError:
+        return datetime.now().isoformat()
+
+
+def _findings(result):
+    """Yields (kind, column_name, attribute, expected, actual) for every finding of a comparison result."""
+    for mismatch in result.get('mismatches') or []:
+        yield ('mismatch', mismatch['COLUMN_NAME'], mismatch['ATTRIBUTE'],
+               json.dumps(mismatch.get('EXPECTED'), default=str), json.dumps(mismatch.get('ACTUAL'), default=str))
+    for column_name in result.get('missing_columns') or []:
+        yield ('missing_column', column_name, '', None, None)
+    for column_name in result.get('extra_columns') or []:
+        yield ('extra_column', column_name, '', None, None)
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zst'):
+        import zstandard
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')), encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+class HistoryStore:
+    """
+    Indexed history of verification results, stored in a local SQLite database.
+
+    Every run, table result and individual finding (mismatch, missing or extra column) is a row, indexed by run,
+    table, status, column and attribute, so questions like "when did CT_COUNTRY start failing" or "what changed
+    since the previous run" are answered with index lookups instead of opening every result file.
+
+    Parameters:
+        path (str): Path of the SQLite database file (created if needed).
+    """
+
+    def __init__(self, path='verification-history.sqlite'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # Recording
+
+    def record_results(self, run_id, results, started_at=None):
+        """
+        Records the results of a run (replacing any results already recorded for the same run and table).
+
+        Parameters:
+            run_id (str): Identifier of the run (e.g. its YYYYMMDD_HHMMSS timestamp).
+            results (iterable): Comparison results. Records written by NDJSONResultSink also carry database and schema.
+            started_at (str, optional): ISO start time of the run. Derived from run_id by default.
+        """
+        result_rows = []
+        finding_rows = []
+        for result in results:
+            key = (run_id, (result.get('database') or '').upper(), (result.get('schema') or '').upper(),
+                   result['table'].upper())
+            result_rows.append(key + (result_status(result),))
+            finding_rows.extend(key + finding for finding in _findings(result))
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO runs (run_id, started_at) VALUES (?, ?)",
+                               (run_id, started_at or _run_started_at(run_id)))
+            # Re-importing a result replaces its previous findings
+            self._conn.executemany(
+                "DELETE FROM findings WHERE run_id = ? AND database_name = ? AND schema_name = ? AND table_name = ?",
+                [row[:4] for row in result_rows]
+            )
+            self._conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", result_rows)
+            self._conn.executemany(f"INSERT INTO findings ({', '.join(['run_id', _FINDING_COLUMNS])}) "
+                                   f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", finding_rows)
+        return len(result_rows)
+
+    def recorder(self, run_id):
+        """Returns a save_result(result, entry) callable that records results of the given run as they arrive."""
+        def record(result, entry=None):
+            if entry is not None:
+                result = dict(result, database=entry.database, schema=entry.schema)
+            self.record_results(run_id, [result])
+        return record
+
+    def import_json_results(self, directory):
+        """
+        Imports the schema_comparison_<TABLE>_<timestamp>.json files of a directory (one run per timestamp).
+
+        Returns:
+            int: Number of imported results.
+        """
+        runs = {}
+        for path in sorted(glob.glob(os.path.join(directory, 'schema_comparison_*.json'))):
+            match = _RESULT_FILE_PATTERN.match(os.path.basename(path))
+            if not match:
+                continue
+            with open(path, 'r') as f:
+                result = json.load(f)
+            result.setdefault('table', match.group('table'))
+            runs.setdefault(match.group('timestamp'), []).append(result)
+        return sum(self.record_results(run_id, results) for run_id, results in runs.items())
+
+    def import_ndjson_results(self, path):
+        """
+        Imports an NDJSON result part (plain, .gz or .zst) written by NDJSONResultSink.
+
+        Returns:
+            int: Number of imported results.
+        """
+        runs = {}
+        with _open_text(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    runs.setdefault(record['run_id'], []).append(record)
+        return sum(self.record_results(run_id, results) for run_id, results in runs.items())
+
+    # Queries
+
+    def runs(self, limit=None):
+        """Returns the run ids, most recent first."""
+        sql = "SELECT run_id FROM runs ORDER BY started_at DESC, run_id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [row[0] for row in self._query(sql)]
+
+    def previous_run(self, run_id):
+        """Returns the run preceding the given one, or None."""
+        rows = self._query(
+            "SELECT run_id FROM runs WHERE (started_at, run_id) < (SELECT started_at, run_id FROM runs WHERE run_id = ?) "
+            "ORDER BY started_at DESC, run_id DESC LIMIT 1",
+            (run_id,)
+        )
+        return rows[0][0] if rows else None
+
+    @staticmethod
+    def _table_key(database, schema, table_name):
+        return ((database or '').upper(), (schema or '').upper(), table_name.upper())
+
+    def table_history(self, database, schema, table_name, limit=None):
+        """
+        Returns the status of a table in every run it was verified in, most recent first.
+
+        Tables are identified by database, schema and name, so that tables with the same name in other schemas
+        are not mixed in. Results imported from JSON files carry no database and schema; pass None for them.
+
+        Returns:
+            list: List of (run_id, status) tuples.
+        """
+        sql = ("SELECT r.run_id, r.status FROM results r JOIN runs USING (run_id) "
+               "WHERE r.database_name = ? AND r.schema_name = ? AND r.table_name = ? "
+               "ORDER BY runs.started_at DESC, r.run_id DESC")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, self._table_key(database, schema, table_name))
+
+    def failing_since(self, database, schema, table_name):
+        """
+        Returns the first run of the current failure streak of a table ("when did it start failing"),
+        or None if the table passed in its latest run. The table is identified as in table_history.
+        """
+        key = self._table_key(database, schema, table_name)
+        rows = self._query(
+            "SELECT r.run_id, r.status FROM results r JOIN runs USING (run_id) "
+            "WHERE r.database_name = ? AND r.schema_name = ? AND r.table_name = ? "
+            "AND runs.started_at > COALESCE((SELECT MAX(p.started_at) FROM results pr JOIN runs p USING (run_id) "
+            "WHERE pr.database_name = ? AND pr.schema_name = ? AND pr.table_name = ? AND pr.status = 'PASS'), '') "
+            "ORDER BY runs.started_at ASC, r.run_id ASC LIMIT 1",
+            key + key
+        )
+        return rows[0][0] if rows else None
+
+    def findings(self, run_id, database=None, schema=None, table_name=None):
+        """
+        Returns the findings of a run as dictionaries: all of them, or those of one table when table_name is given.
+        The table is identified by database, schema and name as in table_history (None for results imported from
+        JSON files), so that tables with the same name in other schemas are not mixed in.
+        """
+        sql = f"SELECT {_FINDING_COLUMNS} FROM findings WHERE run_id = ?"
+        params = [run_id]
+        if table_name is not None:
+            sql += " AND database_name = ? AND schema_name = ? AND table_name = ?"
+            params.extend(self._table_key(database, schema, table_name))
+        return [self._finding_dict(row) for row in self._query(sql, params)]
+
+    @staticmethod
+    def _finding_dict(row):
+        database_name, schema_name, table_name, kind, column_name, attribute, expected, actual = row
+        finding = {'database': database_name, 'schema': schema_name, 'table': table_name, 'kind': kind,
+                   'COLUMN_NAME': column_name}
+        if kind == 'mismatch':
+            finding.update({'ATTRIBUTE': attribute, 'EXPECTED': json.loads(expected), 'ACTUAL': json.loads(actual)})
+        return finding
+
+    def delta_report(self, run_id=None, previous_run_id=None):
+        """
+        Reports only what changed between a run and the one before it.
+
+        Parameters:
+            run_id (str, optional): Run to report on. Defaults to the latest run.
+            previous_run_id (str, optional): Run to compare with. Defaults to the run preceding run_id.
+
+        Returns:
+            dict: Status changes per table (new_failures, resolved, status_changes), tables that appeared or
+                  disappeared, and the findings that are new or resolved since the previous run.
+        """
+        if run_id is None:
+            latest = self.runs(limit=1)
+            if not latest:
+                raise ValueError("The history store is empty.")
+            run_id = latest[0]
+        if previous_run_id is None:
+            previous_run_id = self.previous_run(run_id)
+
+        report = {'run_id': run_id, 'previous_run_id': previous_run_id}
+
+        # Full outer join of the two runs' results on the table key
+        status_rows = self._query(
+            "SELECT database_name, schema_name, table_name, MAX(CASE WHEN run_id = ? THEN status END), "
+            "MAX(CASE WHEN run_id = ? THEN status END) FROM results WHERE run_id IN (?, ?) "
+            "GROUP BY database_name, schema_name, table_name",
+            (previous_run_id, run_id, previous_run_id or run_id, run_id)
+        )
+        report.update({'new_failures': [], 'resolved': [], 'status_changes': [], 'new_tables': [], 'removed_tables': []})
+        for database_name, schema_name, table_name, before, after in status_rows:
+            table = {'database': database_name, 'schema': schema_name, 'table': table_name,
+                     'before': before, 'after': after}
+            if before is None:
+                report['new_tables'].append(table)
+            elif after is None:
+                report['removed_tables'].append(table)
+            elif before == "PASS" and after != "PASS":
+                report['new_failures'].append(table)
+            elif before != "PASS" and after == "PASS":
+                report['resolved'].append(table)
+            elif before != after:
+                report['status_changes'].append(table)
+
+        # Findings that exist in one run and not in the other (only for tables verified in both runs)
+        difference = (f"SELECT {_FINDING_COLUMNS} FROM findings WHERE run_id = ? "
+                      f"AND (database_name, schema_name, table_name) IN "
+                      f"(SELECT database_name, schema_name, table_name FROM results WHERE run_id = ?) "
+                      f"EXCEPT SELECT {_FINDING_COLUMNS} FROM findings WHERE run_id = ?")
+        report['new_findings'] = [self._finding_dict(row)
+                                  for row in self._query(difference, (run_id, previous_run_id, previous_run_id))]
+        report['resolved_findings'] = [self._finding_dict(row)
+                                       for row in self._query(difference, (previous_run_id, run_id, run_id))]
+        return report
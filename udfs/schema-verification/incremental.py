@@ -0,0 +1,103 @@
+from .batch_compare import compare_schemas_batch
+from .metadata_backends import InformationSchemaBackend, get_metadata_backend
+from .query_snowflake_schema import query_tables_last_altered
+from .state_store import VerificationStateStore, expected_fingerprint, schema_fingerprint
+from .type_equivalence import get_type_equivalence
+
+
+def verify_schemas_incremental(pkb, database_name, schema_name, expected_schemas, state_store, logger, pool=None,
+                               metadata_backend=None, type_equivalence=None, detect_extra_columns=False):
+    """
+    Verifies the schemas of many tables, only re-comparing the tables whose structure or contract changed.
+
+    Tables are checked in two steps:
+        1. LAST_ALTERED (one INFORMATION_SCHEMA.TABLES query): if neither LAST_ALTERED nor the expected schema
+           fingerprint (which includes the comparison options) changed since the last run, the previous result
+           is carried forward.
+        2. The remaining tables are queried in bulk. If the fingerprint of their actual schema is unchanged
+           (e.g. LAST_ALTERED moved because of DML) and so is the expected one, the previous result is carried
+           forward as well. Only the rest is compared.
+
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connection.
+        database_name (str): Name of the database containing the tables.
+        schema_name (str): Name of the schema containing the tables.
+        expected_schemas (dict): Dictionary table name -> expected schema (list of dictionaries).
+        state_store (VerificationStateStore): Store with the state of the previous runs. It is saved before returning.
+        logger (logging.Logger): Logger for logging messages.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the Snowflake connections from.
+        metadata_backend (str, optional): Backend for the bulk column query in step 2: 'information_schema'
+            or 'show_columns'. LAST_ALTERED always comes from INFORMATION_SCHEMA.TABLES. Defaults to
+            INFORMATION_SCHEMA read as columnar Arrow batches.
+        type_equivalence (bool, str, dict or TypeEquivalence, optional): Type-equivalence rules applied before
+            comparing (see type_equivalence.get_type_equivalence). Defaults to raw comparisons.
+        detect_extra_columns (bool, optional): Also fail tables with columns that were not expected.
+
+    Returns:
+        dict: Dictionary table name -> comparison result (same shape as compare_schemas), in input order.
+    """
+    schema_name = schema_name.upper()
+    table_names = [table_name.upper() for table_name in expected_schemas]
+    expected_by_table = {table_name.upper(): schema for table_name, schema in expected_schemas.items()}
+    type_equivalence = get_type_equivalence(type_equivalence)
+    expected_fingerprints = {table_name: expected_fingerprint(schema, type_equivalence, detect_extra_columns)
+                             for table_name, schema in expected_by_table.items()}
+
+    last_altered = query_tables_last_altered(pkb, database_name, logger, schema_name=schema_name,
+                                             table_names=table_names, pool=pool)
+
+    results = {}
+    candidates = []
+    for table_name in table_names:
+        table_key = VerificationStateStore.table_key(database_name, schema_name, table_name)
+        entry = state_store.get(table_key)
+        table_last_altered = last_altered.get((schema_name, table_name))
+        if (entry is not None
+                and table_last_altered is not None
+                and entry['last_altered'] == table_last_altered
+                and entry['expected_fingerprint'] == expected_fingerprints[table_name]):
+            results[table_name] = entry['result']
+        else:
+            candidates.append(table_name)
+
+    unaltered = len(table_names) - len(candidates)
+    metadata_backend = get_metadata_backend(metadata_backend or InformationSchemaBackend(columnar=True))
+    actual_schemas = metadata_backend.query_schemas_bulk(pkb, database_name, logger, schema_name=schema_name,
+                                                         table_names=candidates, pool=pool) if candidates else {}
+
+    to_compare = []
+    fingerprints = {}
+    for table_name in candidates:
+        table_key = VerificationStateStore.table_key(database_name, schema_name, table_name)
+        entry = state_store.get(table_key)
+        actual_schema = actual_schemas.get((schema_name, table_name), [])
+        actual_fingerprint = schema_fingerprint(actual_schema)
+        table_last_altered = last_altered.get((schema_name, table_name))
+        if (entry is not None
+                and entry['actual_fingerprint'] == actual_fingerprint
+                and entry['expected_fingerprint'] == expected_fingerprints[table_name]):
+            # Altered (e.g. by DML) but structurally identical: keep the previous result
+            state_store.touch(table_key, table_last_altered)
+            results[table_name] = entry['result']
+        else:
+            fingerprints[table_name] = (actual_fingerprint, table_last_altered)
+            to_compare.append((table_name, expected_by_table[table_name], actual_schema))
+
+    for comparison_result in compare_schemas_batch(to_compare, logger, type_equivalence=type_equivalence,
+                                                   detect_extra_columns=detect_extra_columns):
+        table_name = comparison_result['table']
+        actual_fingerprint, table_last_altered = fingerprints[table_name]
+        state_store.update(
+            VerificationStateStore.table_key(database_name, schema_name, table_name),
+            comparison_result,
+            expected_fingerprints[table_name],
+            actual_fingerprint,
+            table_last_altered
+        )
+        results[table_name] = comparison_result
+
+    state_store.save()
+
+    logger.info(f"Incremental verification of {len(table_names)} tables: {unaltered} unaltered, "
+                f"{len(candidates) - len(to_compare)} structurally unchanged, {len(to_compare)} compared.")
+    return {table_name: results[table_name] for table_name in table_names}
@@ -0,0 +1,182 @@
+import json
+
+from utils.snowflake_connection import run_snowflake_query, run_snowflake_statements
+
+from .query_snowflake_schema import (
+    SCHEMA_COLUMNS,
+    _validate_identifier,
+    query_snowflake_schema,
+    query_snowflake_schemas_bulk,
+    query_snowflake_schemas_columnar
+)
+
+# Type names used in the SHOW COLUMNS data_type JSON that differ from the INFORMATION_SCHEMA DATA_TYPE
+_SHOW_TYPE_NAMES = {'FIXED': 'NUMBER', 'REAL': 'FLOAT'}
+
+_DATETIME_TYPES = frozenset({'TIME', 'TIMESTAMP_LTZ', 'TIMESTAMP_NTZ', 'TIMESTAMP_TZ'})
+
+# Positions of the columns used from the SHOW COLUMNS output (table_name, schema_name, column_name, data_type, ...)
+_SHOW_TABLE_NAME, _SHOW_SCHEMA_NAME, _SHOW_COLUMN_NAME, _SHOW_DATA_TYPE = range(4)
+
+
+def show_data_type_to_column(column_name, data_type):
+    """
+    Converts the data_type JSON of a SHOW COLUMNS row (e.g. {"type":"FIXED","precision":38,"scale":0,"nullable":true})
+    into a column dictionary with the INFORMATION_SCHEMA.COLUMNS keys (see SCHEMA_COLUMNS).
+    """
+    if isinstance(data_type, str):
+        data_type = json.loads(data_type)
+    type_name = data_type.get('type')
+    column = dict.fromkeys(SCHEMA_COLUMNS)
+    column['COLUMN_NAME'] = column_name
+    column['IS_NULLABLE'] = "YES" if data_type.get('nullable', True) else "NO"
+    column['DATA_TYPE'] = _SHOW_TYPE_NAMES.get(type_name, type_name)
+    if type_name == 'FIXED':
+        column['NUMERIC_PRECISION'] = data_type.get('precision')
+        column['NUMERIC_SCALE'] = data_type.get('scale')
+    elif type_name in ('TEXT', 'BINARY'):
+        column['CHARACTER_MAXIMUM_LENGTH'] = data_type.get('length')
+    elif type_name in _DATETIME_TYPES:
+        # For date/time types the JSON "scale" holds the fractional seconds precision
+        column['DATETIME_PRECISION'] = data_type.get('scale')
+    return column
+
+
+class InformationSchemaBackend:
+    """
+    Reads column metadata from INFORMATION_SCHEMA.COLUMNS (needs a running warehouse).
+
+    Parameters:
+        columnar (bool, optional): Stream bulk queries as Arrow batches into ColumnarSchema objects
+            (see query_snowflake_schemas_columnar) instead of lists of dictionaries.
+    """
+
+    name = 'information_schema'
+
+    def __init__(self, columnar=False):
+        self.columnar = columnar
+
+    def query_schema(self, pkb, table_name, schema_name, database_name, logger, pool=None):
+        return query_snowflake_schema(pkb, table_name, schema_name, database_name, logger, pool=pool)
+
+    def query_schemas_bulk(self, pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+        if self.columnar:
+            return query_snowflake_schemas_columnar(pkb, database_name, logger, schema_name=schema_name,
+                                                    table_names=table_names, pool=pool)
+        return query_snowflake_schemas_bulk(pkb, database_name, logger, schema_name=schema_name,
+                                            table_names=table_names, pool=pool)
+
+
+class ShowColumnsBackend:
+    """
+    Reads column metadata with SHOW COLUMNS, which is answered from the metadata layer without a warehouse.
+
+    For a schema or a database, the SHOW output is filtered and projected server-side with
+    RESULT_SCAN(LAST_QUERY_ID()) on the same session, so only the needed columns of the requested tables are
+    fetched. The output for a single table is small and is filtered client-side. The data_type JSON is mapped
+    onto the INFORMATION_SCHEMA keys (see show_data_type_to_column). Columns keep the SHOW COLUMNS order.
+
+    Parameters:
+        use_result_scan (bool, optional): Post-process schema/database output with RESULT_SCAN. When False, the
+            whole SHOW output is fetched and filtered client-side, so that no statement needs a warehouse.
+    """
+
+    name = 'show_columns'
+
+    def __init__(self, use_result_scan=True):
+        self.use_result_scan = use_result_scan
+
+    @staticmethod
+    def _result_scan_statements(scope, table_names):
+        conditions = ["\"schema_name\" <> 'INFORMATION_SCHEMA'"]
+        params = []
+        if table_names is not None:
+            conditions.append(f"\"table_name\" IN ({', '.join(['%s'] * len(table_names))})")
+            params.extend(name.upper() for name in table_names)
+        return [
+            (f"SHOW COLUMNS IN {scope};", None),
+            (f"""
+            SELECT "schema_name", "table_name", "column_name", "data_type"
+            FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))
+            WHERE {' AND '.join(conditions)};
+            """, params)
+        ]
+
+    @staticmethod
+    def _filter_show_output(output, table_names):
+        wanted = None if table_names is None else {name.upper() for name in table_names}
+        return [
+            (row[_SHOW_SCHEMA_NAME], row[_SHOW_TABLE_NAME], row[_SHOW_COLUMN_NAME], row[_SHOW_DATA_TYPE])
+            for row in output
+            if row[_SHOW_SCHEMA_NAME] != 'INFORMATION_SCHEMA'
+            and (wanted is None or row[_SHOW_TABLE_NAME] in wanted)
+        ]
+
+    def _show_columns(self, pkb, scope, logger, table_names=None, pool=None):
+        """Returns {(schema, table): [column dictionaries]} for SHOW COLUMNS IN <scope>."""
+        import snowflake.connector
+
+        try:
+            if self.use_result_scan and not scope.startswith('TABLE '):
+                rows = run_snowflake_statements(pkb, self._result_scan_statements(scope, table_names), pool=pool)
+            else:
+                output = run_snowflake_query(pkb, f"SHOW COLUMNS IN {scope};", pool=pool)
+                rows = self._filter_show_output(output, table_names)
+        except snowflake.connector.Error as e:
+            logger.error(f"Snowflake SHOW COLUMNS query failed: {e}")
+            raise
+        return self._group_columns(rows)
+
+    @staticmethod
+    def _group_columns(rows):
+        """Groups (schema, table, column_name, data_type) rows into {(schema, table): [column dictionaries]}."""
+        actual_schemas = {}
+        for schema, table, column_name, data_type in rows:
+            actual_schemas.setdefault((schema, table), []).append(show_data_type_to_column(column_name, data_type))
+        return actual_schemas
+
+    def query_schema(self, pkb, table_name, schema_name, database_name, logger, pool=None):
+        database_name = _validate_identifier(database_name, "database")
+        schema_name = _validate_identifier(schema_name, "schema")
+        table_name = _validate_identifier(table_name, "table")
+        logger.info(f"Executing SHOW COLUMNS for table '{database_name}.{schema_name}.{table_name}'.")
+        actual_schemas = self._show_columns(pkb, f"TABLE {database_name}.{schema_name}.{table_name}", logger,
+                                            pool=pool)
+        logger.info("Successfully retrieved the actual schema from Snowflake.")
+        return actual_schemas.get((schema_name, table_name), [])
+
+    def query_schemas_bulk(self, pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+        if table_names is not None and schema_name is None:
+            raise ValueError("schema_name is required when table_names are given.")
+        if table_names is not None and not table_names:
+            return {}
+        database_name = _validate_identifier(database_name, "database")
+        if schema_name is None:
+            scope = f"DATABASE {database_name}"
+        else:
+            scope = f"SCHEMA {database_name}.{_validate_identifier(schema_name, 'schema')}"
+        logger.info(f"Executing bulk SHOW COLUMNS for '{scope}'"
+                    + (f" ({len(table_names)} tables)." if table_names is not None else "."))
+        actual_schemas = self._show_columns(pkb, scope, logger, table_names, pool=pool)
+        logger.info(f"Successfully retrieved the actual schemas of {len(actual_schemas)} tables from Snowflake.")
+        return actual_schemas
+
+
+METADATA_BACKENDS = {
+    InformationSchemaBackend.name: InformationSchemaBackend,
+    ShowColumnsBackend.name: ShowColumnsBackend
+}
+
+
+def get_metadata_backend(backend=None):
+    """
+    Returns a metadata backend: backend itself if it is already a backend object, otherwise a new instance of the
+    backend of that name ('information_schema' or 'show_columns'). Defaults to INFORMATION_SCHEMA.
+    """
+    if backend is None:
+        return InformationSchemaBackend()
+    if not isinstance(backend, str):
+        return backend
+    if backend not in METADATA_BACKENDS:
+        raise ValueError(f"Unsupported metadata backend: {backend!r}. Expected one of {sorted(METADATA_BACKENDS)}.")
+    return METADATA_BACKENDS[backend]()
@@ -0,0 +1,456 @@
+import asyncio
+import csv
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .compare_schemas import compare_schemas, log_run_report
+from .fetch_expected_schema_from_s3 import fetch_expected_schema_cached
+from .metadata_backends import get_metadata_backend
+from .query_snowflake_schema import query_tables_last_altered
+from .state_store import VerificationStateStore, expected_fingerprint, schema_fingerprint
+from .type_equivalence import get_type_equivalence
+from utils import metrics
+from utils.aws_clients import get_client
+
+# One table to verify: where it lives in Snowflake and where its expected schema is stored in S3
+ManifestEntry = namedtuple('ManifestEntry', ['database', 'schema', 'table', 'expected_schema_key', 'bucket'])
+
+# Pipeline stages, in execution order
+STAGES = ('fetch', 'query', 'compare', 'save')
+
+
+def load_manifest(path, default_bucket=None):
+    """
+    Loads the list of tables to verify from a JSON or CSV manifest.
+
+    JSON manifests are either a list of entries or an object {"bucket": ..., "tables": [...]}, where each entry
+    has the keys database, schema, table, expected_schema_key and optionally bucket. CSV manifests have a header
+    row with the same column names.
+
+    Parameters:
+        path (str): Path to the manifest file (.json or .csv).
+        default_bucket (str, optional): S3 bucket used for entries that do not name one.
+
+    Returns:
+        list: List of ManifestEntry tuples.
+    """
+    with open(path, 'r', newline='') as f:
+        if path.lower().endswith('.csv'):
+            return parse_manifest(list(csv.DictReader(f)), default_bucket)
+        return parse_manifest_json(json.load(f), default_bucket)
+
+
+def parse_manifest_json(manifest, default_bucket=None):
+    """
+    Converts a decoded JSON manifest (a list of entries or an object {"bucket": ..., "tables": [...]})
+    into ManifestEntry tuples.
+    """
+    if isinstance(manifest, dict):
+        return parse_manifest(manifest.get('tables', []), manifest.get('bucket', default_bucket))
+    return parse_manifest(manifest, default_bucket)
+
+
+def parse_manifest(raw_entries, default_bucket=None):
+    """
+    Converts manifest entries (dictionaries) into ManifestEntry tuples, validating the required keys.
+    """
+    entries = []
+    for position, raw in enumerate(raw_entries):
+        missing = [key for key in ('database', 'schema', 'table', 'expected_schema_key') if not raw.get(key)]
+        bucket = raw.get('bucket') or default_bucket
+        if not bucket:
+            missing.append('bucket')
+        if missing:
+            raise ValueError(f"Manifest entry {position} is missing {', '.join(missing)}: {raw}")
+        entries.append(ManifestEntry(raw['database'], raw['schema'], raw['table'], raw['expected_schema_key'], bucket))
+    return entries
+
+
+class _BulkQuery:
+    """Actual schemas of a batch of tables of one schema, read with one bulk metadata query when first needed."""
+    __slots__ = ('database', 'schema', 'tables', 'task', 'schemas', 'last_altered', 'unaltered')
+
+    def __init__(self, database, schema, tables):
+        self.database = database
+        self.schema = schema
+        self.tables = tables
+        self.task = None # asyncio task running the bulk query, started by the first table of the batch to need it
+        self.schemas = None
+        self.last_altered = {} # (schema, table) -> LAST_ALTERED, with a state store
+        self.unaltered = set() # tables not altered since their stored verification (not queried)
+
+
+def _plan_bulk_queries(entries, batch_size):
+    """Groups the entries per (database, schema) into batches of at most batch_size tables; returns {entry: batch}."""
+    by_schema = {}
+    for entry in entries:
+        by_schema.setdefault((entry.database.upper(), entry.schema.upper()), []).append(entry)
+    batches = {}
+    for (database_name, schema_name), schema_entries in by_schema.items():
+        for start in range(0, len(schema_entries), batch_size):
+            chunk = schema_entries[start:start + batch_size]
+            bulk_query = _BulkQuery(database_name, schema_name, list(dict.fromkeys(entry.table for entry in chunk)))
+            for entry in chunk:
+                batches[entry] = bulk_query
+    return batches
+
+
+class _Job:
+    """State of one table travelling through the pipeline."""
+    __slots__ = ('entry', 'bulk_query', 'deadline', 'started_at', 'expected_schema', 'actual_schema', 'result',
+                 'expected_fingerprint', 'actual_fingerprint', 'last_altered', 'carried_forward')
+
+    def __init__(self, entry, bulk_query):
+        self.entry = entry
+        self.bulk_query = bulk_query
+        self.deadline = None # set when the first stage picks the job up
+        self.started_at = None
+        self.expected_schema = None
+        self.actual_schema = None
+        self.result = None
+        self.expected_fingerprint = None
+        self.actual_fingerprint = None
+        self.last_altered = None
+        self.carried_forward = False
+
+    def start(self, timeout):
+        self.deadline = time.monotonic() + timeout
+        self.started_at = time.time() # wall clock, to match the span start times
+
+
+class _StageExecutor:
+    """
+    Bounded thread pool of one pipeline stage.
+
+    A call that times out cannot be interrupted: its thread stays stuck (e.g. in a hung Snowflake or S3 request)
+    and would hold one of the stage's threads for good. The pool is therefore replaced by a fresh one whenever a
+    timed-out call is still running, so later tables keep the stage's full concurrency; the stuck thread finishes
+    (or fails) on its own in the abandoned pool.
+    """
+
+    def __init__(self, stage, workers):
+        self.stage = stage
+        self.workers = workers
+        self.leaked = 0 # threads abandoned in a timed-out call
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"verification-{self.stage}")
+
+    def submit(self, function, *args):
+        return self._executor.submit(function, *args)
+
+    def abandon(self, future):
+        """
+        Handles a timed-out call: cancels it if it has not started, else leaves its thread behind and replaces
+        the pool. Returns True if a thread was leaked.
+        """
+        if future.cancel():
+            return False
+        self.leaked += 1
+        executor, self._executor = self._executor, self._new_executor()
+        executor.shutdown(wait=False)
+        return True
+
+    def shutdown(self):
+        # Threads stuck in timed-out calls are not waited for
+        self._executor.shutdown(wait=False)
+
+
+def _retrieve_exception(task):
+    # The tables waiting for a bulk query may all have timed out; its failure is then not reported by asyncio
+    if not task.cancelled():
+        task.exception()
+
+
+def error_result(entry, status, message):
+    """Result recorded for a table whose verification could not complete."""
+    return {
+        'schema_check_status': status, # "ERROR" or "TIMEOUT"
+        'table': entry.table,
+        'error': message,
+        'mismatches': [],
+        'missing_columns': []
+    }
+
+
+class VerificationOrchestrator:
+    """
+    Runs fetch -> query -> compare -> save for many tables with bounded concurrency.
+
+    Every stage has its own bounded queue and its own set of workers, so a stage that falls behind
+    makes the previous stages wait (backpressure) instead of piling up work in memory. Each table has
+    a deadline of table_timeout seconds from the moment the fetch stage picks it up (time spent waiting
+    in the fetch queue does not count); a table that exceeds it is recorded with status TIMEOUT and the
+    other tables carry on.
+
+    Expected schemas are fetched with conditional GETs against the local ETag cache (see
+    fetch_expected_schema_cached), and actual schemas are read with one bulk metadata query per batch of
+    tables of the same schema: the first table of a batch to reach the query stage starts the query for the
+    whole batch, and the other tables of the batch wait for its result without holding a worker thread. The
+    bulk query runs in its own pool and is bounded by table_timeout; if it times out, every table of the batch
+    fails with one TIMEOUT and at most one thread is left behind.
+
+    With a state store, verification is incremental (as in incremental.verify_schemas_incremental): the bulk
+    query first reads LAST_ALTERED for the batch, and the tables that were not altered since their stored
+    verification are left out of the metadata query. If their expected schema and the comparison options are
+    unchanged as well, their previous result is carried forward without comparing them again. LAST_ALTERED also
+    moves with DML, so the tables that were queried are fingerprinted too: a table whose actual schema, expected
+    schema and options all match its stored verification keeps its previous result as well.
+
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connections (ignored when pool is given).
+        logger (logging.Logger): Logger for logging messages.
+        save_result (callable): Called as save_result(result, entry) for every table, including failures.
+        concurrency (int, optional): Number of workers per I/O stage (S3 fetch, Snowflake query, save).
+        table_timeout (float, optional): Maximum number of seconds one table may spend in the pipeline.
+        queue_size (int, optional): Capacity of each stage queue. Defaults to twice the concurrency.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow Snowflake connections from.
+        metadata_backend (str, optional): Where the actual schemas are read from: 'information_schema' (default)
+            or 'show_columns' (see metadata_backends).
+        schema_bundle (SchemaBundle, optional): Compiled bundle the expected schemas are read from (see
+            schema_bundle). Tables missing from the bundle fall back to their expected_schema_key in S3.
+        report_mode (str, optional): How mismatches are logged (see compare_schemas.REPORT_MODES): 'detail'
+            (default, one line per finding), 'table' (one summary per failed table) or 'run' (one summary for
+            the whole run).
+        type_equivalence (bool, str or dict, optional): Type-equivalence rules applied before comparing (see
+            type_equivalence.get_type_equivalence): True for the default rules, or custom rules (a dictionary or
+            the path to a JSON file). Defaults to raw comparisons.
+        detect_extra_columns (bool, optional): Also fail tables with columns that were not expected.
+        bulk_query_size (int, optional): Maximum number of tables read by one bulk metadata query.
+        state_store (VerificationStateStore, optional): State of the previous runs, for incremental verification.
+            It is updated with the tables compared and saved at the end of the run.
+    """
+
+    def __init__(self, pkb, logger, save_result, concurrency=8, table_timeout=300, queue_size=None, pool=None,
+                 metadata_backend=None, schema_bundle=None, report_mode='detail', type_equivalence=None,
+                 detect_extra_columns=False, bulk_query_size=500, state_store=None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        if bulk_query_size < 1:
+            raise ValueError("bulk_query_size must be at least 1.")
+        self.pkb = pkb
+        self.logger = logger
+        self.save_result = save_result
+        self.concurrency = concurrency
+        self.table_timeout = table_timeout
+        self.queue_size = queue_size or 2 * concurrency
+        self.pool = pool
+        self.metadata_backend = get_metadata_backend(metadata_backend)
+        self.schema_bundle = schema_bundle
+        self.report_mode = report_mode
+        self.type_equivalence = get_type_equivalence(type_equivalence)
+        self.detect_extra_columns = detect_extra_columns
+        self.bulk_query_size = bulk_query_size
+        self.state_store = state_store
+
+    def _fetch(self, job):
+        entry = job.entry
+        if self.schema_bundle is not None:
+            job.expected_schema = self.schema_bundle.get(entry.schema, entry.table, entry.database)
+            if job.expected_schema is not None:
+                return
+        job.expected_schema, _ = fetch_expected_schema_cached(get_client('s3'), entry.bucket, entry.expected_schema_key)
+
+    @staticmethod
+    def _table_key(entry):
+        return VerificationStateStore.table_key(entry.database, entry.schema, entry.table)
+
+    def _run_bulk_query(self, bulk_query):
+        # The query serves the whole batch: its spans are not charged to any one table
+        with metrics.table_context(None):
+            table_names = bulk_query.tables
+            if self.state_store is not None:
+                bulk_query.last_altered = query_tables_last_altered(
+                    self.pkb, bulk_query.database, self.logger, schema_name=bulk_query.schema, table_names=table_names,
+                    pool=self.pool)
+                for table_name in table_names:
+                    state = self.state_store.get(
+                        VerificationStateStore.table_key(bulk_query.database, bulk_query.schema, table_name))
+                    last_altered = bulk_query.last_altered.get((bulk_query.schema, table_name.upper()))
+                    if state is not None and last_altered is not None and state['last_altered'] == last_altered:
+                        bulk_query.unaltered.add(table_name.upper())
+                table_names = [table_name for table_name in table_names
+                               if table_name.upper() not in bulk_query.unaltered]
+            bulk_query.schemas = self.metadata_backend.query_schemas_bulk(
+                self.pkb, bulk_query.database, self.logger, schema_name=bulk_query.schema, table_names=table_names,
+                pool=self.pool) if table_names else {}
+
+    async def _bulk_query_task(self, bulk_query, executor):
+        """Runs the bulk query of a batch once, in the bulk query pool, bounded by table_timeout."""
+        future = executor.submit(self._run_bulk_query, bulk_query)
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(future), self.table_timeout)
+        except asyncio.TimeoutError:
+            self.logger.error(f"Bulk metadata query of {len(bulk_query.tables)} tables of schema "
+                              f"'{bulk_query.database}.{bulk_query.schema}' timed out.")
+            if executor.abandon(future):
+                self.logger.warning(f"The bulk metadata query is still running; its thread was left behind "
+                                    f"({executor.leaked} leaked by bulk queries in this run).")
+            raise
+
+    async def _await_bulk_query(self, job, executor, timeout):
+        """Waits for the bulk query of the job's batch (starting it if needed); every table of the batch shares it."""
+        bulk_query = job.bulk_query
+        if bulk_query.task is None:
+            bulk_query.task = asyncio.ensure_future(self._bulk_query_task(bulk_query, executor))
+            bulk_query.task.add_done_callback(_retrieve_exception)
+        # A table that times out stops waiting without cancelling the query the other tables wait for
+        await asyncio.wait_for(asyncio.shield(bulk_query.task), timeout)
+
+    def _query(self, job):
+        bulk_query, job.bulk_query = job.bulk_query, None # the batch is released once all its tables are queried
+        table_name = job.entry.table.upper()
+        if self.state_store is not None:
+            job.expected_fingerprint = expected_fingerprint(job.expected_schema, self.type_equivalence,
+                                                            self.detect_extra_columns)
+            job.last_altered = bulk_query.last_altered.get((bulk_query.schema, table_name))
+            if table_name in bulk_query.unaltered:
+                state = self.state_store.get(self._table_key(job.entry))
+                if state['expected_fingerprint'] == job.expected_fingerprint:
+                    job.result = dict(state['result']) # the save stage adds this run's timings to it
+                    job.carried_forward = True
+                    return
+                # The table is unaltered but its contract (or the options) changed: read it alone
+                job.actual_schema = self.metadata_backend.query_schemas_bulk(
+                    self.pkb, bulk_query.database, self.logger, schema_name=bulk_query.schema,
+                    table_names=[job.entry.table], pool=self.pool).get((bulk_query.schema, table_name), [])
+                return
+        job.actual_schema = bulk_query.schemas.get((bulk_query.schema, table_name), [])
+        if self.state_store is not None:
+            job.actual_fingerprint = schema_fingerprint(job.actual_schema)
+            state = self.state_store.get(self._table_key(job.entry))
+            if (state is not None and state['actual_fingerprint'] == job.actual_fingerprint
+                    and state['expected_fingerprint'] == job.expected_fingerprint):
+                # Altered (e.g. by DML) but structurally identical: keep the previous result
+                self.state_store.touch(self._table_key(job.entry), job.last_altered)
+                job.result = dict(state['result'])
+                job.carried_forward = True
+
+    def _compare(self, job):
+        with metrics.span('comparison'):
+            job.result = compare_schemas(job.entry.table, job.expected_schema, job.actual_schema, self.logger,
+                                         report_mode=self.report_mode, type_equivalence=self.type_equivalence,
+                                         detect_extra_columns=self.detect_extra_columns)
+        if self.state_store is not None:
+            self.state_store.update(self._table_key(job.entry), dict(job.result), job.expected_fingerprint,
+                                    job.actual_fingerprint or schema_fingerprint(job.actual_schema), job.last_altered)
+
+    def _save(self, job):
+        # Time spent on this table so far, per stage (spans recorded before this job started are ignored)
+        job.result['timing'] = metrics.get_tracer().table_timings(self._table_key(job.entry), since=job.started_at)
+        with metrics.span('result_save'):
+            self.save_result(job.result, job.entry)
+
+    def _run_in_table_context(self, stage, job):
+        """
+        Runs one stage in a worker thread with its spans and counters tagged with the table, by its
+        DATABASE.SCHEMA.TABLE key so that same-named tables of other schemas keep their own timings.
+        """
+        with metrics.table_context(self._table_key(job.entry)):
+            getattr(self, f"_{stage}")(job)
+
+    async def _run_stage(self, stage, job, executors):
+        """Runs one stage of a job in the stage's thread pool, bounded by the job deadline."""
+        executor = executors[stage]
+        if job.result is not None and stage != 'save':
+            return # the job already failed or timed out; only its result is still saved
+        remaining = job.deadline - time.monotonic()
+        if stage == 'save' and remaining <= 0:
+            remaining = self.table_timeout # results of timed-out tables still get a budget to be saved
+        future = None
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            if stage == 'query':
+                await self._await_bulk_query(job, executors['bulk_query'], remaining)
+                remaining = job.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+            future = executor.submit(self._run_in_table_context, stage, job)
+            await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except asyncio.TimeoutError:
+            self.logger.error(f"Verification of table '{job.entry.table}' timed out during the {stage} stage.")
+            if future is not None and executor.abandon(future):
+                self.logger.warning(f"The {stage} call of table '{job.entry.table}' is still running; its thread "
+                                    f"was left behind ({executor.leaked} leaked by the {stage} stage in this run).")
+            if stage != 'save':
+                job.result = error_result(job.entry, "TIMEOUT", f"Timed out after {self.table_timeout}s in the {stage} stage.")
+        except Exception as e:
+            self.logger.error(f"Verification of table '{job.entry.table}' failed during the {stage} stage: {e}")
+            if stage != 'save':
+                job.result = error_result(job.entry, "ERROR", f"{stage}: {e}")
+
+    async def _worker(self, stage, in_queue, out_queue, executors, done):
+        while True:
+            job = await in_queue.get()
+            if job.deadline is None:
+                job.start(self.table_timeout)
+            try:
+                await self._run_stage(stage, job, executors)
+                if out_queue is not None:
+                    await out_queue.put(job) # blocks while the next stage is saturated (backpressure)
+                else:
+                    done.append(job)
+            finally:
+                in_queue.task_done()
+
+    async def run_async(self, entries):
+        """Verifies every manifest entry and returns the results in manifest order."""
+        entries = list(entries)
+        queues = {stage: asyncio.Queue(maxsize=self.queue_size) for stage in STAGES}
+        done = []
+        start = time.monotonic()
+
+        # Compare is CPU-bound and cheap, so it gets a single worker; the I/O stages get `concurrency` each.
+        # Every stage has its own pool, so calls stuck in one stage never take threads from another.
+        workers_per_stage = {'fetch': self.concurrency, 'query': self.concurrency, 'compare': 1, 'save': self.concurrency}
+        executors = {stage: _StageExecutor(stage, workers) for stage, workers in workers_per_stage.items()}
+        # Bulk metadata queries run apart from the per-table query calls (at most one per query worker at a time)
+        executors['bulk_query'] = _StageExecutor('bulk_query', self.concurrency)
+        tasks = []
+        for position, stage in enumerate(STAGES):
+            next_queue = queues[STAGES[position + 1]] if position + 1 < len(STAGES) else None
+            for _ in range(workers_per_stage[stage]):
+                tasks.append(asyncio.create_task(self._worker(stage, queues[stage], next_queue, executors, done)))
+
+        bulk_queries = _plan_bulk_queries(entries, self.bulk_query_size)
+        try:
+            for entry in entries:
+                await queues['fetch'].put(_Job(entry, bulk_queries[entry]))
+            for stage in STAGES:
+                await queues[stage].join()
+        finally:
+            tasks.extend(bulk_query.task for bulk_query in set(bulk_queries.values()) if bulk_query.task is not None)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for executor in executors.values():
+                executor.shutdown()
+            leaked = sum(executor.leaked for executor in executors.values())
+            if leaked:
+                self.logger.warning(f"{leaked} threads stuck in timed-out calls were left behind by this run.")
+            if self.state_store is not None:
+                self.state_store.save()
+
+        elapsed = time.monotonic() - start
+        by_entry = {job.entry: job.result for job in done}
+        carried_forward = sum(job.carried_forward for job in done)
+        results = [by_entry[entry] for entry in entries]
+
+        statuses = {}
+        for result in results:
+            statuses[result['schema_check_status']] = statuses.get(result['schema_check_status'], 0) + 1
+        throughput = len(results) / elapsed if elapsed > 0 else float('inf')
+        self.logger.info(f"Verified {len(results)} tables in {elapsed:.1f}s ({throughput:.1f} tables/s): "
+                         + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+                         + (f" ({carried_forward} unchanged, carried forward)" if self.state_store is not None else ""))
+        if self.report_mode == 'run':
+            log_run_report(results, self.logger)
+        return results
+
+    def run(self, entries):
+        """Synchronous wrapper around run_async."""
+        return asyncio.run(self.run_async(entries))
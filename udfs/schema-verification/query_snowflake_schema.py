@@ -1,9 +1,96 @@
-import snowflake.connector
+import re
+import sys
+
 from utils.secrets_manager import get_secrets
-from utils.snowflake_connection import create_snowflake_connection, get_snowflake_pkb
+from utils.snowflake_connection import (
+    create_snowflake_connection,
+    fetch_snowflake_column_batches,
+    get_snowflake_pkb,
+    run_snowflake_query
+)
+
+from .batch_compare import ColumnarSchema
+
+# Columns pulled from INFORMATION_SCHEMA.COLUMNS, in the order they appear in each row
+# of the actual schema (same keys as the expected schema JSON files).
+SCHEMA_COLUMNS = [
+    "COLUMN_NAME",
+    "IS_NULLABLE",
+    "DATA_TYPE",
+    "CHARACTER_MAXIMUM_LENGTH",
+    "NUMERIC_PRECISION",
+    "NUMERIC_SCALE",
+    "DATETIME_PRECISION"
+]
+
+# Database names cannot be bound as query parameters (they are part of the FROM clause),
+# so they are validated against the unquoted Snowflake identifier syntax instead.
+_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*$")
+
+
+def _validate_identifier(name, kind):
+    """Raises ValueError if the given name is not a plain (unquoted) Snowflake identifier."""
+    if not name or not _IDENTIFIER_PATTERN.match(name):
+        raise ValueError(f"Invalid Snowflake {kind} name: {name!r}")
+    return name.upper()
+
+
+def _row_to_column(row):
+    """Converts one INFORMATION_SCHEMA.COLUMNS row (in SCHEMA_COLUMNS order) into a column dictionary."""
+    return dict(zip(SCHEMA_COLUMNS, row))
+
+
+def _table_filters(database_name, schema_name=None, table_names=None):
+    """
+    Builds the WHERE clause (with %s placeholders) and its bound parameters that restrict an
+    INFORMATION_SCHEMA query to a database, a schema or a list of tables.
+    """
+    if table_names is not None and schema_name is None:
+        raise ValueError("schema_name is required when table_names are given.")
+
+    conditions = ["table_catalog = %s"]
+    params = [database_name]
+
+    if schema_name is not None:
+        conditions.append("table_schema = %s")
+        params.append(schema_name.upper())
+    else:
+        # INFORMATION_SCHEMA describes itself as well, which is never something we want to verify.
+        conditions.append("table_schema <> 'INFORMATION_SCHEMA'")
+
+    if table_names is not None:
+        placeholders = ", ".join(["%s"] * len(table_names))
+        conditions.append(f"table_name IN ({placeholders})")
+        params.extend(name.upper() for name in table_names)
+
+    return "WHERE " + "\n    AND ".join(conditions), params
+
+
+def _bulk_columns_query(database_name, schema_name=None, table_names=None):
+    """Builds the INFORMATION_SCHEMA.COLUMNS query (and its parameters) of the bulk schema queries."""
+    filters, params = _table_filters(database_name, schema_name, table_names)
+
+    # TABLE_SCHEMA and TABLE_NAME are selected first so that the rows can be split per table;
+    # the remaining columns follow the SCHEMA_COLUMNS order.
+    sql_statement = f"""
+    SELECT 
+        TABLE_SCHEMA,
+        TABLE_NAME,
+        COLUMN_NAME, 
+        IS_NULLABLE, 
+        DATA_TYPE, 
+        CHARACTER_MAXIMUM_LENGTH, 
+        NUMERIC_PRECISION, 
+        NUMERIC_SCALE, 
+        DATETIME_PRECISION
+    FROM {database_name}.INFORMATION_SCHEMA.COLUMNS
+    {filters}
+    ORDER BY TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION;
+    """
+    return sql_statement, params
 
 
-def query_snowflake_schema(pkb, table_name, schema_name, database_name, logger):
+def query_snowflake_schema(pkb, table_name, schema_name, database_name, logger, pool=None):
     """
     Queries Snowflake for the schema of the given table using INFORMATION_SCHEMA.COLUMNS.
     
@@ -13,10 +100,15 @@ def query_snowflake_schema(pkb, table_name, schema_name, database_name, logger):
         schema_name (str): Name of the schema containing the table.
         database_name (str): Name of the database containing the schema.
         logger (logging.Logger): Logger for logging messages.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the connection from. If not given,
+            a dedicated connection is opened and closed for this query.
     
     Returns:
         list: List of dictionaries representing the actual schema.
     """
+    import snowflake.connector
+
+    database_name = _validate_identifier(database_name, "database")
     sql_statement = f"""
     SELECT 
         COLUMN_NAME, 
@@ -28,41 +120,28 @@ def query_snowflake_schema(pkb, table_name, schema_name, database_name, logger):
         DATETIME_PRECISION
     FROM {database_name}.INFORMATION_SCHEMA.COLUMNS
     WHERE 
-        table_name = '{table_name.upper()}'
-        AND table_schema = '{schema_name.upper()}'
-        AND table_catalog = '{database_name.upper()}';
+        table_name = %s
+        AND table_schema = %s
+        AND table_catalog = %s
+    ORDER BY ORDINAL_POSITION;
     """
+    params = (table_name.upper(), schema_name.upper(), database_name)
     
     logger.info(f"Executing Snowflake schema query for table '{database_name}.{schema_name}.{table_name}'.")
     
     try:
-        with create_snowflake_connection(pkb) as ctx:
-            """
-            The connection context (ctx) is managed by a with statement, 
-            ensuring that the connection is properly closed once the query is done, 
-            even if an error occurs.
-            """
-            with ctx.cursor() as cs:
-                cs.execute(sql_statement) # execute the SQL query
-                snowflake_schema = cs.fetchall() # fetch all the rows from the result
-                """
-                cs.fetchall(): After the query is executed, fetchall retrieves all the rows returned by the query. 
-                Each row contains the schema information for one column in the table. 
-                The result is stored in the snowflake_schema variable, which is a list of tuples.
-                """
+        snowflake_schema = run_snowflake_query(pkb, sql_statement, params, pool=pool)
+        """
+        run_snowflake_query executes the query with bound parameters and fetches all the rows returned by it,
+        either on a connection borrowed from the pool or on a dedicated connection that is properly closed
+        once the query is done, even if an error occurs.
+        Each row contains the schema information for one column in the table. 
+        The result is stored in the snowflake_schema variable, which is a list of tuples.
+        """
         
         # Convert the fetched data into a structured format similar to the expected JSON schema
-        actual_schema = []
-        for row in snowflake_schema:
-            actual_schema.append({
-                "COLUMN_NAME": row[0],# First field of the tuple. row[n] refers to accessing the elements of each row (tuple) returned from the SQL query. 
-                "IS_NULLABLE": row[1],
-                "DATA_TYPE": row[2],
-                "CHARACTER_MAXIMUM_LENGTH": row[3],
-                "NUMERIC_PRECISION": row[4],
-                "NUMERIC_SCALE": row[5],
-                "DATETIME_PRECISION": row[6]
-            })
+        # Each row (tuple) follows the SCHEMA_COLUMNS order, so row[0] is COLUMN_NAME, row[1] is IS_NULLABLE, etc.
+        actual_schema = [_row_to_column(row) for row in snowflake_schema]
         
         logger.info("Successfully retrieved the actual schema from Snowflake.")
         return actual_schema
@@ -71,6 +150,168 @@ def query_snowflake_schema(pkb, table_name, schema_name, database_name, logger):
         logger.error(f"Snowflake query failed: {e}")
         raise
 
+
+def query_snowflake_schemas_bulk(pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+    """
+    Queries Snowflake for the schemas of many tables at once using a single INFORMATION_SCHEMA.COLUMNS query.
+    
+    Depending on the arguments, the query covers a whole database (only database_name), a whole schema
+    (database_name and schema_name) or an explicit list of tables (database_name, schema_name and table_names).
+    All filter values are passed as bound parameters.
+    
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connection.
+        database_name (str): Name of the database to query.
+        logger (logging.Logger): Logger for logging messages.
+        schema_name (str, optional): Name of the schema to restrict the query to.
+        table_names (list, optional): Names of the tables to restrict the query to. Requires schema_name.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the connection from.
+    
+    Returns:
+        dict: Dictionary keyed by (TABLE_SCHEMA, TABLE_NAME) whose values are lists of dictionaries
+              representing the actual schema of each table (same shape as query_snowflake_schema).
+    """
+    import snowflake.connector
+
+    if table_names is not None and not table_names:
+        return {}
+
+    database_name = _validate_identifier(database_name, "database")
+    sql_statement, params = _bulk_columns_query(database_name, schema_name, table_names)
+
+    scope = database_name if schema_name is None else f"{database_name}.{schema_name}"
+    logger.info(f"Executing bulk Snowflake schema query for '{scope}'"
+                + (f" ({len(table_names)} tables)." if table_names is not None else "."))
+
+    try:
+        snowflake_schema = run_snowflake_query(pkb, sql_statement, params, pool=pool)
+
+        # Split the rows into one actual schema per table. Rows are ordered by table, so each
+        # table's columns keep their ORDINAL_POSITION order.
+        actual_schemas = {}
+        for row in snowflake_schema:
+            actual_schemas.setdefault((row[0], row[1]), []).append(_row_to_column(row[2:]))
+
+        logger.info(f"Successfully retrieved the actual schemas of {len(actual_schemas)} tables from Snowflake.")
+        return actual_schemas
+
+    except snowflake.connector.Error as e:
+        logger.error(f"Snowflake bulk query failed: {e}")
+        raise
+
+
+def _columnar_schemas(batches):
+    """
+    Splits column batches of the bulk query (TABLE_SCHEMA, TABLE_NAME, then SCHEMA_COLUMNS) into one
+    ColumnarSchema per table. Rows are ordered by table, so a table only continues across a batch boundary.
+    """
+    positions = {name: position for position, name in enumerate(SCHEMA_COLUMNS, start=2)}
+    attributes = [(attribute, position) for attribute, position in positions.items() if attribute != 'COLUMN_NAME']
+    actual_schemas = {}
+    for columns in batches:
+        # Repeated strings (types, nullability, common column names) share one object instead of one per row
+        for position in (positions['IS_NULLABLE'], positions['DATA_TYPE']):
+            columns[position] = [value if value is None else sys.intern(value) for value in columns[position]]
+        column_names = [sys.intern(name.upper()) for name in columns[positions['COLUMN_NAME']]]
+
+        schemas, tables = columns[0], columns[1]
+        if not tables:
+            continue
+        boundaries = [0] + [index for index in range(1, len(tables))
+                            if tables[index] != tables[index - 1] or schemas[index] != schemas[index - 1]]
+        boundaries.append(len(tables))
+        for start, end in zip(boundaries, boundaries[1:]):
+            key = (schemas[start], tables[start])
+            schema = actual_schemas.get(key)
+            if schema is None:
+                actual_schemas[key] = ColumnarSchema(column_names[start:end], {
+                    attribute: columns[position][start:end] for attribute, position in attributes
+                })
+            else:
+                schema.names.extend(column_names[start:end])
+                for attribute, position in attributes:
+                    schema.columns[attribute].extend(columns[position][start:end])
+    return actual_schemas
+
+
+def query_snowflake_schemas_columnar(pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+    """
+    Same query as query_snowflake_schemas_bulk, but streamed as Arrow batches (see fetch_snowflake_column_batches)
+    and kept column-major: each table's schema is a ColumnarSchema holding one list per attribute, and column
+    dictionaries are only built if something iterates over it (e.g. to report a mismatch). For whole-database
+    pulls this avoids creating one tuple and one dictionary per column.
+    
+    Parameters: see query_snowflake_schemas_bulk.
+    
+    Returns:
+        dict: Dictionary keyed by (TABLE_SCHEMA, TABLE_NAME) whose values are ColumnarSchema objects.
+    """
+    import snowflake.connector
+
+    if table_names is not None and not table_names:
+        return {}
+
+    database_name = _validate_identifier(database_name, "database")
+    sql_statement, params = _bulk_columns_query(database_name, schema_name, table_names)
+
+    scope = database_name if schema_name is None else f"{database_name}.{schema_name}"
+    logger.info(f"Executing columnar Snowflake schema query for '{scope}'"
+                + (f" ({len(table_names)} tables)." if table_names is not None else "."))
+
+    try:
+        actual_schemas = fetch_snowflake_column_batches(pkb, sql_statement, _columnar_schemas, params, pool=pool)
+    except snowflake.connector.Error as e:
+        logger.error(f"Snowflake columnar query failed: {e}")
+        raise
+
+    logger.info(f"Successfully retrieved the actual schemas of {len(actual_schemas)} tables from Snowflake.")
+    return actual_schemas
+
+
+def query_tables_last_altered(pkb, database_name, logger, schema_name=None, table_names=None, pool=None):
+    """
+    Queries INFORMATION_SCHEMA.TABLES for the LAST_ALTERED timestamp of many tables at once.
+    
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connection.
+        database_name (str): Name of the database to query.
+        logger (logging.Logger): Logger for logging messages.
+        schema_name (str, optional): Name of the schema to restrict the query to.
+        table_names (list, optional): Names of the tables to restrict the query to. Requires schema_name.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the connection from.
+    
+    Returns:
+        dict: Dictionary keyed by (TABLE_SCHEMA, TABLE_NAME) whose values are the LAST_ALTERED timestamps
+              as ISO 8601 strings.
+    """
+    import snowflake.connector
+
+    if table_names is not None and not table_names:
+        return {}
+
+    database_name = _validate_identifier(database_name, "database")
+    filters, params = _table_filters(database_name, schema_name, table_names)
+
+    sql_statement = f"""
+    SELECT 
+        TABLE_SCHEMA,
+        TABLE_NAME,
+        LAST_ALTERED
+    FROM {database_name}.INFORMATION_SCHEMA.TABLES
+    {filters};
+    """
+
+    try:
+        rows = run_snowflake_query(pkb, sql_statement, params, pool=pool)
+    except snowflake.connector.Error as e:
+        logger.error(f"Snowflake LAST_ALTERED query failed: {e}")
+        raise
+
+    return {
+        (row[0], row[1]): row[2].isoformat() if hasattr(row[2], 'isoformat') else row[2]
+        for row in rows
+    }
+
 # # Example usage of the query_snowflake_schema function
 # from fetch_expected_schema_from_s3 import setup_logging
 # def example_usage():
@@ -0,0 +1,318 @@
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+
+from utils.aws_clients import get_client
+
+from .compare_schemas import result_status
+
+# S3 multipart uploads need parts of at least 5 MiB (except the last one)
+MIN_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _make_compressor(compression):
+    """Returns a streaming compressor object (compress/flush), or None for uncompressed output."""
+    if compression is None:
+        return None
+    if compression == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 writes a gzip header and trailer
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires the 'zstandard' package.") from e
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    raise ValueError(f"Unsupported compression: {compression!r}. Expected None, 'gzip' or 'zstd'.")
+
+
+class _LocalPartWriter:
+    """Writes one result part to a local file."""
+
+    def __init__(self, path):
+        self.location = path
+        self._file = open(path, 'wb')
+
+    def write(self, data):
+        self._file.write(data)
+        return None # nothing is left to upload
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.location)
+
+
+class _S3MultipartPartWriter:
+    """
+    Streams one result part to S3 as a multipart upload.
+
+    Data is buffered until part_size bytes are available and then cut into one numbered part, so a large part
+    never has to be held in memory as a whole. write() only cuts the part and returns the call uploading it,
+    so that the caller can run it without holding its own lock; uploads of different parts may run
+    concurrently, and close() waits for them. Parts smaller than part_size end up as a single put_object.
+    """
+
+    def __init__(self, s3_client, bucket_name, key, part_size=8 * 1024 * 1024):
+        self.location = f"s3://{bucket_name}/{key}"
+        self._client = s3_client
+        self._bucket_name = bucket_name
+        self._key = key
+        self._part_size = max(part_size, MIN_MULTIPART_PART_SIZE)
+        self._buffer = bytearray()
+        self._next_part_number = 1
+        self._upload_id = None
+        self._create_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._uploading = 0
+        self._parts = []
+        self._error = None
+
+    def _cut_part(self, data):
+        """Numbers the next part and returns the call uploading it."""
+        part_number = self._next_part_number
+        self._next_part_number += 1
+        with self._condition:
+            self._uploading += 1
+        return lambda: self._upload_part(part_number, data)
+
+    def _get_upload_id(self):
+        with self._create_lock:
+            if self._upload_id is None:
+                response = self._client.create_multipart_upload(Bucket=self._bucket_name, Key=self._key)
+                self._upload_id = response['UploadId']
+            return self._upload_id
+
+    def _upload_part(self, part_number, data):
+        try:
+            response = self._client.upload_part(Bucket=self._bucket_name, Key=self._key,
+                                                UploadId=self._get_upload_id(), PartNumber=part_number, Body=data)
+            with self._condition:
+                self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        except Exception as e:
+            with self._condition:
+                self._error = self._error or e
+            raise
+        finally:
+            with self._condition:
+                self._uploading -= 1
+                self._condition.notify_all()
+
+    def _wait_for_uploads(self):
+        with self._condition:
+            while self._uploading:
+                self._condition.wait()
+
+    def write(self, data):
+        """Buffers data; returns the call uploading a part once part_size bytes are buffered, else None."""
+        self._buffer += data
+        if len(self._buffer) < self._part_size:
+            return None
+        data, self._buffer = bytes(self._buffer), bytearray()
+        return self._cut_part(data)
+
+    def close(self):
+        if self._next_part_number == 1:
+            self._client.put_object(Bucket=self._bucket_name, Key=self._key, Body=bytes(self._buffer))
+            return
+        if self._buffer:
+            self._cut_part(bytes(self._buffer))()
+        self._wait_for_uploads()
+        if self._error is not None:
+            self.abort()
+            raise self._error
+        self._client.complete_multipart_upload(
+            Bucket=self._bucket_name, Key=self._key, UploadId=self._upload_id,
+            MultipartUpload={'Parts': sorted(self._parts, key=lambda part: part['PartNumber'])})
+
+    def abort(self):
+        self._wait_for_uploads()
+        if self._upload_id is not None:
+            self._client.abort_multipart_upload(Bucket=self._bucket_name, Key=self._key, UploadId=self._upload_id)
+
+
+class NDJSONResultSink:
+    """
+    Streams comparison results into compressed NDJSON part files (one compact JSON record per line).
+
+    Results are appended as they arrive. The current part is closed and a new one started once it holds
+    max_records records or max_bytes uncompressed bytes. On close, a run-level summary object
+    (run_summary.json) listing the status counts, the failed tables and the parts is written next to them.
+    Output goes to S3 (streamed as multipart uploads) when bucket_name is given, otherwise to output_dir.
+
+    The sink is thread-safe and can be passed directly as the save_result callable of VerificationOrchestrator.
+    Records are compressed and appended under the sink lock, but S3 uploads (finished multipart parts and the
+    completion of a part file) run in the writing thread after the lock is released, so one slow upload does not
+    block the other writers.
+
+    Parameters:
+        run_id (str, optional): Identifier of the run, used in the object names. Defaults to the current timestamp.
+        output_dir (str, optional): Local directory for the parts (when bucket_name is not given).
+        bucket_name (str, optional): S3 bucket for the parts.
+        prefix (str, optional): Directory (local) or key prefix (S3) under which the run folder is created.
+        compression (str, optional): None, 'gzip' (default) or 'zstd' (requires the zstandard package).
+        max_records (int, optional): Maximum number of records per part.
+        max_bytes (int, optional): Maximum number of uncompressed bytes per part.
+        logger (logging.Logger, optional): Logger for logging messages.
+    """
+
+    def __init__(self, run_id=None, output_dir='verification-results', bucket_name=None,
+                 prefix='schema_comparison_results', compression='gzip', max_records=50000,
+                 max_bytes=64 * 1024 * 1024, logger=None):
+        _make_compressor(compression) # fail early on an unsupported compression
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.bucket_name = bucket_name
+        self.compression = compression
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.logger = logger
+        if bucket_name is None:
+            self._base = os.path.join(output_dir, prefix, f"run_{self.run_id}")
+            os.makedirs(self._base, exist_ok=True)
+        else:
+            self._base = f"{prefix.rstrip('/')}/run_{self.run_id}"
+            self._s3_client = get_client('s3')
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._uploads = 0 # uploads handed off by write/close and not finished yet
+        self._writer = None
+        self._compressor = None
+        self._part_records = 0
+        self._part_bytes = 0
+        self._parts = []
+        self._statuses = {}
+        self._failed_tables = []
+        self._started_at = datetime.now().isoformat()
+        self._closed = False
+
+    def _location(self, name):
+        if self.bucket_name is None:
+            return os.path.join(self._base, name)
+        return f"{self._base}/{name}"
+
+    def _open_writer(self, name):
+        if self.bucket_name is None:
+            return _LocalPartWriter(self._location(name))
+        return _S3MultipartPartWriter(self._s3_client, self.bucket_name, self._location(name))
+
+    def _start_part(self):
+        name = f"part-{len(self._parts):05d}.ndjson{_EXTENSIONS[self.compression]}"
+        self._writer = self._open_writer(name)
+        self._compressor = _make_compressor(self.compression)
+        self._part_records = 0
+        self._part_bytes = 0
+
+    def _finish_part(self):
+        """Detaches the current part; returns the calls that upload its tail and close it (run them unlocked)."""
+        writer, self._writer = self._writer, None
+        tasks = []
+        if self._compressor is not None:
+            tasks.append(writer.write(self._compressor.flush()))
+        tasks.append(writer.close)
+        self._parts.append({'location': writer.location, 'records': self._part_records, 'bytes': self._part_bytes})
+        return [task for task in tasks if task is not None]
+
+    def _run_uploads(self, tasks):
+        """Runs the uploads handed off under the lock, after it was released."""
+        error = None
+        for task in tasks:
+            try:
+                task()
+            except Exception as e:
+                error = error or e
+        with self._lock:
+            self._uploads -= len(tasks)
+            self._idle.notify_all()
+        if error is not None:
+            raise error
+
+    def write(self, result, entry=None):
+        """
+        Appends one comparison result to the current part.
+
+        Parameters:
+            result (dict): Comparison result (as returned by compare_schemas or compare_fingerprints).
+            entry (ManifestEntry, optional): Manifest entry of the table; its database and schema are recorded.
+        """
+        record = {'run_id': self.run_id}
+        if entry is not None:
+            record['database'] = entry.database
+            record['schema'] = entry.schema
+        record.update(result)
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+        tasks = []
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Result sink is closed.")
+            if self._writer is None:
+                self._start_part()
+            tasks.append(self._writer.write(self._compressor.compress(line) if self._compressor is not None else line))
+            self._part_records += 1
+            self._part_bytes += len(line)
+
+            status = result_status(result)
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+            if status != "PASS":
+                self._failed_tables.append(result.get('table'))
+
+            if self._part_records >= self.max_records or self._part_bytes >= self.max_bytes:
+                tasks.extend(self._finish_part())
+            tasks = [task for task in tasks if task is not None]
+            self._uploads += len(tasks)
+        self._run_uploads(tasks)
+
+    __call__ = write
+
+    def close(self):
+        """
+        Closes the current part and writes the run summary.
+
+        Returns:
+            dict: The run summary.
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            self._closed = True
+            tasks = self._finish_part() if self._writer is not None else []
+            self._uploads += len(tasks)
+        self._run_uploads(tasks)
+        with self._lock:
+            while self._uploads: # parts still being uploaded by other writers
+                self._idle.wait()
+            summary = {
+                'run_id': self.run_id,
+                'started_at': self._started_at,
+                'finished_at': datetime.now().isoformat(),
+                'tables': sum(self._statuses.values()),
+                'statuses': self._statuses,
+                'failed_tables': self._failed_tables,
+                'compression': self.compression,
+                'parts': self._parts
+            }
+        summary_writer = self._open_writer('run_summary.json')
+        summary_writer.write(json.dumps(summary, indent=4, default=str).encode('utf-8'))
+        summary_writer.close()
+        if self.logger is not None:
+            self.logger.info(f"Saved {summary['tables']} results in {len(self._parts)} parts to "
+                             f"{summary_writer.location}.")
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            with self._lock:
+                writer, self._writer = self._writer, None
+            if writer is not None:
+                # Do not leave incomplete multipart uploads (which are billed) behind
+                writer.abort()
+        self.close()
@@ -0,0 +1,402 @@
+"""
+Compiled bundle of expected schemas.
+
+Instead of one JSON file per table, all expected schemas of a schema or database are packed into one binary
+file that is fetched with a single GET and memory-mapped. Only a small JSON index is parsed when the bundle
+is opened; a table is decoded from its offset when it is requested, straight into a ColumnarSchema.
+
+Layout (little-endian):
+    header          magic, format version, string count, offset of the string offsets, offset and length
+                    of the index
+    string data     every distinct string (column names, data types, YES/NO) once, UTF-8, concatenated
+    string offsets  uint32 start of each string in the string data, plus the end of the last one
+    column blocks   one block per table: int32 values, column-major in SCHEMA_COLUMNS order; string
+                    attributes are stored as string numbers (from 1, 0 for None) and integer attributes
+                    as is (NULL_VALUE for None)
+    index           JSON: {"database", "created_at", "tables": {"DATABASE.SCHEMA.TABLE": [offset, column count]}};
+                    "database" is the only database of the bundle, or null when it spans several
+
+Bundles are built with snapshot_schema_bundle (current Snowflake schemas) or compile_schema_bundle_from_s3
+(existing per-table JSON files), also available through handler.py.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from datetime import datetime
+
+from .batch_compare import ColumnarSchema
+from .compare_schemas import SCHEMA_ATTRIBUTES
+from .fetch_expected_schema_from_s3 import DEFAULT_SCHEMA_CACHE_DIR, _is_not_modified
+from .query_snowflake_schema import SCHEMA_COLUMNS
+from utils import metrics
+
+BUNDLE_MAGIC = b'SVSCHEMA'
+BUNDLE_FORMAT_VERSION = 2
+
+# magic, version, string count, string offsets offset, index offset, index length
+_HEADER = struct.Struct('<8sIIQQQ')
+
+# Attributes stored as string numbers; the other ones are stored as integers
+_STRING_KEYS = frozenset({'COLUMN_NAME', 'IS_NULLABLE', 'DATA_TYPE'})
+
+# Stored in place of None in integer attributes (no valid attribute value is negative)
+NULL_VALUE = -2 ** 31
+_NULL_TO_NONE = {NULL_VALUE: None}.get # called as (value, value): None for NULL_VALUE, value otherwise
+
+# Bundles opened from S3 by this process: (bucket_name, key) -> (etag, SchemaBundle)
+_open_bundles = {}
+_open_bundles_lock = threading.Lock()
+
+
+def _to_int(value, table_key, column_name, key):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value < 2 ** 31:
+        raise ValueError(f"Cannot store {key}={value!r} of column {column_name} in table {table_key}: "
+                         "expected a non-negative integer.")
+    return value
+
+
+def compile_schema_bundle(schemas, database_name=None):
+    """
+    Packs many schemas into one bundle.
+
+    Parameters:
+        schemas (dict): Dictionary (database name, schema name, table name) -> schema (list of dictionaries or
+            ColumnarSchema). Keys may also be (schema name, table name) pairs of the database database_name.
+        database_name (str, optional): Database of the schemas keyed by (schema name, table name).
+
+    Returns:
+        bytes: The bundle.
+    """
+    strings = {}
+    blocks = []
+    tables = {}
+    position = 0
+    for key, schema in schemas.items():
+        if len(key) == 2:
+            if not database_name:
+                raise ValueError(f"Schema {'.'.join(key)} has no database: key it by (database, schema, table) "
+                                 "or give database_name.")
+            key = (database_name, *key)
+        table_key = '.'.join(key).upper()
+        columnar = ColumnarSchema.from_rows(schema)
+        values = array('i')
+        for attribute in SCHEMA_COLUMNS:
+            column_values = columnar.names if attribute == 'COLUMN_NAME' else columnar.columns[attribute]
+            for column_name, value in zip(columnar.names, column_values):
+                if attribute in _STRING_KEYS:
+                    values.append(0 if value is None else strings.setdefault(str(value), len(strings) + 1))
+                elif value is None:
+                    values.append(NULL_VALUE)
+                else:
+                    values.append(_to_int(value, table_key, column_name, attribute))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        tables[table_key] = [position, len(columnar)]
+        blocks.append(values.tobytes())
+        position += len(blocks[-1])
+
+    encoded = [string.encode('utf-8') for string in strings]
+    string_offsets = array('I', [0])
+    for string in encoded:
+        string_offsets.append(string_offsets[-1] + len(string))
+    if sys.byteorder != 'little':
+        string_offsets.byteswap()
+    string_data = b''.join(encoded)
+
+    offsets_offset = _HEADER.size + len(string_data)
+    blocks_offset = offsets_offset + len(string_offsets) * string_offsets.itemsize
+    for entry in tables.values():
+        entry[0] += blocks_offset
+    databases = {table_key.split('.', 1)[0] for table_key in tables}
+    index = json.dumps({
+        'database': databases.pop() if len(databases) == 1 else None,
+        'created_at': datetime.now().isoformat(),
+        'tables': tables
+    }, separators=(',', ':')).encode('utf-8')
+    index_offset = blocks_offset + position
+
+    header = _HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(encoded), offsets_offset, index_offset, len(index))
+    return b''.join([header, string_data, string_offsets.tobytes(), *blocks, index])
+
+
+def _split_s3_uri(uri):
+    bucket_name, _, key = uri[len('s3://'):].partition('/')
+    if not bucket_name or not key:
+        raise ValueError(f"Invalid S3 URI: {uri!r}. Expected s3://bucket/key.")
+    return bucket_name, key
+
+
+def write_schema_bundle(schemas, location, database_name=None):
+    """
+    Compiles the schemas (see compile_schema_bundle) and writes the bundle to a local path (atomically)
+    or to an s3://bucket/key URI. Returns the size of the bundle in bytes.
+    """
+    data = compile_schema_bundle(schemas, database_name)
+    if location.startswith('s3://'):
+        from utils.aws_clients import get_client
+
+        bucket_name, key = _split_s3_uri(location)
+        get_client('s3').put_object(Bucket=bucket_name, Key=key, Body=data, ContentType="application/octet-stream")
+        return len(data)
+    os.makedirs(os.path.dirname(os.path.abspath(location)), exist_ok=True)
+    tmp_path = f"{location}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, location)
+    return len(data)
+
+
+class SchemaBundle:
+    """
+    Read access to a compiled bundle of expected schemas (see the module docstring for the layout).
+
+    Opening a bundle only parses its header and index. get() decodes one table from its offset into a
+    ColumnarSchema; strings are decoded on first use, interned, and shared by every table that uses them.
+
+    Parameters:
+        buffer (bytes or mmap.mmap): The bundle contents. Use SchemaBundle.open(path) to memory-map a file.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, version, string_count, offsets_offset, index_offset, index_length = _HEADER.unpack_from(buffer, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError("Not a schema bundle.")
+        if version != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported schema bundle format version {version} (expected "
+                             f"{BUNDLE_FORMAT_VERSION}); rebuild the bundle.")
+        self._string_offsets = self._read_array('I', offsets_offset, string_count + 1)
+        self._strings = [None] * (string_count + 1) # by string number; 0 stands for None
+        index = json.loads(bytes(buffer[index_offset:index_offset + index_length]))
+        self.database = index['database'] # None when the bundle spans several databases
+        self.created_at = index['created_at']
+        self._tables = index['tables']
+
+    @classmethod
+    def open(cls, path):
+        """Memory-maps a bundle file."""
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _read_array(self, typecode, offset, count):
+        values = array(typecode)
+        values.frombytes(self._buffer[offset:offset + count * values.itemsize])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    def _decode_strings(self, numbers):
+        """Returns the strings of the given string numbers, decoding the ones not used so far."""
+        strings = self._strings
+        for number in set(numbers):
+            if number and strings[number] is None:
+                # The string data starts right after the header
+                start = _HEADER.size + self._string_offsets[number - 1]
+                end = _HEADER.size + self._string_offsets[number]
+                strings[number] = sys.intern(self._buffer[start:end].decode('utf-8'))
+        return list(map(strings.__getitem__, numbers))
+
+    def __len__(self):
+        return len(self._tables)
+
+    def _table_key(self, database_name, schema_name, table_name):
+        database_name = database_name or self.database
+        if not database_name:
+            raise ValueError("This schema bundle spans several databases: name the database of the table.")
+        return f"{database_name}.{schema_name}.{table_name}".upper()
+
+    def __contains__(self, table):
+        """Takes (database name, schema name, table name), or (schema name, table name) in a one-database bundle."""
+        return self._table_key(*(None,) * (3 - len(table)), *table) in self._tables
+
+    def tables(self):
+        """Returns the (database name, schema name, table name) of every table in the bundle."""
+        return [tuple(table_key.split('.', 2)) for table_key in self._tables]
+
+    def get(self, schema_name, table_name, database_name=None):
+        """
+        Returns the schema of a table as a ColumnarSchema, or None if the bundle does not contain it.
+        database_name defaults to the database of the bundle; it is required if the bundle spans several.
+        """
+        entry = self._tables.get(self._table_key(database_name, schema_name, table_name))
+        if entry is None:
+            return None
+        offset, column_count = entry
+        values = self._read_array('i', offset, column_count * len(SCHEMA_COLUMNS)).tolist()
+        columns = {}
+        for position, key in enumerate(SCHEMA_COLUMNS):
+            column_values = values[position * column_count:(position + 1) * column_count]
+            if key in _STRING_KEYS:
+                columns[key] = self._decode_strings(column_values)
+            elif NULL_VALUE in column_values:
+                columns[key] = list(map(_NULL_TO_NONE, column_values, column_values))
+            else:
+                columns[key] = column_values
+        names = columns.pop('COLUMN_NAME')
+        return ColumnarSchema(names, {attribute: columns[attribute] for attribute in SCHEMA_ATTRIBUTES})
+
+    def schemas(self, schema_name=None, database_name=None):
+        """
+        Returns {(database name, schema name, table name): ColumnarSchema} for every table (of one schema and
+        database, if given).
+        """
+        wanted_schema = schema_name.upper() if schema_name else None
+        wanted_database = database_name.upper() if database_name else None
+        return {
+            (database, schema, table): self.get(schema, table, database)
+            for database, schema, table in self.tables()
+            if (wanted_schema is None or schema == wanted_schema)
+            and (wanted_database is None or database == wanted_database)
+        }
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def fetch_schema_bundle_from_s3(bucket_name, key, logger, cache_dir=DEFAULT_SCHEMA_CACHE_DIR):
+    """
+    Fetches a schema bundle from S3 with one conditional GET and returns it as a SchemaBundle.
+
+    The bundle is kept on disk (memory-mapped from there) and, by this process, in memory, both keyed by
+    bucket/key and validated against the S3 ETag, so an unchanged bundle is neither downloaded nor reopened.
+
+    Parameters:
+        bucket_name (str): Name of the S3 bucket.
+        key (str): S3 key (path) to the bundle.
+        logger (logging.Logger): Logger for logging messages.
+        cache_dir (str, optional): Directory of the on-disk cache, or None to keep the bundle in memory only.
+
+    Returns:
+        SchemaBundle: The bundle.
+    """
+    from utils.aws_clients import get_client
+
+    s3_client = get_client('s3')
+    from botocore.exceptions import ClientError # loaded with the client
+
+    path = None
+    if cache_dir is not None:
+        digest = hashlib.sha256(f"{bucket_name}/{key}".encode('utf-8')).hexdigest()
+        path = os.path.join(cache_dir, f"{digest}.bundle")
+    with _open_bundles_lock:
+        etag, bundle = _open_bundles.get((bucket_name, key), (None, None))
+    if etag is None and path is not None and os.path.exists(path) and os.path.exists(f"{path}.etag"):
+        with open(f"{path}.etag", 'r') as f:
+            etag = f.read()
+
+    request = {'Bucket': bucket_name, 'Key': key}
+    if etag is not None:
+        request['IfNoneMatch'] = etag
+    logger.info(f"Fetching schema bundle from S3 bucket '{bucket_name}' with key '{key}'.")
+    try:
+        with metrics.span('s3_fetch'):
+            response = s3_client.get_object(**request)
+            content = response['Body'].read()
+    except ClientError as e:
+        if etag is None or not _is_not_modified(e):
+            logger.error(f"Failed to fetch schema bundle from S3: {e}")
+            raise
+        metrics.increment('s3_not_modified')
+        if bundle is None:
+            bundle = SchemaBundle.open(path)
+    else:
+        metrics.increment('s3_bytes_downloaded', len(content))
+        etag = response['ETag']
+        if path is None:
+            bundle = SchemaBundle(content)
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to temporary files first so that concurrent readers never see a partial bundle
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            with open(tmp_path, 'w') as f:
+                f.write(etag)
+            os.replace(tmp_path, f"{path}.etag")
+            bundle = SchemaBundle.open(path)
+
+    with _open_bundles_lock:
+        _open_bundles[(bucket_name, key)] = (etag, bundle)
+    logger.info(f"Schema bundle with {len(bundle)} tables ready (created {bundle.created_at}).")
+    return bundle
+
+
+def load_schema_bundle(location, logger, cache_dir=DEFAULT_SCHEMA_CACHE_DIR):
+    """Opens a schema bundle from a local path or an s3://bucket/key URI."""
+    if not location.startswith('s3://'):
+        return SchemaBundle.open(location)
+    bucket_name, key = _split_s3_uri(location)
+    return fetch_schema_bundle_from_s3(bucket_name, key, logger, cache_dir=cache_dir)
+
+
+def snapshot_schema_bundle(pkb, database_name, location, logger, schema_name=None, table_names=None, pool=None,
+                           metadata_backend=None):
+    """
+    Snapshots the current Snowflake schemas of a database (or schema) into a bundle, with one bulk query.
+
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connection.
+        database_name (str): Name of the database to snapshot.
+        location (str): Local path or s3://bucket/key URI to write the bundle to.
+        logger (logging.Logger): Logger for logging messages.
+        schema_name (str, optional): Name of the schema to restrict the snapshot to.
+        table_names (list, optional): Names of the tables to restrict the snapshot to. Requires schema_name.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the connection from.
+        metadata_backend (str, optional): 'information_schema' or 'show_columns' (see metadata_backends).
+            Defaults to INFORMATION_SCHEMA read as columnar Arrow batches.
+
+    Returns:
+        int: Number of tables in the bundle.
+    """
+    from .metadata_backends import InformationSchemaBackend, get_metadata_backend
+
+    metadata_backend = get_metadata_backend(metadata_backend or InformationSchemaBackend(columnar=True))
+    actual_schemas = metadata_backend.query_schemas_bulk(pkb, database_name, logger, schema_name=schema_name,
+                                                         table_names=table_names, pool=pool)
+    size = write_schema_bundle(actual_schemas, location, database_name)
+    logger.info(f"Schema bundle of {len(actual_schemas)} tables ({size} bytes) written to {location}.")
+    return len(actual_schemas)
+
+
+def compile_schema_bundle_from_s3(entries, location, logger, cache_dir=DEFAULT_SCHEMA_CACHE_DIR):
+    """
+    Converts the per-table expected schema JSON files of manifest entries into one bundle.
+
+    Parameters:
+        entries (list): ManifestEntry tuples (see orchestrator.load_manifest).
+        location (str): Local path or s3://bucket/key URI to write the bundle to.
+        logger (logging.Logger): Logger for logging messages.
+        cache_dir (str, optional): Directory of the expected schema cache (see fetch_expected_schemas_from_s3).
+
+    Returns:
+        int: Number of tables in the bundle.
+    """
+    from .fetch_expected_schema_from_s3 import fetch_expected_schemas_from_s3
+
+    keys_by_bucket = {}
+    for entry in entries:
+        keys_by_bucket.setdefault(entry.bucket, []).append(entry.expected_schema_key)
+    fetched = {
+        bucket_name: fetch_expected_schemas_from_s3(bucket_name, keys, logger, cache_dir=cache_dir)
+        for bucket_name, keys in keys_by_bucket.items()
+    }
+    schemas = {(entry.database, entry.schema, entry.table): fetched[entry.bucket][entry.expected_schema_key]
+               for entry in entries}
+    size = write_schema_bundle(schemas, location)
+    logger.info(f"Schema bundle of {len(schemas)} tables ({size} bytes) written to {location}.")
+    return len(schemas)
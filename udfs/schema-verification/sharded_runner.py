@@ -0,0 +1,294 @@
+"""
+Sharded verification runs with per-table checkpoints.
+
+The tables of a run are split into shards by a stable hash of DATABASE.SCHEMA.TABLE, so a table always lands
+in the same shard for a given shard count, on any host. Each shard runs the usual pipeline
+(VerificationOrchestrator) in its own process and appends every finished table to its own checkpoint file
+(one JSON line per table, flushed and fsynced). Restarting a run with the same run_id and checkpoint_dir
+skips the tables already checkpointed, by any shard and with any shard count; tables that ended in ERROR or
+TIMEOUT are verified again. Once every table has a checkpointed result, the checkpoints are merged into a
+single run report (see result_sink.NDJSONResultSink).
+
+Shards can also be spread over several hosts sharing the checkpoint directory: every host runs its own
+shards (run_sharded(..., shards=[...])) and one of them merges the run afterwards (merge_checkpoints).
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .compare_schemas import result_status
+from .fetch_expected_schema_from_s3 import flush_logging, pause_logging, resume_logging, setup_logging
+from .orchestrator import VerificationOrchestrator
+from .result_sink import NDJSONResultSink
+from .schema_bundle import load_schema_bundle
+from utils import metrics
+from utils.snowflake_connection import close_snowflake_pool, get_snowflake_pkb, get_snowflake_pool
+
+# Results with these statuses are not considered finished: a resumed run verifies their tables again
+RETRIED_STATUSES = frozenset({"ERROR", "TIMEOUT"})
+
+
+def table_key(entry):
+    return f"{entry.database}.{entry.schema}.{entry.table}".upper()
+
+
+def shard_of(entry, shard_count):
+    """Returns the shard (0 to shard_count - 1) of a manifest entry; stable across processes and hosts."""
+    digest = hashlib.sha1(table_key(entry).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def partition_entries(entries, shard_count):
+    """Splits manifest entries into shard_count lists (see shard_of), keeping their order within each shard."""
+    shards = [[] for _ in range(shard_count)]
+    for entry in entries:
+        shards[shard_of(entry, shard_count)].append(entry)
+    return shards
+
+
+class ShardCheckpoint:
+    """
+    Append-only checkpoint of one shard: one JSON line {"key": "DB.SCHEMA.TABLE", "result": {...}} per finished
+    table. Every line is flushed and fsynced before record returns, so a crash loses at most the line being
+    written (which is ignored when the checkpoint is read back).
+
+    The checkpoint is thread-safe and can be passed directly as the save_result callable of
+    VerificationOrchestrator.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a+b')
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() > 0:
+            self._file.seek(-1, os.SEEK_END)
+            if self._file.read(1) != b'\n':
+                self._file.write(b'\n') # a crash cut the last line; start the next one on a fresh line
+
+    def record(self, result, entry):
+        line = json.dumps({'key': table_key(entry), 'result': result}, separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line.encode('utf-8') + b'\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    __call__ = record
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _run_dir(checkpoint_dir, run_id):
+    return os.path.join(checkpoint_dir, f"run_{run_id}")
+
+
+def _finished(result):
+    return result is not None and result_status(result) not in RETRIED_STATUSES
+
+
+def read_checkpoints(checkpoint_dir, run_id):
+    """
+    Returns {table key: result} for every table checkpointed by any shard of a run. When a table was
+    checkpointed more than once (e.g. an ERROR that was retried), a finished result wins over a retried one.
+    """
+    results = {}
+    run_dir = _run_dir(checkpoint_dir, run_id)
+    if not os.path.isdir(run_dir):
+        return results
+    for name in sorted(os.listdir(run_dir)):
+        if not name.endswith('.ndjson'):
+            continue
+        with open(os.path.join(run_dir, name), 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # line cut by a crash
+                if not _finished(results.get(record['key'])):
+                    results[record['key']] = record['result']
+    return results
+
+
+def _run_shard(shard_index, shard_count, entries, checkpoint_path, options):
+    """Verifies the entries of one shard, checkpointing every table. Runs in a worker process."""
+    logger = setup_logging(options['log_level'])
+    metrics.get_tracer().reset() # spans of this shard only, in a worker process or not
+    pkb = get_snowflake_pkb("CONNECTOR")
+    pool = get_snowflake_pool(pkb, max_size=options['concurrency'])
+    schema_bundle = options['schema_bundle']
+    if schema_bundle is not None:
+        schema_bundle = load_schema_bundle(schema_bundle, logger)
+
+    logger.info(f"Shard {shard_index + 1}/{shard_count}: verifying {len(entries)} tables.")
+    with ShardCheckpoint(checkpoint_path) as checkpoint:
+        orchestrator = VerificationOrchestrator(
+            pkb,
+            logger,
+            checkpoint,
+            concurrency=options['concurrency'],
+            table_timeout=options['table_timeout'],
+            pool=pool,
+            metadata_backend=options['metadata_backend'],
+            schema_bundle=schema_bundle,
+            report_mode=options['report_mode'],
+            type_equivalence=options['type_equivalence'],
+            detect_extra_columns=options['detect_extra_columns']
+        )
+        try:
+            results = orchestrator.run(entries)
+        finally:
+            if options['worker_process']:
+                close_snowflake_pool()
+                flush_logging() # worker processes exit without running the atexit handlers
+
+    statuses = {}
+    for result in results:
+        statuses[result_status(result)] = statuses.get(result_status(result), 0) + 1
+    return {'shard': shard_index, 'tables': len(results), 'statuses': statuses}
+
+
+def merge_checkpoints(entries, checkpoint_dir, run_id, save_to_s3=False, output_dir='verification-results',
+                      results_bucket=None, compression='gzip', logger=None):
+    """
+    Merges the checkpoints of every shard of a run into a single run report (NDJSON parts and run_summary.json,
+    see result_sink.NDJSONResultSink).
+
+    Parameters:
+        entries (list): ManifestEntry tuples of the run.
+        checkpoint_dir (str): Directory holding the checkpoints of the run.
+        run_id (str): Identifier of the run.
+        Other parameters: see run_sharded.
+
+    Returns:
+        list: Comparison results, in manifest order.
+
+    Raises:
+        RuntimeError: If some tables have no checkpointed result yet.
+    """
+    logger = logger or setup_logging()
+    checkpointed = read_checkpoints(checkpoint_dir, run_id)
+    missing = [table_key(entry) for entry in entries if table_key(entry) not in checkpointed]
+    if missing:
+        raise RuntimeError(f"Run {run_id} cannot be merged: {len(missing)} tables have no result yet "
+                           f"(e.g. {missing[:5]}).")
+
+    bucket_name = (results_bucket or (entries[0].bucket if entries else None)) if save_to_s3 else None
+    results = []
+    with NDJSONResultSink(run_id=run_id, output_dir=output_dir, bucket_name=bucket_name, compression=compression,
+                          logger=logger) as sink:
+        for entry in entries:
+            result = checkpointed[table_key(entry)]
+            sink.write(result, entry)
+            results.append(result)
+    return results
+
+
+def run_sharded(entries, workers=4, checkpoint_dir='verification-checkpoints', run_id=None, shard_count=None,
+                shards=None, save_to_s3=False, output_dir='verification-results', results_bucket=None,
+                compression='gzip', concurrency=8, table_timeout=300, metadata_backend=None, schema_bundle=None,
+                report_mode='detail', type_equivalence=None, detect_extra_columns=False, logger=None):
+    """
+    Verifies the schemas of the given tables in shards run by a process pool, with checkpoint and resume.
+
+    Parameters:
+        entries (list): ManifestEntry tuples of the tables to verify.
+        workers (int, optional): Number of worker processes. With 1, the shards run in this process.
+        checkpoint_dir (str, optional): Directory for the checkpoints (shared by every host of a multi-host run).
+        run_id (str, optional): Identifier of the run. Pass the run_id of an interrupted run to resume it.
+            Defaults to the current timestamp.
+        shard_count (int, optional): Number of shards. Defaults to workers.
+        shards (list, optional): Indexes of the shards to run here, for runs spread over several hosts. When
+            given, the run is not merged (see merge_checkpoints); the statuses of these shards are returned.
+        save_to_s3, output_dir, results_bucket, compression: Where the merged run report is written (see
+            validate_schema.run_schema_comparison).
+        concurrency, table_timeout, metadata_backend, schema_bundle, report_mode, type_equivalence,
+        detect_extra_columns: Options of every shard (see
+            validate_schema.run_schema_comparison). schema_bundle is a path or an s3:// URI; with
+            report_mode='run', every shard logs the summary of its own tables.
+        logger (logging.Logger, optional): Logger for logging messages. Defaults to setup_logging().
+
+    Returns:
+        list or dict: Comparison results in manifest order, or {'run_id', 'shards'} when shards is given.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+    logger = logger or setup_logging()
+    run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    shard_count = shard_count or workers
+    entries = list(entries)
+
+    checkpointed = read_checkpoints(checkpoint_dir, run_id)
+    remaining = [entry for entry in entries if not _finished(checkpointed.get(table_key(entry)))]
+    logger.info(f"Run {run_id}: {len(entries)} tables, {len(entries) - len(remaining)} already checkpointed, "
+                f"{len(remaining)} to verify in {shard_count} shards.")
+
+    options = {
+        'concurrency': concurrency,
+        'table_timeout': table_timeout,
+        'metadata_backend': metadata_backend,
+        'schema_bundle': schema_bundle,
+        'report_mode': report_mode,
+        'type_equivalence': type_equivalence,
+        'detect_extra_columns': detect_extra_columns,
+        'log_level': logger.getEffectiveLevel(),
+        'worker_process': False
+    }
+    run_dir = _run_dir(checkpoint_dir, run_id)
+    wanted = range(shard_count) if shards is None else shards
+    jobs = [
+        (shard_index, shard_count, shard_entries,
+         os.path.join(run_dir, f"shard-{shard_index:05d}-of-{shard_count:05d}.ndjson"), options)
+        for shard_index, shard_entries in enumerate(partition_entries(remaining, shard_count))
+        if shard_index in wanted and shard_entries
+    ]
+
+    summaries = []
+    failed_shards = []
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            summaries.append(_run_shard(*job))
+    else:
+        # Forked workers inherit the modules loaded by this process (including the verification package, which is
+        # loaded under an alias) and the registered clients; the shared AWS clients and Snowflake pool are
+        # recreated in each worker (see utils.aws_clients and utils.snowflake_connection). No other thread of this
+        # process may hold a lock while it forks, so the shared pool is closed and the log listener paused until
+        # the workers are started (with fork, all of them on the first submit)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        worker_options = dict(options, worker_process=True)
+        close_snowflake_pool()
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context) as executor:
+            pause_logging()
+            try:
+                futures = {executor.submit(_run_shard, *job[:-1], worker_options): job[0] for job in jobs}
+            finally:
+                resume_logging()
+            for future, shard_index in futures.items():
+                try:
+                    summaries.append(future.result())
+                except Exception as e:
+                    logger.error(f"Shard {shard_index + 1}/{shard_count} of run {run_id} failed: {e}")
+                    failed_shards.append(shard_index)
+
+    for summary in summaries:
+        logger.info(f"Shard {summary['shard'] + 1}/{shard_count}: {summary['tables']} tables, "
+                    + ", ".join(f"{count} {status}" for status, count in sorted(summary['statuses'].items())))
+    if failed_shards:
+        raise RuntimeError(f"{len(failed_shards)} shards of run {run_id} failed; run again with "
+                           f"run_id={run_id!r} to resume from the checkpoints.")
+    if shards is not None:
+        return {'run_id': run_id, 'shards': summaries}
+    return merge_checkpoints(entries, checkpoint_dir, run_id, save_to_s3=save_to_s3, output_dir=output_dir,
+                             results_bucket=results_bucket, compression=compression, logger=logger)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from .batch_compare import ColumnarSchema
+from .query_snowflake_schema import SCHEMA_COLUMNS
+
+STATE_FORMAT_VERSION = 1
+
+
+def schema_fingerprint(schema):
+    """
+    Computes a structural fingerprint (SHA-256) of an expected or actual schema.
+
+    Only the compared keys are hashed, column names are upper-cased and columns are sorted by name, so the
+    fingerprint does not change with column order or with extra keys present in the expected schema JSON.
+    Integral floats are hashed as integers (13.0 and 13 give the same fingerprint).
+
+    Parameters:
+        schema (list): List of dictionaries representing a schema, or a ColumnarSchema.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    def normalize(value):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    if isinstance(schema, ColumnarSchema):
+        # Read the attribute lists directly instead of building one dictionary per column
+        records = zip(schema.names, *(schema.columns[key] for key in SCHEMA_COLUMNS[1:]))
+    else:
+        records = ([column['COLUMN_NAME']] + [column.get(key) for key in SCHEMA_COLUMNS[1:]] for column in schema)
+    rows = sorted([str(record[0]).upper()] + [normalize(value) for value in record[1:]] for record in records)
+    payload = json.dumps(rows, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def expected_fingerprint(expected_schema, type_equivalence=None, detect_extra_columns=False):
+    """
+    Computes the fingerprint of what a table is verified against: its expected schema and the comparison options.
+
+    A stored result is only valid for the options it was computed with, so changing the type-equivalence rules
+    or turning extra-column detection on changes the fingerprint and the table is compared again.
+
+    Parameters:
+        expected_schema (list): List of dictionaries representing the expected schema, or a ColumnarSchema.
+        type_equivalence (TypeEquivalence, optional): Rules the schemas are compared through.
+        detect_extra_columns (bool, optional): Whether unexpected columns fail the table.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    options = {
+        'type_equivalence': type_equivalence.fingerprint if type_equivalence is not None else None,
+        'detect_extra_columns': bool(detect_extra_columns)
+    }
+    payload = json.dumps([schema_fingerprint(expected_schema), options], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class VerificationStateStore:
+    """
+    Persistent per-table verification state, stored as a single JSON file.
+
+    For each table (keyed by 'DATABASE.SCHEMA.TABLE') it records the fingerprints of the expected and actual
+    schemas, the LAST_ALTERED timestamp seen when the table was last verified and the result of that verification,
+    so that unchanged tables can be skipped on the next run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tables = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+            if state.get('version') == STATE_FORMAT_VERSION:
+                self._tables = state.get('tables', {})
+
+    @staticmethod
+    def table_key(database_name, schema_name, table_name):
+        return f"{database_name}.{schema_name}.{table_name}".upper()
+
+    def get(self, table_key):
+        """Returns the stored state of a table, or None if it has never been verified."""
+        with self._lock:
+            return self._tables.get(table_key)
+
+    def update(self, table_key, result, expected_fingerprint, actual_fingerprint=None, last_altered=None):
+        """Records the outcome of a verification for a table."""
+        with self._lock:
+            self._tables[table_key] = {
+                'expected_fingerprint': expected_fingerprint,
+                'actual_fingerprint': actual_fingerprint,
+                'last_altered': last_altered,
+                'result': result,
+                'verified_at': datetime.now().isoformat()
+            }
+
+    def touch(self, table_key, last_altered):
+        """Refreshes the LAST_ALTERED timestamp of a table whose structure was found unchanged."""
+        with self._lock:
+            entry = self._tables.get(table_key)
+            if entry is not None:
+                entry['last_altered'] = last_altered
+
+    def remove(self, table_key):
+        with self._lock:
+            self._tables.pop(table_key, None)
+
+    def __len__(self):
+        return len(self._tables)
+
+    def save(self):
+        """Writes the state to disk atomically (temporary file + rename)."""
+        with self._lock:
+            payload = json.dumps({'version': STATE_FORMAT_VERSION, 'tables': self._tables}, default=str)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,176 @@
+from utils import metrics
+from utils.snowflake_connection import run_snowflake_query
+
+from .data_fingerprint import qualified_table_name, quote_identifier
+
+
+class TableDiff:
+    """
+    Finds the rows that differ between a source and a target table by bisecting key ranges.
+
+    Both tables are split into segments of an integer key range, and a checksum (row count + HASH_AGG) is
+    computed per segment inside the database with one GROUP BY query per table. Only the segments whose
+    checksums differ are split again, until a segment is small enough for its keys and row hashes to be
+    fetched and compared directly. A mostly identical pair of tables is therefore diffed with a handful of
+    aggregate queries instead of a full download.
+
+    Parameters:
+        run_query (callable): Called as run_query(sql_statement, params) and returning the fetched rows. The SQL
+            uses %s placeholders (Snowflake connector style). See snowflake_query_runner.
+        source (tuple): (database_name, schema_name, table_name) of the reference table.
+        target (tuple): (database_name, schema_name, table_name) of the verified table.
+        key_column (str): Integer column identifying rows in both tables (e.g. a surrogate key).
+        columns (list): Names of the columns whose values are compared.
+        logger (logging.Logger): Logger for logging messages.
+        segments (int, optional): Number of segments each differing range is split into.
+        bisection_threshold (int, optional): Segments with at most this many rows are compared row by row.
+        max_reported_keys (int, optional): Maximum number of keys reported per kind of difference.
+    """
+
+    def __init__(self, run_query, source, target, key_column, columns, logger, segments=16,
+                 bisection_threshold=1000, max_reported_keys=1000):
+        if segments < 2:
+            raise ValueError("segments must be at least 2.")
+        self.run_query = run_query
+        self.source = source
+        self.target = target
+        self.key = quote_identifier(key_column)
+        self.row_hash = f"HASH({', '.join(quote_identifier(column) for column in columns)})"
+        # The key is part of the checksum, otherwise values swapped between two keys of a segment cancel out
+        self.checksum = f"HASH_AGG({', '.join(quote_identifier(column) for column in [key_column, *columns])})"
+        self.logger = logger
+        self.segments = segments
+        self.bisection_threshold = bisection_threshold
+        self.max_reported_keys = max_reported_keys
+        self.queries = 0
+
+    def _query(self, sql_statement, params=()):
+        self.queries += 1
+        return self.run_query(sql_statement, list(params))
+
+    def _bounds(self, table):
+        rows = self._query(f"SELECT MIN({self.key}), MAX({self.key}), COUNT(*) FROM {qualified_table_name(*table)}")
+        return rows[0]
+
+    def _segment_checksums(self, table, low, high, width):
+        """Returns {segment: (row_count, checksum)} for the key range [low, high] split into self.segments."""
+        # The segment bounds are computed here with exact integers and matched with a CASE: Snowflake rounds
+        # a NUMBER division to scale 6, so FLOOR((key - low) * segments / width) moves keys just below a
+        # boundary into the next segment on wide ranges, out of the range _segment_range bisects
+        bounds = [self._segment_range(low, width, segment)[0] for segment in range(1, self.segments)]
+        cases = ' '.join(f"WHEN {self.key} < %s THEN {segment}" for segment in range(len(bounds)))
+        sql_statement = (
+            f"SELECT CASE {cases} ELSE {len(bounds)} END AS SEGMENT, COUNT(*), {self.checksum} "
+            f"FROM {qualified_table_name(*table)} WHERE {self.key} >= %s AND {self.key} <= %s GROUP BY 1"
+        )
+        rows = self._query(sql_statement, (*bounds, low, high))
+        return {int(segment): (count, checksum) for segment, count, checksum in rows}
+
+    def _row_hashes(self, table, low, high):
+        rows = self._query(
+            f"SELECT {self.key}, {self.row_hash} FROM {qualified_table_name(*table)} "
+            f"WHERE {self.key} >= %s AND {self.key} <= %s",
+            (low, high)
+        )
+        return dict(rows)
+
+    def _segment_range(self, low, width, segment):
+        """Inclusive key range of a segment: the keys with FLOOR((key - low) * segments / width) = segment."""
+        start = low + -(-segment * width // self.segments) # ceil(segment * width / segments)
+        end = low + -(-(segment + 1) * width // self.segments) - 1
+        return start, end
+
+    def _diff_rows(self, low, high, differences):
+        source_rows = self._row_hashes(self.source, low, high)
+        target_rows = self._row_hashes(self.target, low, high)
+        for key, row_hash in source_rows.items():
+            if key not in target_rows:
+                differences['missing_in_target'].append(key)
+            elif target_rows[key] != row_hash:
+                differences['changed_keys'].append(key)
+        differences['missing_in_source'].extend(key for key in target_rows if key not in source_rows)
+
+    def _diff_range(self, low, high, row_count, differences):
+        if row_count <= self.bisection_threshold or high - low + 1 <= self.segments:
+            self._diff_rows(low, high, differences)
+            return
+        width = high - low + 1
+        source_segments = self._segment_checksums(self.source, low, high, width)
+        target_segments = self._segment_checksums(self.target, low, high, width)
+        for segment in sorted(set(source_segments) | set(target_segments)):
+            source_checksum = source_segments.get(segment, (0, None))
+            target_checksum = target_segments.get(segment, (0, None))
+            if source_checksum != target_checksum:
+                segment_low, segment_high = self._segment_range(low, width, segment)
+                self._diff_range(segment_low, segment_high, max(source_checksum[0], target_checksum[0]), differences)
+
+    def run(self):
+        """
+        Diffs the two tables.
+
+        Returns:
+            dict: content_check_status (PASS/FAIL), table ('<source>_vs_<target>'), source, target, the keys
+                  missing in the target, missing in the source and present in both with different values
+                  (each truncated to max_reported_keys), their full counts and the number of queries issued.
+        """
+        source_name = '.'.join(self.source)
+        target_name = '.'.join(self.target)
+        self.logger.info(f"Diffing table '{source_name}' against '{target_name}'.")
+        self.queries = 0
+
+        source_min, source_max, source_count = self._bounds(self.source)
+        target_min, target_max, target_count = self._bounds(self.target)
+        differences = {'missing_in_target': [], 'missing_in_source': [], 'changed_keys': []}
+
+        key_bounds = [value for value in (source_min, source_max, target_min, target_max) if value is not None]
+        if key_bounds:
+            with metrics.span('table_diff', table=f"{self.source[2]}_vs_{self.target[2]}"):
+                self._diff_range(int(min(key_bounds)), int(max(key_bounds)),
+                                 max(source_count, target_count), differences)
+
+        result = {
+            'content_check_status': "FAIL" if any(differences.values()) else "PASS",
+            'table': f"{self.source[2]}_vs_{self.target[2]}",
+            'source': source_name,
+            'target': target_name,
+            'source_row_count': source_count,
+            'target_row_count': target_count,
+            'queries': self.queries
+        }
+        for kind, keys in differences.items():
+            keys.sort()
+            result[f"{kind}_count"] = len(keys)
+            result[kind] = keys[:self.max_reported_keys]
+
+        self.logger.info(f"Table diff {result['table']}: {result['content_check_status']} "
+                         f"({result['missing_in_target_count']} missing in target, "
+                         f"{result['missing_in_source_count']} missing in source, "
+                         f"{result['changed_keys_count']} changed) with {self.queries} queries.")
+        return result
+
+
+def snowflake_query_runner(pkb, pool=None):
+    """Returns a run_query(sql_statement, params) callable executing queries on Snowflake."""
+    def run_query(sql_statement, params):
+        return run_snowflake_query(pkb, sql_statement, params, pool=pool)
+    return run_query
+
+
+def diff_tables(pkb, source, target, key_column, columns, logger, pool=None, **options):
+    """
+    Diffs a source and a target Snowflake table by bisecting key-range checksums (see TableDiff).
+
+    Parameters:
+        pkb (bytes): Private key bytes for Snowflake connection.
+        source (tuple): (database_name, schema_name, table_name) of the reference table.
+        target (tuple): (database_name, schema_name, table_name) of the verified table.
+        key_column (str): Integer column identifying rows in both tables.
+        columns (list): Names of the columns whose values are compared.
+        logger (logging.Logger): Logger for logging messages.
+        pool (SnowflakeConnectionPool, optional): Pool to borrow the connections from.
+        **options: segments, bisection_threshold, max_reported_keys (see TableDiff).
+
+    Returns:
+        dict: Diff result (see TableDiff.run).
+    """
+    return TableDiff(snowflake_query_runner(pkb, pool), source, target, key_column, columns, logger, **options).run()
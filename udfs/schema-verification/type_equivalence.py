@@ -0,0 +1,196 @@
+"""
+Type-equivalence rules applied before schemas are compared.
+
+Raw comparisons report differences that are not drift: an expected schema written as VARCHAR(16777216) against
+the TEXT that INFORMATION_SCHEMA reports, a precision of 38.0 read from JSON against 38, a NUMBER whose default
+precision was left out of the contract, and so on. The rules below describe these equivalences declaratively:
+
+    type_aliases:       data type -> canonical data type (VARCHAR -> TEXT, INTEGER -> NUMBER, ...)
+    type_parameters:    canonical type -> attributes filled from the parameters of a type written as
+                        TYPE(p, s), e.g. NUMBER(38,0) or VARCHAR(100)
+    defaults:           canonical type -> value of an attribute that is None (e.g. the length of TEXT)
+    ignored_attributes: canonical type -> attributes that are not compared for it (e.g. the precision of FLOAT)
+    value_aliases:      attribute -> value -> canonical value (e.g. IS_NULLABLE Y -> YES)
+    numeric_attributes: attributes whose values are coerced to numbers (38.0 and "38" -> 38)
+
+Custom rules (a dictionary or a JSON file) replace the default rules section by section; the sections they leave
+out keep their defaults.
+
+The rules are compiled once into dictionaries, and every distinct column record (its attribute tuple, in
+SCHEMA_ATTRIBUTES order) is normalized once and memoized: a schema has few distinct column types, so normalizing
+a column costs one hashed lookup, without any branching per attribute.
+"""
+import hashlib
+import json
+import re
+from decimal import Decimal
+
+from .compare_schemas import SCHEMA_ATTRIBUTES
+
+DEFAULT_EQUIVALENCE_RULES = {
+    'type_aliases': {
+        'VARCHAR': 'TEXT', 'STRING': 'TEXT', 'CHAR': 'TEXT', 'CHARACTER': 'TEXT', 'NCHAR': 'TEXT',
+        'NVARCHAR': 'TEXT', 'NVARCHAR2': 'TEXT', 'CHAR VARYING': 'TEXT', 'NCHAR VARYING': 'TEXT',
+        'DECIMAL': 'NUMBER', 'DEC': 'NUMBER', 'NUMERIC': 'NUMBER', 'INT': 'NUMBER', 'INTEGER': 'NUMBER',
+        'BIGINT': 'NUMBER', 'SMALLINT': 'NUMBER', 'TINYINT': 'NUMBER', 'BYTEINT': 'NUMBER',
+        'DOUBLE': 'FLOAT', 'DOUBLE PRECISION': 'FLOAT', 'REAL': 'FLOAT', 'FLOAT4': 'FLOAT', 'FLOAT8': 'FLOAT',
+        'DATETIME': 'TIMESTAMP_NTZ', 'TIMESTAMP': 'TIMESTAMP_NTZ', 'TIMESTAMPNTZ': 'TIMESTAMP_NTZ',
+        'TIMESTAMP WITHOUT TIME ZONE': 'TIMESTAMP_NTZ', 'TIMESTAMPLTZ': 'TIMESTAMP_LTZ',
+        'TIMESTAMP WITH LOCAL TIME ZONE': 'TIMESTAMP_LTZ', 'TIMESTAMPTZ': 'TIMESTAMP_TZ',
+        'TIMESTAMP WITH TIME ZONE': 'TIMESTAMP_TZ', 'VARBINARY': 'BINARY',
+    },
+    'type_parameters': {
+        'TEXT': ['CHARACTER_MAXIMUM_LENGTH'],
+        'BINARY': ['CHARACTER_MAXIMUM_LENGTH'],
+        'NUMBER': ['NUMERIC_PRECISION', 'NUMERIC_SCALE'],
+        'TIME': ['DATETIME_PRECISION'],
+        'TIMESTAMP_NTZ': ['DATETIME_PRECISION'],
+        'TIMESTAMP_LTZ': ['DATETIME_PRECISION'],
+        'TIMESTAMP_TZ': ['DATETIME_PRECISION'],
+    },
+    'defaults': {
+        'TEXT': {'CHARACTER_MAXIMUM_LENGTH': 16777216},
+        'BINARY': {'CHARACTER_MAXIMUM_LENGTH': 8388608},
+        'NUMBER': {'NUMERIC_PRECISION': 38, 'NUMERIC_SCALE': 0},
+        'TIME': {'DATETIME_PRECISION': 9},
+        'TIMESTAMP_NTZ': {'DATETIME_PRECISION': 9},
+        'TIMESTAMP_LTZ': {'DATETIME_PRECISION': 9},
+        'TIMESTAMP_TZ': {'DATETIME_PRECISION': 9},
+    },
+    'ignored_attributes': {
+        'FLOAT': ['CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION'],
+        'DATE': ['CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION'],
+        'BOOLEAN': ['CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION'],
+        'VARIANT': ['CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION'],
+        'OBJECT': ['CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION'],
+        'ARRAY': ['CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION'],
+    },
+    'value_aliases': {
+        'IS_NULLABLE': {'Y': 'YES', 'N': 'NO', 'TRUE': 'YES', 'FALSE': 'NO', 'NULLABLE': 'YES',
+                        'NOT NULL': 'NO'},
+    },
+    'numeric_attributes': ['CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE', 'DATETIME_PRECISION'],
+}
+
+# Distinct column records memoized per TypeEquivalence before the memo is cleared
+MAX_MEMOIZED_RECORDS = 100000
+
+_TYPE_WITH_PARAMETERS = re.compile(r'^\s*([A-Z_][A-Z0-9_ ]*?)\s*\(\s*([^)]*)\)\s*$')
+
+
+def _to_number(value):
+    """Coerces 38.0, Decimal('38') and '38' to 38 (and '1.5' to 1.5); other values are returned unchanged."""
+    if isinstance(value, str):
+        try:
+            value = Decimal(value.strip())
+        except ArithmeticError:
+            return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, Decimal) and value.is_finite():
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+class TypeEquivalence:
+    """
+    Compiled type-equivalence rules (see the module docstring).
+
+    Parameters:
+        rules (dict, optional): Rules overriding DEFAULT_EQUIVALENCE_RULES section by section.
+    """
+
+    def __init__(self, rules=None):
+        rules = dict(DEFAULT_EQUIVALENCE_RULES, **(rules or {}))
+        unknown = set(rules) - set(DEFAULT_EQUIVALENCE_RULES)
+        if unknown:
+            raise ValueError(f"Unknown type-equivalence rule sections: {sorted(unknown)}.")
+        position = {attribute: index for index, attribute in enumerate(SCHEMA_ATTRIBUTES)}
+        # Identifies the compiled rules, e.g. in the fingerprints of incremental verification (see state_store)
+        self.fingerprint = hashlib.sha256(json.dumps(rules, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+        self._type_aliases = {alias.upper(): data_type.upper() for alias, data_type in rules['type_aliases'].items()}
+        self._type_parameters = {data_type.upper(): [position[attribute] for attribute in attributes]
+                                 for data_type, attributes in rules['type_parameters'].items()}
+        # Per canonical type: one (default, ignored) pair per attribute position
+        self._slots = {}
+        for data_type in set(rules['defaults']) | set(rules['ignored_attributes']):
+            defaults = rules['defaults'].get(data_type, {})
+            ignored = set(rules['ignored_attributes'].get(data_type, []))
+            self._slots[data_type.upper()] = tuple((defaults.get(attribute), attribute in ignored)
+                                                   for attribute in SCHEMA_ATTRIBUTES)
+        self._no_slots = tuple((None, False) for _ in SCHEMA_ATTRIBUTES)
+        self._value_aliases = tuple({str(value).upper(): alias for value, alias in
+                                     rules['value_aliases'].get(attribute, {}).items()}
+                                    for attribute in SCHEMA_ATTRIBUTES)
+        self._numeric = tuple(attribute in rules['numeric_attributes'] for attribute in SCHEMA_ATTRIBUTES)
+        self._memo = {}
+
+    def _canonical_type(self, data_type, values):
+        """Returns the canonical data type, filling the attributes given as type parameters (e.g. VARCHAR(100))."""
+        if not isinstance(data_type, str):
+            return data_type
+        data_type = data_type.strip().upper()
+        match = _TYPE_WITH_PARAMETERS.match(data_type)
+        parameters = []
+        if match:
+            data_type, parameters = match.group(1), match.group(2).split(',')
+        data_type = self._type_aliases.get(data_type, data_type)
+        for index, parameter in zip(self._type_parameters.get(data_type, []), parameters):
+            if values[index] is None:
+                values[index] = parameter
+        return data_type
+
+    def _normalize_record(self, record):
+        values = list(record)
+        values[0] = self._canonical_type(values[0], values)
+        slots = self._slots.get(values[0], self._no_slots)
+        for index in range(1, len(values)):
+            value = values[index]
+            if self._numeric[index]:
+                value = _to_number(value)
+            elif isinstance(value, str):
+                value = self._value_aliases[index].get(value.strip().upper(), value.strip().upper())
+            default, ignored = slots[index]
+            values[index] = None if ignored else default if value is None else value
+        return tuple(values)
+
+    def normalize(self, record):
+        """
+        Returns the normalized form of a column record: a tuple of attribute values in SCHEMA_ATTRIBUTES order.
+        Two columns are equivalent when their normalized records are equal.
+        """
+        normalized = self._memo.get(record)
+        if normalized is None:
+            normalized = self._normalize_record(record)
+            if len(self._memo) >= MAX_MEMOIZED_RECORDS:
+                self._memo.clear()
+            self._memo[record] = normalized
+        return normalized
+
+
+_default_equivalence = None
+
+
+def get_type_equivalence(rules=None):
+    """
+    Returns the TypeEquivalence for a type_equivalence option, or None for raw comparisons:
+        None or False: raw comparisons
+        True or 'default': DEFAULT_EQUIVALENCE_RULES (compiled once per process)
+        dict: custom rules
+        str: path to a JSON file with custom rules
+        TypeEquivalence: returned as it is
+    """
+    global _default_equivalence
+    if rules is None or rules is False:
+        return None
+    if isinstance(rules, TypeEquivalence):
+        return rules
+    if rules is True or rules == 'default':
+        if _default_equivalence is None:
+            _default_equivalence = TypeEquivalence()
+        return _default_equivalence
+    if isinstance(rules, str):
+        with open(rules, 'r') as f:
+            rules = json.load(f)
+    return TypeEquivalence(rules)
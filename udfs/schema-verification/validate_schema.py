@@ -3,12 +3,14 @@ import logging
 import os
 from datetime import datetime
 
-import boto3
-from .compare_schemas import compare_schemas
-from .fetch_expected_schema_from_s3 import (fetch_expected_schema_from_s3,
-                                           setup_logging)
-from .query_snowflake_schema import query_snowflake_schema
-from utils.snowflake_connection import get_snowflake_pkb
+from .fetch_expected_schema_from_s3 import setup_logging
+from .orchestrator import VerificationOrchestrator, load_manifest
+from .result_sink import NDJSONResultSink
+from .schema_bundle import load_schema_bundle
+from .state_store import VerificationStateStore
+from utils import metrics
+from utils.aws_clients import get_client
+from utils.snowflake_connection import get_snowflake_pkb, get_snowflake_pool
 
 
 def save_result_to_json(result, output_path):
@@ -20,69 +22,184 @@ def save_result_to_json(result, output_path):
 
 def save_result_to_s3(result, bucket_name, output_key):
     """Saves the schema comparison result to an S3 bucket."""
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     result_json = json.dumps(result, indent=4)
     s3.put_object(Body=result_json, Bucket=bucket_name, Key=output_key)
     logging.info(f"Schema comparison result saved to s3://{bucket_name}/{output_key}")
 
-#  # Step 4: Store the result in S3 as JSON
-# s3_client = boto3.client('s3')
-# s3_key = f"data-verification-results/{table_name_source}_vs_{table_name_target}_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
-# s3_client.put_object(
-#     Bucket=s3_output_bucket,
-#     Key=s3_key,
-#     Body=json.dumps(result, indent=4),
-#     ContentType="application/json"
-# )
 
-
-def handle_schema_comparison(save_to_s3=False):
-    """Main function to handle schema comparison and saving result."""
-
-    logger = setup_logging()
-
-    # Fetch Snowflake private key bytes (replace with your own method
-    pkb = get_snowflake_pkb("CONNECTOR")
-
-    # Define the S3 bucket and key where the expected schema is stored
-    bucket_name = 'athena-dwh-queries'
-    expected_schema_s3_key = 'snowflake-landing-schemas/CT_COUNTRY_schema.json'
-
-    # Define the Snowflake table, schema, and database to validate
-    table_name = 'CT_COUNTRY'
-    schema_name = 'LANDING_OMACL_SCHEMA'
-    database_name = 'DEV_OMACL_DB'
+def save_diff_result_to_s3(result, bucket_name, prefix='data-verification-results'):
+    """
+    Saves a source vs target comparison result (table_diff.diff_tables or
+    data_fingerprint.verify_table_content_against) to S3 as '<prefix>/<source>_vs_<target>_<timestamp>.json'.
+    """
+    output_key = f"{prefix}/{result['table']}_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    s3 = get_client('s3')
+    s3.put_object(Bucket=bucket_name, Key=output_key, Body=json.dumps(result, indent=4, default=str),
+                  ContentType="application/json")
+    logging.info(f"Table comparison result saved to s3://{bucket_name}/{output_key}")
+    return output_key
+
+
+def make_result_saver(save_to_s3=False, output_dir='verification-results', results_bucket=None,
+                      results_prefix='schema_comparison_results'):
+    """
+    Returns a save_result(result, entry) callable writing one timestamped JSON document per table,
+    either to a local directory or to S3.
+    """
+    run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if not save_to_s3:
+        os.makedirs(output_dir, exist_ok=True)
+
+    def save_result(result, entry):
+        output_file_name = f"schema_comparison_{entry.table}_{run_timestamp}.json"
+        if save_to_s3:
+            # Save result to S3 (defaults to the bucket holding the expected schema)
+            save_result_to_s3(result, results_bucket or entry.bucket, f"{results_prefix}/{output_file_name}")
+        else:
+            # Save result locally
+            save_result_to_json(result, os.path.join(output_dir, output_file_name))
+
+    return save_result
+
+
+def handle_schema_comparison(manifest_path, save_to_s3=False, output_dir='verification-results', results_bucket=None,
+                             concurrency=8, table_timeout=300, output_format='ndjson', compression='gzip',
+                             metrics_path=None, metadata_backend=None, schema_bundle=None, report_mode='detail',
+                             type_equivalence=None, detect_extra_columns=False, incremental_state=None):
+    """
+    Main function to handle schema comparison and saving results for every table listed in a manifest.
     
-    # Step 1: Fetch expected schema from S3
-    # expected_schema = fetch_expected_schema_from_s3(bucket_name, expected_schema_s3_key, logger)
-
-    with open('C:/Users/sortrufa/OneDrive - Boehringer Ingelheim/Documents/table_schemas/ct_country/expected_schema_CT_COUNTRY.json', 'r') as f:
-        expected_schema = json.load(f)
-
-    # Step 2: Query the actual schema from Snowflake
-    actual_schema = query_snowflake_schema(pkb, table_name, schema_name, database_name, logger)
+    Parameters:
+        manifest_path (str): Path to the JSON or CSV manifest (see orchestrator.load_manifest).
+        Other parameters: see run_schema_comparison.
     
-    # Step 3: Perform schema comparison
-    comparison_result = compare_schemas(table_name, expected_schema, actual_schema, logger)
+    Returns:
+        list: Comparison results, in manifest order.
+    """
+    return run_schema_comparison(
+        load_manifest(manifest_path),
+        save_to_s3=save_to_s3,
+        output_dir=output_dir,
+        results_bucket=results_bucket,
+        concurrency=concurrency,
+        table_timeout=table_timeout,
+        output_format=output_format,
+        compression=compression,
+        metrics_path=metrics_path,
+        metadata_backend=metadata_backend,
+        schema_bundle=schema_bundle,
+        report_mode=report_mode,
+        type_equivalence=type_equivalence,
+        detect_extra_columns=detect_extra_columns,
+        incremental_state=incremental_state
+    )
+
+
+def run_schema_comparison(entries, save_to_s3=False, output_dir='verification-results', results_bucket=None,
+                          concurrency=8, table_timeout=300, output_format='ndjson', compression='gzip',
+                          metrics_path=None, logger=None, run_id=None, metadata_backend=None, schema_bundle=None,
+                          report_mode='detail', type_equivalence=None, detect_extra_columns=False,
+                          incremental_state=None):
+    """
+    Compares the schemas of the given tables and saves the results.
     
-    # Step 4: Prepare output path
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file_name = f"schema_comparison_{table_name}_{timestamp}.json"
+    The Snowflake key bytes, the connection pool and the AWS clients are process-wide and cached, so they
+    are reused by later calls in the same process (e.g. warm Lambda invocations, see handler.py).
     
-    if save_to_s3:
-        # Save result to S3
-        output_s3_key = f"schema_comparison_results/{output_file_name}"
-        save_result_to_s3(comparison_result, bucket_name, output_s3_key)
-    else:
-        # Save result locally
-        # output_path = os.path.join(os.getcwd(), output_file_name)
-        output_path = os.path.join('C:/Users/sortrufa/OneDrive - Boehringer Ingelheim/Documents/projects/data-verification/verification-results/', output_file_name)
-        save_result_to_json(comparison_result, output_path)
+    Parameters:
+        entries (list): ManifestEntry tuples of the tables to verify.
+        save_to_s3 (bool, optional): Save the results to S3 instead of the local output_dir.
+        output_dir (str, optional): Local directory for the results when save_to_s3 is False.
+        results_bucket (str, optional): S3 bucket for the results. Defaults to the bucket of the first manifest entry
+            for the 'ndjson' output, and to the bucket of each table's expected schema for the 'json' output.
+        concurrency (int, optional): Number of concurrent workers per I/O stage.
+        table_timeout (float, optional): Maximum number of seconds spent on one table.
+        output_format (str, optional): 'ndjson' to stream all results into compressed NDJSON parts plus a run
+            summary (see result_sink.NDJSONResultSink), or 'json' for one pretty-printed JSON file per table.
+        compression (str, optional): Compression of the NDJSON parts: None, 'gzip' or 'zstd'.
+        metrics_path (str, optional): File to export the per-stage timings and counters to, as JSON
+            (.json) or in the Prometheus text format (any other extension, e.g. .prom).
+        logger (logging.Logger, optional): Logger for logging messages. Defaults to setup_logging().
+        run_id (str, optional): Identifier of the run for the NDJSON output. Defaults to the current timestamp.
+        metadata_backend (str, optional): 'information_schema' (default) or 'show_columns' to read the actual
+            schemas with SHOW COLUMNS, without a warehouse (see metadata_backends).
+        schema_bundle (str, optional): Local path or s3:// URI of a compiled bundle of expected schemas (see
+            schema_bundle). Read with one GET instead of one GET per table; tables missing from it are fetched
+            from their expected_schema_key.
+        report_mode (str, optional): How mismatches are logged: 'detail' (one line per finding), 'table' (one
+            structured summary per failed table) or 'run' (one summary for the run). See compare_schemas.REPORT_MODES.
+        type_equivalence (bool, str or dict, optional): Type-equivalence rules applied before comparing: True for
+            the default rules (e.g. VARCHAR(16777216) = TEXT, 38.0 = 38), or custom rules as a dictionary or the
+            path to a JSON file (see type_equivalence). Defaults to raw comparisons.
+        detect_extra_columns (bool, optional): Also report the columns that were not expected, failing their tables.
+        incremental_state (str, optional): Path of the state file of incremental verification (see
+            state_store.VerificationStateStore). Tables whose LAST_ALTERED, expected schema and comparison options
+            did not change since the run that stored their result are not queried nor compared again; their
+            previous result is reported. Defaults to verifying every table.
+    
+    Returns:
+        list: Comparison results, in manifest order.
+    """
+    logger = logger or setup_logging()
 
-    return comparison_result
+    # The tracer is process-wide; every run starts with an empty one (and metrics_path exports only this run)
+    metrics.get_tracer().reset()
 
+    # Fetch Snowflake private key bytes and share a connection pool between the workers
+    pkb = get_snowflake_pkb("CONNECTOR")
+    pool = get_snowflake_pool(pkb, max_size=concurrency)
+
+    if output_format == 'json':
+        save_result = make_result_saver(save_to_s3, output_dir, results_bucket)
+    elif output_format == 'ndjson':
+        bucket_name = (results_bucket or (entries[0].bucket if entries else None)) if save_to_s3 else None
+        save_result = NDJSONResultSink(run_id=run_id, output_dir=output_dir, bucket_name=bucket_name,
+                                       compression=compression, logger=logger)
+    else:
+        raise ValueError(f"Unsupported output_format: {output_format!r}. Expected 'ndjson' or 'json'.")
+
+    if schema_bundle is not None:
+        schema_bundle = load_schema_bundle(schema_bundle, logger)
+
+    state_store = VerificationStateStore(incremental_state) if incremental_state is not None else None
+
+    orchestrator = VerificationOrchestrator(
+        pkb,
+        logger,
+        save_result,
+        concurrency=concurrency,
+        table_timeout=table_timeout,
+        pool=pool,
+        metadata_backend=metadata_backend,
+        schema_bundle=schema_bundle,
+        report_mode=report_mode,
+        type_equivalence=type_equivalence,
+        detect_extra_columns=detect_extra_columns,
+        state_store=state_store
+    )
+    try:
+        return orchestrator.run(entries)
+    finally:
+        if isinstance(save_result, NDJSONResultSink):
+            save_result.close()
+        if metrics_path is not None:
+            tracer = metrics.get_tracer()
+            if metrics_path.lower().endswith('.json'):
+                tracer.export_json(metrics_path)
+            else:
+                tracer.export_prometheus(metrics_path)
+            logger.info(f"Pipeline metrics saved to {metrics_path}")
 
-# Example usage:
-# Run schema comparison and save result locally (or to S3 if needed)
-handle_schema_comparison(save_to_s3=False)
 
+# Example usage:
+# Run schema comparison for the tables of a manifest and save the results locally (or to S3 if needed)
+# manifest.json:
+# {
+#     "bucket": "athena-dwh-queries",
+#     "tables": [
+#         {"database": "DEV_OMACL_DB", "schema": "LANDING_OMACL_SCHEMA", "table": "CT_COUNTRY",
+#          "expected_schema_key": "snowflake-landing-schemas/CT_COUNTRY_schema.json"}
+#     ]
+# }
+# handle_schema_comparison('manifest.json', save_to_s3=False)
@@ -0,0 +1,65 @@
+import os
+import threading
+
+# boto3 sessions are not thread-safe but the clients created from them are, so a single client
+# per (service, region) is created under a lock and shared by every caller in the process.
+# boto3 itself is only imported when the first client is created (it takes a large share of a cold start).
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Keys of the clients registered with register_client (stand-ins), which survive a fork
+_registered = set()
+
+
+def get_client(service_name, region_name=None):
+    """
+    Return a shared boto3 client for the given service and region, creating it on first use.
+
+    :param service_name: str, AWS service name (e.g. 'secretsmanager', 's3')
+    :param region_name: str, AWS region, or None for the default region
+    :return: boto3 client
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+
+                session = boto3.session.Session()
+                client = session.client(service_name=service_name, region_name=region_name)
+                _clients[key] = client
+    return client
+
+
+def register_client(service_name, client, region_name=None):
+    """
+    Register a client (or a stand-in with the same interface) to be returned by get_client.
+
+    :param service_name: str, AWS service name
+    :param client: object to return for this service and region
+    :param region_name: str, AWS region, or None for the default region
+    """
+    with _clients_lock:
+        _clients[(service_name, region_name)] = client
+        _registered.add((service_name, region_name))
+
+
+def reset_clients():
+    """Forget every shared client so the next get_client call creates a new one."""
+    with _clients_lock:
+        _clients.clear()
+        _registered.clear()
+
+
+def _forget_clients_after_fork():
+    # boto3 clients are not fork-safe (their connection pools would share sockets with the parent), so a forked
+    # child creates its own; registered stand-ins are kept
+    global _clients_lock
+    _clients_lock = threading.Lock()
+    for key in [key for key in _clients if key not in _registered]:
+        del _clients[key]
+
+
+os.register_at_fork(after_in_child=_forget_clients_after_fork)
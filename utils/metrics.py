@@ -0,0 +1,186 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Table currently being verified in this thread/task; spans and counters are tagged with it automatically
+current_table = contextvars.ContextVar('current_table', default=None)
+
+# Stage names used across the pipeline
+STAGES = (
+    'secret_retrieval', 'key_decoding', 'snowflake_connect', 'query_execution', 'row_fetch',
+    's3_fetch', 'comparison', 'result_save'
+)
+
+
+class Tracer:
+    """
+    Records timing spans and counters for the verification pipeline.
+
+    Spans are tagged with a stage and, when known, the table being verified (taken from the current_table
+    context variable unless given explicitly). The collected data can be exported as JSON or in the
+    Prometheus text exposition format, and summarized per table for the comparison results.
+
+    The tracer lives as long as the process (warm Lambda containers, the daemon), so only the latest max_spans
+    spans are kept, and the spans of the max_tables most recently traced tables (max_spans_per_table each) for
+    table_timings. Older spans are dropped (counted in dropped_spans); the stage totals and the counters keep
+    aggregating every span. Runs and daemon ticks also start with reset().
+    """
+
+    def __init__(self, max_spans=100000, max_tables=10000, max_spans_per_table=1000):
+        self._lock = threading.Lock()
+        self.max_spans = max_spans
+        self.max_tables = max_tables
+        self.max_spans_per_table = max_spans_per_table
+        self.spans = deque(maxlen=max_spans) # dictionaries with stage, table, start (epoch seconds) and duration_ms
+        self.dropped_spans = 0
+        self.counters = {} # (name, table) -> value
+        self._stage_totals = {} # stage -> [count, total seconds]
+        self._spans_by_table = OrderedDict() # table -> latest spans of that table, least recently traced first
+
+    @contextmanager
+    def span(self, stage, table=None, **attributes):
+        """Times the with block and records it as a span of the given stage."""
+        table = table if table is not None else current_table.get()
+        start_wall = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            span = {'stage': stage, 'table': table, 'start': start_wall, 'duration_ms': round(duration * 1000, 3)}
+            if attributes:
+                span.update(attributes)
+            if error is not None:
+                span['error'] = error
+            with self._lock:
+                if len(self.spans) == self.max_spans:
+                    self.dropped_spans += 1
+                self.spans.append(span)
+                if table is not None:
+                    self._record_table_span(table, span)
+                totals = self._stage_totals.setdefault(stage, [0, 0.0])
+                totals[0] += 1
+                totals[1] += duration
+
+    def _record_table_span(self, table, span):
+        table_spans = self._spans_by_table.get(table)
+        if table_spans is None:
+            if len(self._spans_by_table) >= self.max_tables:
+                self._spans_by_table.popitem(last=False)
+            table_spans = self._spans_by_table[table] = deque(maxlen=self.max_spans_per_table)
+        else:
+            self._spans_by_table.move_to_end(table)
+        table_spans.append(span)
+
+    def increment(self, name, value=1, table=None):
+        """Adds value to a counter (e.g. rows fetched, bytes downloaded)."""
+        table = table if table is not None else current_table.get()
+        with self._lock:
+            self.counters[(name, table)] = self.counters.get((name, table), 0) + value
+
+    def table_timings(self, table, since=None):
+        """
+        Returns the total time spent per stage for one table, in milliseconds, e.g. to be added as the
+        'timing' block of its comparison result. If since (epoch seconds) is given, older spans are ignored.
+        """
+        timings = {}
+        with self._lock:
+            for span in self._spans_by_table.get(table, ()):
+                if since is None or span['start'] >= since:
+                    timings[span['stage']] = round(timings.get(span['stage'], 0.0) + span['duration_ms'], 3)
+        return timings
+
+    def summary(self):
+        """Returns the number of spans and the total/average time per stage."""
+        with self._lock:
+            return {
+                stage: {'count': count, 'total_ms': round(total * 1000, 3), 'avg_ms': round(total * 1000 / count, 3)}
+                for stage, (count, total) in self._stage_totals.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self.spans = deque(maxlen=self.max_spans)
+            self.dropped_spans = 0
+            self.counters = {}
+            self._stage_totals = {}
+            self._spans_by_table = OrderedDict()
+
+    def export_json(self, path):
+        """Writes the stage summary, the counters and the retained spans to a JSON file."""
+        with self._lock:
+            payload = {
+                'spans': list(self.spans),
+                'dropped_spans': self.dropped_spans,
+                'counters': [{'name': name, 'table': table, 'value': value}
+                             for (name, table), value in self.counters.items()]
+            }
+        payload['summary'] = self.summary()
+        with open(path, 'w') as f:
+            json.dump(payload, f, indent=4, default=str)
+
+    def export_prometheus(self, path, prefix='schema_verification'):
+        """
+        Writes the stage totals and the counters in the Prometheus text exposition format (e.g. for the
+        node_exporter textfile collector). Counters are aggregated over tables to keep cardinality low.
+        """
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+        ]
+        summary = self.summary()
+        for stage, stats in sorted(summary.items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {stats["total_ms"] / 1000:.6f}')
+        lines.append(f"# HELP {prefix}_stage_calls_total Number of spans per pipeline stage.")
+        lines.append(f"# TYPE {prefix}_stage_calls_total counter")
+        for stage, stats in sorted(summary.items()):
+            lines.append(f'{prefix}_stage_calls_total{{stage="{stage}"}} {stats["count"]}')
+
+        totals = {}
+        with self._lock:
+            for (name, _), value in self.counters.items():
+                totals[name] = totals.get(name, 0) + value
+        for name, value in sorted(totals.items()):
+            metric = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+# Process-wide tracer used by the instrumented functions
+_tracer = Tracer()
+
+
+def get_tracer():
+    """Returns the process-wide Tracer."""
+    return _tracer
+
+
+def span(stage, table=None, **attributes):
+    """Shortcut for get_tracer().span(...)."""
+    return _tracer.span(stage, table, **attributes)
+
+
+def increment(name, value=1, table=None):
+    """Shortcut for get_tracer().increment(...)."""
+    _tracer.increment(name, value, table)
+
+
+@contextmanager
+def table_context(table):
+    """Tags every span and counter recorded inside the with block with the given table."""
+    token = current_table.set(table)
+    try:
+        yield
+    finally:
+        current_table.reset(token)
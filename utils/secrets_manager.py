@@ -1,44 +1,153 @@
-import boto3
-from botocore.exceptions import ClientError
+import threading
 
-def get_secrets(secret_names: list, region: str) -> str:
+from . import metrics
+from .aws_clients import get_client
+from .ttl_cache import TTLCache
+
+# Secrets are kept in memory for this many seconds before being fetched again
+SECRETS_CACHE_TTL = 900
+
+# BatchGetSecretValue accepts at most 20 secret ids per request
+_BATCH_SIZE = 20
+
+_secrets_cache = TTLCache(SECRETS_CACHE_TTL)
+
+# Serializes cache misses, so that concurrent callers missing the same secrets share one request
+_fetch_lock = threading.Lock()
+
+
+def _get_each(client, secret_names: list) -> dict:
+    return {
+        secret_name: client.get_secret_value(SecretId=secret_name)['SecretString']
+        for secret_name in secret_names
+    }
+
+
+def _fetch_secrets(client, secret_names: list) -> dict:
+    """
+    Fetch the given secrets from AWS Secrets Manager with as few requests as possible.
+
+    Uses BatchGetSecretValue (up to 20 secrets per request) and falls back to one GetSecretValue
+    request per secret on clients that do not support it, or when the role is not allowed to call
+    it (secretsmanager:BatchGetSecretValue is a separate permission). Secrets the batch did not
+    return (listed in its Errors, or not recognized) are requested with GetSecretValue as well, which
+    returns them or raises the error of that secret.
+    """
+    if not hasattr(client, 'batch_get_secret_value'):
+        return _get_each(client, secret_names)
+
+    from botocore.exceptions import ClientError # loaded with the client
+
+    try:
+        secrets = _batch_get(client, secret_names)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('AccessDeniedException', 'AccessDenied'):
+            raise
+        return _get_each(client, secret_names)
+    missing = [secret_name for secret_name in secret_names if secret_name not in secrets]
+    if missing:
+        secrets.update(_get_each(client, missing))
+    return secrets
+
+
+def _matches(secret_id, value):
+    """
+    Returns True if a SecretValues entry is the secret requested as secret_id: by name, by ARN, or by
+    partial ARN (the ARN without the '-' and six random characters Secrets Manager appends to it).
+    """
+    arn = value.get('ARN') or ''
+    return secret_id in (value.get('Name'), arn) or (len(arn) > 7 and arn[-7] == '-' and arn[:-7] == secret_id)
+
+
+def _batch_get(client, secret_names: list) -> dict:
+    """Returns the secrets BatchGetSecretValue returned, keyed by the requested ids; failed ones are left out."""
+    secrets = {}
+    for start in range(0, len(secret_names), _BATCH_SIZE):
+        batch = secret_names[start:start + _BATCH_SIZE]
+        request = {'SecretIdList': batch}
+        while True:
+            response = client.batch_get_secret_value(**request)
+            for value in response.get('SecretValues', []):
+                # The response identifies secrets by Name and ARN; map them back to the requested ids
+                for secret_id in batch:
+                    if _matches(secret_id, value):
+                        secrets[secret_id] = value['SecretString']
+            if not response.get('NextToken'):
+                break
+            request['NextToken'] = response['NextToken']
+    return secrets
+
+
+def _collect_cached(secret_names, region, use_cache, secrets):
+    """Copies the cached secrets into secrets and returns the names of the others."""
+    missing = []
+    for secret_name in secret_names:
+        secret = _secrets_cache.get((region, secret_name)) if use_cache else None
+        if secret is None:
+            missing.append(secret_name)
+        else:
+            secrets[secret_name] = secret
+    return missing
+
+
+def _fetch_missing(missing, region, use_cache, secrets):
+    """Fetches the given secrets in one batched request, copies them into secrets and caches them."""
+    # Shared Secrets Manager client (created once per region)
+    client = get_client('secretsmanager', region)
+
+    # For a list of exceptions thrown, see
+    # https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_BatchGetSecretValue.html
+    # Decrypts secrets using the associated KMS keys.
+    with metrics.span('secret_retrieval', secrets=len(missing)):
+        fetched = _fetch_secrets(client, missing)
+    for secret_name in missing:
+        secrets[secret_name] = fetched[secret_name]
+        if use_cache:
+            _secrets_cache.set((region, secret_name), fetched[secret_name])
+
+
+def get_secrets(secret_names: list, region: str, use_cache: bool = True) -> dict:
     """
     Retrieve secrets from AWS Secrets Manager.
-    
+
     This function retrieves the specified secrets from AWS Secrets Manager and returns them in a dictionary.
     The secrets are stored with their respective secret names as keys.
-    
+    Secrets are cached in memory for SECRETS_CACHE_TTL seconds; on a cache miss all the missing secrets
+    are fetched together in a single batched request.
+
     Args:
-        None
+        secret_names (list): Names (or ARNs) of the secrets to retrieve.
+        region (str): AWS region of the secrets.
+        use_cache (bool): Whether to serve secrets from (and store them in) the in-process cache.
 
     Returns:
         dict: A dictionary containing the retrieved secrets with their secret names as keys.
-        
+
     Raises:
         ClientError: If there is an error while retrieving the secrets from AWS Secrets Manager.
     """
-    
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region
-    )
-
     secrets = {}
-    for secret_name in secret_names:
-        try:
-            get_secret_value_response = client.get_secret_value(
-                SecretId=secret_name
-            )
-        except ClientError as e:
-            # For a list of exceptions thrown, see
-            # https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_GetSecretValue.html
-            raise e
-
-        # Decrypts secret using the associated KMS key.
-        secrets[secret_name] = get_secret_value_response['SecretString']
+    missing = _collect_cached(secret_names, region, use_cache, secrets)
+    if not missing:
+        return secrets
 
+    with _fetch_lock:
+        # Another caller may have fetched them while this one was waiting
+        missing = _collect_cached(missing, region, use_cache, secrets)
+        if missing:
+            _fetch_missing(missing, region, use_cache, secrets)
     return secrets
 
 
+def invalidate_secrets(secret_names: list = None, region: str = None) -> None:
+    """
+    Remove secrets from the in-process cache so that they are fetched again on the next call.
+
+    Args:
+        secret_names (list): Names of the secrets to invalidate, or None to invalidate every cached secret.
+        region (str): AWS region of the secrets (required when secret_names is given).
+    """
+    if secret_names is None:
+        _secrets_cache.invalidate()
+    else:
+        _secrets_cache.invalidate([(region, secret_name) for secret_name in secret_names])
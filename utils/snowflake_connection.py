@@ -1,29 +1,67 @@
-import snowflake.connector
+import importlib.util
+import logging
+import os
 import re
-from .secrets_manager import get_secrets
+import threading
+from . import metrics
+from .secrets_manager import get_secrets, invalidate_secrets
 from .config_variables import snowflake_config
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
+from .snowflake_pool import SnowflakeConnectionPool
+from .ttl_cache import TTLCache
 
-def get_snowflake_pkb(option):
+logger = logging.getLogger('SchemaComparator')
+
+# snowflake.connector and cryptography are imported by the functions that need them, so that importing
+# this module (e.g. during a Lambda cold start) does not pay for them before a connection is made.
+
+SNOWFLAKE_SECRET_NAMES = ["snowflake/emea/privateKey", "snowflake/emea/passphrase"]  # See in AWS Secrets Manager
+SNOWFLAKE_SECRETS_REGION = "eu-west-1"
+
+# Decoded private key bytes per option. Decrypting the PEM key runs its KDF, which is slow,
+# so the derived DER/PEM bytes are kept for as long as the secrets themselves are cached.
+PKB_CACHE_TTL = 900
+_pkb_cache = TTLCache(PKB_CACHE_TTL)
+
+
+def get_snowflake_pkb(option, use_cache=True):
     """
     Generate Snowflake private key bytes based on the given option (CONNECTOR or SPARK).
+    The result is cached in memory for PKB_CACHE_TTL seconds (see invalidate_snowflake_pkb).
     :param option: str, either "CONNECTOR" or "SPARK"
+    :param use_cache: bool, whether to reuse previously decoded key bytes
     :return: str, private key bytes
     """
-    secret_names = ["snowflake/emea/privateKey", "snowflake/emea/passphrase"]  # See in AWS Secrets Manager
-    region_name = "eu-west-1"
+    if not use_cache:
+        return _decode_snowflake_pkb(option, use_cache=False)
+    return _pkb_cache.get_or_load(option, lambda: _decode_snowflake_pkb(option))
+
 
-    secrets = get_secrets(secret_names, region_name)
+def invalidate_snowflake_pkb():
+    """
+    Drop the cached private key bytes and the underlying secrets, e.g. after a key rotation.
+    """
+    _pkb_cache.invalidate()
+    invalidate_secrets(SNOWFLAKE_SECRET_NAMES, SNOWFLAKE_SECRETS_REGION)
+
+
+def _decode_snowflake_pkb(option, use_cache=True):
+    """
+    Fetch the encrypted private key and its passphrase and convert them into key bytes for the given option.
+    """
+    secrets = get_secrets(SNOWFLAKE_SECRET_NAMES, SNOWFLAKE_SECRETS_REGION, use_cache=use_cache)
+
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.backends import default_backend
 
     secret = secrets["snowflake/emea/privateKey"]
     passphrase = secrets["snowflake/emea/passphrase"]
 
-    p_key = serialization.load_pem_private_key(
-        secret.encode("utf-8"),
-        password=passphrase.encode(),
-        backend=default_backend(),
-    )
+    with metrics.span('key_decoding'):
+        p_key = serialization.load_pem_private_key(
+            secret.encode("utf-8"),
+            password=passphrase.encode(),
+            backend=default_backend(),
+        )
 
     if option == "CONNECTOR": # Snowflake connector
         pkb = p_key.private_bytes(
@@ -54,12 +92,184 @@ def create_snowflake_connection(pkb):
     :param pkb: str, private key bytes
     :return: snowflake.connector.connection object
     """
-    return snowflake.connector.connect(
-        user=snowflake_config['user'],
-        account=snowflake_config['account'],
-        private_key=pkb,
-        warehouse=snowflake_config['warehouse'],
-        database=snowflake_config['database'],
-        schema=snowflake_config['schema'],
-        role=snowflake_config['role']
-    )
\ No newline at end of file
+    import snowflake.connector
+
+    with metrics.span('snowflake_connect'):
+        return snowflake.connector.connect(
+            user=snowflake_config['user'],
+            account=snowflake_config['account'],
+            private_key=pkb,
+            warehouse=snowflake_config['warehouse'],
+            database=snowflake_config['database'],
+            schema=snowflake_config['schema'],
+            role=snowflake_config['role']
+        )
+
+
+# Whether query results can be streamed as Arrow batches (checked without importing pyarrow)
+_ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Shared pool used by get_snowflake_pool, created on first use, and the (pkb, max_size) it was created with
+_pool = None
+_pool_config = None
+_pool_lock = threading.Lock()
+
+
+def get_snowflake_pool(pkb, max_size=4):
+    """
+    Return the process-wide Snowflake connection pool, creating it on first use.
+
+    The pool keeps the max_size it was created with; a call asking for another size gets the existing pool and
+    a warning. A call with different key bytes (e.g. after the key was rotated) replaces the pool: its idle
+    connections are closed and the borrowed ones are closed when they are returned.
+    
+    :param pkb: str, private key bytes used to authenticate new pooled connections
+    :param max_size: int, maximum number of open connections (only used when the pool is created)
+    :return: SnowflakeConnectionPool object
+    """
+    global _pool, _pool_config
+    replaced = None
+    with _pool_lock:
+        if _pool is not None and _pool_config[0] != pkb:
+            logger.info("Snowflake key bytes changed; replacing the shared connection pool.")
+            replaced, _pool = _pool, None
+        if _pool is None:
+            _pool = SnowflakeConnectionPool(lambda: create_snowflake_connection(pkb), max_size=max_size)
+            _pool_config = (pkb, max_size)
+        elif _pool_config[1] != max_size:
+            logger.warning(f"Shared Snowflake connection pool already exists with max_size={_pool_config[1]}; "
+                           f"ignoring max_size={max_size}.")
+        pool = _pool
+    if replaced is not None:
+        replaced.close()
+    return pool
+
+
+def _forget_pool_after_fork():
+    # A forked child (e.g. a sharded run worker) must open its own connections: the inherited ones share
+    # their sockets with the parent, so they are dropped without being closed
+    global _pool, _pool_config, _pool_lock
+    _pool = None
+    _pool_config = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+
+def close_snowflake_pool():
+    """
+    Close the process-wide Snowflake connection pool (if any) so the next call to get_snowflake_pool starts afresh.
+    """
+    global _pool, _pool_config
+    with _pool_lock:
+        pool, _pool, _pool_config = _pool, None, None
+    if pool is not None:
+        pool.close()
+
+
+def _fetch_all(conn, sql_statement, params):
+    with conn.cursor() as cs:
+        with metrics.span('query_execution'):
+            cs.execute(sql_statement, params)
+        with metrics.span('row_fetch'):
+            rows = cs.fetchall()
+        metrics.increment('rows_fetched', len(rows))
+        return rows
+
+
+def run_snowflake_query(pkb, sql_statement, params=None, pool=None):
+    """
+    Execute a query and fetch all its rows.
+    
+    When a pool is given the query runs on a borrowed connection (reconnecting once if the session
+    expired); otherwise a dedicated connection is opened and closed around the query.
+    
+    :param pkb: str, private key bytes (ignored when a pool is given)
+    :param sql_statement: str, SQL statement to execute
+    :param params: sequence, bound parameters for the statement
+    :param pool: SnowflakeConnectionPool object, optional
+    :return: list of tuples, the fetched rows
+    """
+    if pool is not None:
+        return pool.run(lambda conn: _fetch_all(conn, sql_statement, params))
+    with create_snowflake_connection(pkb) as ctx:
+        return _fetch_all(ctx, sql_statement, params)
+
+
+def _arrow_column_batches(cs):
+    for batch in cs.fetch_arrow_batches():
+        yield [column.to_pylist() for column in batch.columns]
+
+
+def _row_column_batches(cs, batch_size):
+    while True:
+        rows = cs.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [list(column) for column in zip(*rows)]
+
+
+def fetch_snowflake_column_batches(pkb, sql_statement, consume, params=None, pool=None, batch_size=10000):
+    """
+    Execute a query and stream its result as column batches instead of fetching all the rows at once.
+    
+    With pyarrow installed, the result is read with cursor.fetch_arrow_batches() and each Arrow batch is turned
+    into one Python list per column, so no per-row tuples are created. Otherwise rows are fetched batch_size at a
+    time and transposed.
+    
+    The batches are handed to consume, which runs while the connection is held and returns the final result.
+    When a pooled query is retried after a session expiry, consume is called again with a fresh iterator.
+    
+    :param pkb: str, private key bytes (ignored when a pool is given)
+    :param sql_statement: str, SQL statement to execute
+    :param consume: callable, called as consume(batches) where batches iterates over lists of column value lists
+                    (in the order of the selected columns)
+    :param params: sequence, bound parameters for the statement
+    :param pool: SnowflakeConnectionPool object, optional
+    :param batch_size: int, rows per batch when Arrow is not available
+    :return: the value returned by consume
+    """
+    def counted(batches):
+        for columns in batches:
+            metrics.increment('rows_fetched', len(columns[0]) if columns else 0)
+            yield columns
+
+    def run(conn):
+        with conn.cursor() as cs:
+            with metrics.span('query_execution'):
+                cs.execute(sql_statement, params)
+            with metrics.span('row_fetch'):
+                if _ARROW_AVAILABLE and hasattr(cs, 'fetch_arrow_batches'):
+                    return consume(counted(_arrow_column_batches(cs)))
+                return consume(counted(_row_column_batches(cs, batch_size)))
+
+    if pool is not None:
+        return pool.run(run)
+    with create_snowflake_connection(pkb) as ctx:
+        return run(ctx)
+
+
+def run_snowflake_statements(pkb, statements, pool=None):
+    """
+    Execute several statements on the same connection (i.e. the same session) and fetch the rows of the last one.
+    
+    Needed when a statement depends on session state left by the previous ones, e.g.
+    RESULT_SCAN(LAST_QUERY_ID()) after a SHOW command. The results of the earlier statements are not fetched.
+    
+    :param pkb: str, private key bytes (ignored when a pool is given)
+    :param statements: list of (sql_statement, params) tuples, executed in order
+    :param pool: SnowflakeConnectionPool object, optional
+    :return: list of tuples, the rows fetched by the last statement
+    """
+    def run_all(conn):
+        with conn.cursor() as cs:
+            for sql_statement, params in statements[:-1]:
+                with metrics.span('query_execution'):
+                    cs.execute(sql_statement, params)
+        return _fetch_all(conn, *statements[-1])
+
+    if pool is not None:
+        return pool.run(run_all)
+    with create_snowflake_connection(pkb) as ctx:
+        return run_all(ctx)
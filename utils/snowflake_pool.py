@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('SchemaComparator')
+
+# Snowflake error codes raised when the session or master token of a connection has expired
+# (390111: session no longer exists, 390112: master token expired, 390114: authentication token expired).
+SESSION_EXPIRED_ERRNOS = frozenset({390111, 390112, 390114})
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+
+def is_session_expired(error):
+    """Returns True if the given exception means the Snowflake session has to be re-authenticated."""
+    return getattr(error, 'errno', None) in SESSION_EXPIRED_ERRNOS
+
+
+def default_health_check(conn):
+    """
+    Checks that a connection is still usable.
+
+    :param conn: connection object returned by the connection factory
+    :return: bool, True if the connection can run a trivial query
+    """
+    is_closed = getattr(conn, 'is_closed', None)
+    if is_closed is not None and is_closed():
+        return False
+    try:
+        with conn.cursor() as cs:
+            cs.execute("SELECT 1")
+            cs.fetchall()
+        return True
+    except Exception:
+        return False
+
+
+class _PooledConnection:
+    """A connection owned by the pool together with its bookkeeping timestamps."""
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class SnowflakeConnectionPool:
+    """
+    Bounded pool of reusable Snowflake connections.
+
+    Connections are created lazily through connection_factory (a zero-argument callable, normally
+    a wrapper around create_snowflake_connection) so that a multi-table run only pays the
+    key-pair login handshake a few times. Idle connections are evicted after idle_timeout seconds,
+    connections older than max_lifetime seconds are replaced, and a connection that has been idle
+    for more than health_check_interval seconds is checked before being handed out.
+    """
+
+    def __init__(self, connection_factory, max_size=4, idle_timeout=600, max_lifetime=4 * 3600,
+                 health_check_interval=60, health_check=default_health_check, acquire_timeout=None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self._connection_factory = connection_factory
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._max_lifetime = max_lifetime
+        self._health_check_interval = health_check_interval
+        self._health_check = health_check
+        self._acquire_timeout = acquire_timeout
+
+        self._idle = []  # idle connections, most recently used last
+        self._size = 0  # idle + borrowed connections (+ connections being created)
+        self._closed = False
+        self._condition = threading.Condition()
+
+        # Counters, mostly useful to check how many logins a run needed (updated under the lock)
+        self.connects = 0
+        self.discards = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def _close_quietly(self, entry):
+        try:
+            entry.conn.close()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled Snowflake connection: {e}")
+
+    def _evict_idle(self, now):
+        """Removes idle connections that exceeded idle_timeout or max_lifetime. Must hold the lock."""
+        expired = [entry for entry in self._idle
+                   if now - entry.last_used > self._idle_timeout or now - entry.created_at > self._max_lifetime]
+        if expired:
+            self._idle = [entry for entry in self._idle if entry not in expired]
+            self._size -= len(expired)
+            self.discards += len(expired)
+            self._condition.notify(len(expired))
+        return expired
+
+    def _acquire(self):
+        deadline = None if self._acquire_timeout is None else time.monotonic() + self._acquire_timeout
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                now = time.monotonic()
+                expired = self._evict_idle(now)
+                entry = self._idle.pop() if self._idle else None
+                create = entry is None and self._size < self._max_size
+                if create:
+                    self._size += 1  # reserve the slot before connecting outside the lock
+                elif entry is None:
+                    remaining = None if deadline is None else deadline - now
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeoutError(f"No Snowflake connection available after {self._acquire_timeout}s.")
+                    self._condition.wait(remaining)
+                    continue
+
+            for stale in expired:
+                self._close_quietly(stale)
+
+            if create:
+                try:
+                    conn = self._connection_factory()
+                except BaseException:
+                    self._release_slot()
+                    raise
+                with self._condition:
+                    self.connects += 1
+                logger.info(f"Opened pooled Snowflake connection ({self._size}/{self._max_size}).")
+                return _PooledConnection(conn)
+
+            # Re-used connection: only check it if it has been idle for a while
+            if time.monotonic() - entry.last_used <= self._health_check_interval or self._health_check(entry.conn):
+                return entry
+            logger.warning("Discarding unhealthy pooled Snowflake connection.")
+            self._discard(entry)
+
+    def _release_slot(self, discarded=False):
+        with self._condition:
+            self._size -= 1
+            if discarded:
+                self.discards += 1
+            self._condition.notify()
+
+    def _release(self, entry):
+        entry.last_used = time.monotonic()
+        with self._condition:
+            if not self._closed:
+                self._idle.append(entry)
+                self._condition.notify()
+                return
+        self._discard(entry)
+
+    def _discard(self, entry):
+        self._close_quietly(entry)
+        self._release_slot(discarded=True)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool for the duration of the with block.
+
+        The connection is returned to the pool afterwards, unless the block failed because the
+        session expired, in which case the connection is discarded.
+        """
+        entry = self._acquire()
+        try:
+            yield entry.conn
+        except BaseException as e:
+            if is_session_expired(e):
+                self._discard(entry)
+            else:
+                self._release(entry)
+            raise
+        else:
+            self._release(entry)
+
+    def run(self, callback):
+        """
+        Runs callback(connection) on a pooled connection and returns its result.
+
+        If the session has expired the connection is replaced and the callback is retried once
+        on a freshly authenticated connection.
+        """
+        try:
+            with self.connection() as conn:
+                return callback(conn)
+        except Exception as e:
+            if not is_session_expired(e):
+                raise
+            logger.warning(f"Snowflake session expired, reconnecting: {e}")
+        with self.connection() as conn:
+            return callback(conn)
+
+    def close(self):
+        """Closes all idle connections; borrowed connections are closed when they are returned."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for entry in idle:
+            self._close_quietly(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
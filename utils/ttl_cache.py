@@ -0,0 +1,73 @@
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache whose entries expire ttl seconds after they were stored.
+
+    Used to keep secrets and decoded private keys around between calls so that the per-table
+    path does not pay Secrets Manager latency or the private key KDF again.
+    """
+
+    def __init__(self, ttl, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> lock held by the thread loading it (see get_or_load)
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                return default
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Stores value under key for ttl seconds (defaults to the cache TTL)."""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for key, calling loader() and caching its result on a miss.
+
+        Concurrent misses on the same key share one load: the first caller runs loader() while the others
+        wait for it and then read the cached value (or load themselves if it failed).
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                value = self.get(key, missing)
+                if value is missing:
+                    value = loader()
+                    self.set(key, value)
+                return value
+        finally:
+            with self._lock:
+                if self._loading.get(key) is key_lock:
+                    del self._loading[key]
+
+    def invalidate(self, keys=None):
+        """Removes the given keys from the cache, or every entry if keys is None."""
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing